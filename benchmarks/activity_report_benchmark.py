@@ -0,0 +1,79 @@
+"""基准测试：一年的小时聚合生成活跃度报表（首次计算与缓存命中）
+
+用法：python benchmarks/activity_report_benchmark.py [--groups 5000] [--density 0.05] [--days 365]
+被测群组拥有完整一年的小时桶，其余群组按 density 随机填充，用来模拟大库中的主键范围查询。
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.activity_report import ActivityReports, available, render_text  # noqa: E402
+from core.async_database import AsyncDatabase  # noqa: E402
+from core.stats_collector import HOUR, StatsCollector, hour_bucket  # noqa: E402
+
+USERS_PER_GROUP = 200
+
+
+def populate(db, groups: int, density: float, days: int, seed: int):
+    rng = random.Random(seed)
+    now = hour_bucket(time.time())
+    hours = [now - i * HOUR for i in range(days * 24)]
+    for chat_id in range(1, groups + 1):
+        active = hours if chat_id == 1 else [h for h in hours if rng.random() < density]
+        chat_rows = []
+        user_rows = []
+        for hour in active:
+            posters = rng.sample(range(USERS_PER_GROUP), 3)
+            counts = [rng.randrange(1, 20) for _ in posters]
+            chat_rows.append((chat_id, hour, sum(counts)))
+            user_rows.extend((chat_id, hour, user_id, count) for user_id, count in zip(posters, counts))
+        db.conn.executemany("INSERT INTO chat_hourly_stats (chat_id, hour, messages) VALUES (?, ?, ?)", chat_rows)
+        db.conn.executemany(
+            "INSERT INTO user_hourly_stats (chat_id, hour, user_id, messages) VALUES (?, ?, ?, ?)", user_rows
+        )
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        await db.write(populate, args.groups, args.density, args.days, args.seed, label="bench:populate")
+        print(f"写入 {args.groups} 个群组的小时聚合：{time.perf_counter() - started:.1f}s")
+
+        reports = ActivityReports(db, StatsCollector(db))
+        for days in sorted({30, 90, args.days}):
+            started = time.perf_counter()
+            report = await reports.get(1, days)
+            cold = time.perf_counter() - started
+            started = time.perf_counter()
+            await reports.get(1, days)
+            warm = time.perf_counter() - started
+            started = time.perf_counter()
+            render_text(report)
+            render = time.perf_counter() - started
+            print(f"{days:>4} 天：首次 {cold * 1000:7.1f}ms  缓存 {warm * 1000:6.3f}ms  "
+                  f"文本渲染 {render * 1000:5.1f}ms  消息 {report.total}")
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not available():
+        sys.exit("需要安装 numpy")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""基准测试：加权不放回抽取 k 名获奖者（树状数组与逐次线性扫描对比）
+
+用法：python benchmarks/lottery_draw_benchmark.py [--sizes 100000 1000000] [--winners 1 10 100]
+"""
+import sys
+import time
+import random
+import argparse
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.weighted_draw import weighted_sample  # noqa: E402
+
+
+def linear_sample(weights, k, rng):
+    """对照组：每抽一人都重新计算前缀和再二分，O(k·n)"""
+    remaining = list(weights)
+    picked = []
+    for _ in range(k):
+        prefix = list(accumulate(remaining))
+        if not prefix or prefix[-1] <= 0:
+            break
+        index = bisect_right(prefix, rng.randrange(prefix[-1]))
+        picked.append(index)
+        remaining[index] = 0
+    return picked
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--winners", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'参与人数':>10} {'获奖人数':>8} {'树状数组(ms)':>14} {'线性扫描(ms)':>14} {'加速比':>8}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        # 票数 = 1 + 积分，约七分之一的参与者没有积分
+        weights = [1 + rng.randrange(500) if i % 7 else 1 for i in range(size)]
+        for k in args.winners:
+            assert weighted_sample(weights, k, random.Random(args.seed)) == \
+                weighted_sample(weights, k, random.Random(args.seed)), "同一种子结果必须一致"
+            fenwick = timed(weighted_sample, weights, k, random.Random(args.seed))
+            linear = timed(linear_sample, weights, k, random.Random(args.seed))
+            print(f"{size:>10} {k:>8} {fenwick * 1000:>14.1f} {linear * 1000:>14.1f} {linear / fenwick:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""群组活跃度报表：把小时聚合载入 NumPy 数组，向量化计算热力图、百分位、滑动平均和增长曲线
+
+- 一个群一年最多 8760 个小时桶，按主键范围读出后整体转成数组，不在 Python 里逐行累加
+- 星期 × 小时热力图和日序列都用 bincount 一次算出；滑动平均基于累积和
+- 读库和计算都在只读线程里完成，不阻塞事件循环
+- 报表按 (群组, 天数) 缓存，直到该群有新的统计增量写库（收集器版本号变化）或跨过本地零点
+- 输出等宽文本网格；安装了 matplotlib 时还可以在本地渲染 PNG
+- NumPy 为可选依赖，未安装时 available() 返回 False
+"""
+import io
+import os
+import time
+import asyncio
+import importlib.util
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from core.stats_collector import HOUR
+
+DAY = 24 * HOUR
+ROLLING_DAYS = 7
+TOP_POSTERS = 10
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+
+WEEKDAYS = "一二三四五六日"
+SHADES = "·░▒▓█"
+SPARKS = "▁▂▃▄▅▆▇█"
+SPARK_WIDTH = 30
+
+
+def available() -> bool:
+    return np is not None
+
+
+def png_available() -> bool:
+    return np is not None and importlib.util.find_spec("matplotlib") is not None
+
+
+def utc_offset(ts: Optional[float] = None) -> int:
+    """本地时区相对 UTC 的偏移（秒）；整段报表使用同一个偏移"""
+    return time.localtime(ts).tm_gmtoff
+
+
+@dataclass
+class ActivityReport:
+    chat_id: int
+    days: int
+    first_day: int                # 窗口第一天（本地日序号，自 1970-01-01 起）
+    heatmap: "np.ndarray"         # 7 × 24，行是星期一到星期日，列是本地小时
+    daily: "np.ndarray"           # 每天消息数，长度 days
+    rolling: "np.ndarray"         # ROLLING_DAYS 日滑动平均
+    percentiles: Dict[int, float]  # 日消息数的 p50 / p90 / p99
+    growth: Optional[float]       # 最近 ROLLING_DAYS 天相对之前同样天数的增长率
+    top_posters: List[Tuple[int, int]]
+    png: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def total(self) -> int:
+        return int(self.daily.sum())
+
+    @property
+    def peak(self) -> Tuple[int, int]:
+        """(星期, 小时) 消息最多的时段"""
+        weekday, hour = np.unravel_index(int(self.heatmap.argmax()), self.heatmap.shape)
+        return int(weekday), int(hour)
+
+
+def build_report(chat_id: int, days: int, hours: "np.ndarray", counts: "np.ndarray",
+                 top_posters: List[Tuple[int, int]], first_day: int, offset: int) -> ActivityReport:
+    """由小时桶数组（UTC 小时起点、消息数）计算报表，全部为数组运算"""
+    local = hours + offset
+    day = local // DAY - first_day
+    in_window = (day >= 0) & (day < days)
+    day, local, counts = day[in_window], local[in_window], counts[in_window]
+
+    daily = np.bincount(day, weights=counts, minlength=days)[:days]
+    # 1970-01-01 是星期四，星期一记为 0
+    weekday = (day + first_day + 3) % 7
+    hour = (local // HOUR) % 24
+    heatmap = np.bincount(weekday * 24 + hour, weights=counts, minlength=7 * 24).reshape(7, 24)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    ends = np.arange(1, days + 1)
+    starts = np.maximum(ends - ROLLING_DAYS, 0)
+    rolling = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+    p50, p90, p99 = np.percentile(daily, [50, 90, 99])
+    growth = None
+    if days >= 2 * ROLLING_DAYS:
+        recent = daily[-ROLLING_DAYS:].sum()
+        previous = daily[-2 * ROLLING_DAYS:-ROLLING_DAYS].sum()
+        if previous:
+            growth = float(recent / previous - 1)
+
+    return ActivityReport(
+        chat_id=chat_id, days=days, first_day=first_day,
+        heatmap=heatmap, daily=daily, rolling=rolling,
+        percentiles={50: float(p50), 90: float(p90), 99: float(p99)},
+        growth=growth, top_posters=top_posters,
+    )
+
+
+class ActivityReports:
+    def __init__(self, db, collector, cache_size: int = REPORT_CACHE_SIZE):
+        self.db = db
+        self.collector = collector
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[int, int, ActivityReport]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, chat_id: int, days: int = 30) -> ActivityReport:
+        """返回缓存的报表；该群有新数据写库或日期变化后重新计算"""
+        offset = utc_offset()
+        first_day = (int(time.time()) + offset) // DAY - days + 1
+        version = self.collector.version(chat_id)
+        key = (chat_id, days)
+        cached = self._cache.get(key)
+        if cached and cached[0] == version and cached[1] == first_day:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached[2]
+
+        self.misses += 1
+        since = first_day * DAY - offset
+
+        def load(conn):
+            cursor = conn.cursor()
+            cursor.row_factory = None  # 直接取元组，省去 Row 对象
+            rows = cursor.execute(
+                "SELECT hour, messages FROM chat_hourly_stats WHERE chat_id = ? AND hour >= ?", (chat_id, since)
+            ).fetchall()
+            top = cursor.execute("""
+                SELECT user_id, SUM(messages) AS messages FROM user_hourly_stats
+                WHERE chat_id = ? AND hour >= ?
+                GROUP BY user_id ORDER BY messages DESC LIMIT ?
+            """, (chat_id, since, TOP_POSTERS)).fetchall()
+            data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            return build_report(chat_id, days, data[:, 0], data[:, 1],
+                                [(row[0], row[1]) for row in top], first_day, offset)
+
+        report = await self.db.read(load, label="stats:report")
+        self._cache[key] = (version, first_day, report)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return report
+
+    async def png(self, report: ActivityReport) -> bytes:
+        """本地渲染 PNG（在线程中执行），结果随报表一起缓存"""
+        if report.png is None:
+            report.png = await asyncio.to_thread(render_png, report)
+        return report.png
+
+    def stats(self) -> dict:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+# ------------------------------
+# 渲染
+# ------------------------------
+def _levels(values: "np.ndarray", steps: int) -> "np.ndarray":
+    """把数值按最大值线性映射到 0..steps-1（非零值至少为 1）"""
+    peak = values.max() if values.size else 0
+    if peak <= 0:
+        return np.zeros(values.shape, dtype=int)
+    levels = np.ceil(values / peak * (steps - 1)).astype(int)
+    return np.where(values > 0, np.maximum(levels, 1), 0)
+
+
+def render_heatmap(heatmap: "np.ndarray") -> str:
+    """星期 × 小时等宽网格，每格一个字符，颜色越深消息越多"""
+    header = [" "] * 24
+    for hour in (0, 6, 12, 18):
+        for i, digit in enumerate(str(hour)):
+            header[hour + i] = digit
+    lines = ["   " + "".join(header)]
+    levels = _levels(heatmap, len(SHADES))
+    for weekday in range(7):
+        lines.append(WEEKDAYS[weekday] + " " + "".join(SHADES[level] for level in levels[weekday]))
+    return "\n".join(lines)
+
+
+def render_sparkline(daily: "np.ndarray", width: int = SPARK_WIDTH) -> Tuple[str, int]:
+    """日序列压缩成至多 width 格的迷你折线，返回 (折线, 每格天数)"""
+    per_cell = max(1, -(-len(daily) // width))
+    buckets = np.add.reduceat(daily, np.arange(0, len(daily), per_cell))
+    levels = _levels(buckets, len(SPARKS) + 1)
+    return "".join(SPARKS[level - 1] if level else " " for level in levels), per_cell
+
+
+def render_text(report: ActivityReport) -> str:
+    """报表的 HTML 文本（网格放在 <pre> 中保持等宽）"""
+    weekday, hour = report.peak
+    text = f"📊 最近 {report.days} 天活跃度报表\n\n"
+    text += f"消息总数：{report.total}\n"
+    text += f"日均消息：{report.total / report.days:.1f}\n"
+    text += "日消息数 P50 / P90 / P99：" + " / ".join(f"{report.percentiles[p]:.0f}" for p in (50, 90, 99)) + "\n"
+    text += f"近 {ROLLING_DAYS} 日均值：{report.rolling[-1]:.1f}\n"
+    if report.growth is not None:
+        text += f"环比（近 {ROLLING_DAYS} 天）：{report.growth:+.1%}\n"
+    if report.total:
+        text += f"最活跃时段：周{WEEKDAYS[weekday]} {hour}:00-{hour + 1}:00\n"
+    text += f"\n<pre>{render_heatmap(report.heatmap)}</pre>\n"
+    sparkline, per_cell = render_sparkline(report.daily)
+    text += f"趋势（每格 {per_cell} 天）：\n<pre>{sparkline}</pre>"
+    return text
+
+
+def render_png(report: ActivityReport) -> bytes:
+    """用 matplotlib 在本地渲染热力图和每日趋势（调用方需先检查 png_available()）"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 6), dpi=100)
+    heat_ax, trend_ax = figure.subplots(2, 1, gridspec_kw={"height_ratios": [3, 2]})
+    heat_ax.imshow(report.heatmap, aspect="auto", cmap="YlOrRd")
+    heat_ax.set_yticks(range(7), ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+    heat_ax.set_xticks(range(0, 24, 3))
+    heat_ax.set_title(f"Messages by weekday and hour (last {report.days} days)")
+
+    x = np.arange(report.days)
+    trend_ax.bar(x, report.daily, color="#f4a582", width=1.0, label="daily")
+    trend_ax.plot(x, report.rolling, color="#b2182b", label=f"{ROLLING_DAYS}-day average")
+    trend_ax.set_xlabel("days ago")
+    trend_ax.set_xticks(x[::max(1, report.days // 6)], (report.days - 1 - x[::max(1, report.days // 6)]).tolist())
+    trend_ax.legend(loc="upper left")
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
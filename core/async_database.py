@@ -0,0 +1,302 @@
+"""Database 的异步门面：事件循环永远不在磁盘 I/O 上阻塞
+
+- 读：交给线程池，从有上限的只读连接池借用连接（WAL 下与写入并行）
+- 写：通过队列交给唯一的写线程顺序执行（SQLite 同一时间只允许一个写者）
+- 组提交：开启后写线程把多个并发写合并进同一个事务，减少 fsync 次数
+
+同步的 Database 类保持不变，脚本仍可直接使用。
+"""
+import os
+import re
+import time
+import queue
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from core.database import COUNTER_SOURCES, Database
+from core.response_cache import TOPIC_SETTINGS, response_cache
+from core.storage import ReaderPool, StorageProfile
+
+# 组提交：最多等待多少毫秒 / 累积多少条写操作后提交一次（0 表示关闭组提交）
+GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_MAX = int(os.getenv("DB_GROUP_COMMIT_MAX", "200"))
+
+# 持久性：full = 事务提交后才返回结果；relaxed = 语句执行完即返回（崩溃时可能丢失最后一批）
+DURABILITY_FULL = "full"
+DURABILITY_RELAXED = "relaxed"
+DB_DURABILITY = os.getenv("DB_DURABILITY", DURABILITY_FULL)
+
+_STOP = object()
+
+
+class LatencyStats:
+    """单类查询的耗时统计（秒）"""
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+def _label(query: str) -> str:
+    """把 SQL 压缩成一行作为统计的键"""
+    return re.sub(r"\s+", " ", query).strip()[:80]
+
+
+class AsyncDatabase:
+    """对 Database 的异步封装，接口与同步版本保持一致（需 await）"""
+
+    def __init__(self, db_path: str, profile: Optional[StorageProfile] = None,
+                 group_commit_ms: float = GROUP_COMMIT_MS, group_commit_max: int = GROUP_COMMIT_MAX,
+                 durability: str = DB_DURABILITY):
+        if durability not in (DURABILITY_FULL, DURABILITY_RELAXED):
+            raise ValueError(f"未知的持久性模式：{durability}")
+        self.db_path = db_path
+        self.group_commit_interval = group_commit_ms / 1000
+        self.group_commit_max = max(1, group_commit_max)
+        self.durability = durability
+        self.profile = profile or StorageProfile.from_env()
+        # 写连接只在写线程里使用，建表和 WAL 设置也在这里完成
+        self._writer_db = Database(db_path, check_same_thread=False, profile=self.profile)
+
+        self._readers = ReaderPool(db_path, self.profile)
+        self._read_pool = ThreadPoolExecutor(max_workers=self.profile.read_pool_size, thread_name_prefix="db-reader")
+
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+        self._latency: Dict[str, LatencyStats] = {}
+        self._latency_lock = threading.Lock()
+
+    # ------------------------------
+    # 线程内部实现
+    # ------------------------------
+    def _record(self, label: str, elapsed: float):
+        with self._latency_lock:
+            stats = self._latency.get(label)
+            if stats is None:
+                stats = self._latency[label] = LatencyStats()
+            stats.add(elapsed)
+
+    def _run_read(self, label: str, func: Callable[[sqlite3.Connection], Any]):
+        started = time.perf_counter()
+        try:
+            with self._readers.connection() as conn:
+                return func(conn)
+        finally:
+            self._record(label, time.perf_counter() - started)
+
+    def _writer_loop(self):
+        self._migrate()
+        while True:
+            item = self._write_queue.get()
+            if item is _STOP:
+                break
+            if self.group_commit_interval > 0:
+                if self._run_batch(item):
+                    break
+            else:
+                self._run_single(item)
+        self._writer_db.close()
+
+    def _migrate(self):
+        """启动时在写线程上执行一次性迁移（VACUUM 可能较慢，不能阻塞事件循环，也不能放在事务里）"""
+        started = time.perf_counter()
+        try:
+            if self._writer_db.migrate_auto_vacuum():
+                print(f"🧹 数据库已切换为 auto_vacuum = {self.profile.auto_vacuum.upper()}"
+                      f"（VACUUM 耗时 {time.perf_counter() - started:.1f}s）")
+        except Exception as e:
+            print(f"⚠️ 切换 auto_vacuum 失败，空闲页将不会被回收：{str(e)}")
+
+    def _run_item(self, item, savepoint: bool):
+        """执行单个写任务，返回 (future, loop, 是否成功, 结果或异常)"""
+        label, func, args, kwargs, future, loop = item
+        started = time.perf_counter()
+        try:
+            if savepoint:
+                # 只回滚出错的这一项，同批次的其他写操作不受影响
+                with self._writer_db.savepoint("write_item"):
+                    result = func(self._writer_db, *args, **kwargs)
+            else:
+                result = func(self._writer_db, *args, **kwargs)
+        except Exception as e:
+            return future, loop, False, e
+        else:
+            return future, loop, True, result
+        finally:
+            self._record(label, time.perf_counter() - started)
+
+    def _run_single(self, item):
+        """未开启组提交：每个写任务单独一个事务"""
+        label, func, args, kwargs, future, loop = item
+        started = time.perf_counter()
+        try:
+            with self._writer_db.transaction():
+                result = func(self._writer_db, *args, **kwargs)
+        except Exception as e:
+            outcome = (future, loop, False, e)
+        else:
+            outcome = (future, loop, True, result)
+        finally:
+            self._record(label, time.perf_counter() - started)
+        _resolve(outcome)
+
+    def _run_batch(self, first) -> bool:
+        """组提交：在一个事务里执行多条写任务，直到达到条数上限或等待超时；返回是否收到停止信号"""
+        stop = False
+        outcomes = []
+        executed = 0
+        deadline = time.monotonic() + self.group_commit_interval
+        try:
+            with self._writer_db.transaction():
+                item = first
+                while True:
+                    outcome = self._run_item(item, savepoint=True)
+                    executed += 1
+                    if self.durability == DURABILITY_RELAXED:
+                        _resolve(outcome)
+                    else:
+                        outcomes.append(outcome)
+                    # 宽松模式下结果已立即返回、不进 outcomes，所以按已执行条数计数
+                    if executed >= self.group_commit_max:
+                        break
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._write_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+        except Exception as e:
+            # 提交失败时，本批次所有尚未返回的写操作都视为失败
+            outcomes = [(future, loop, False, e) for future, loop, _, _ in outcomes]
+        for outcome in outcomes:
+            _resolve(outcome)
+        return stop
+
+    # ------------------------------
+    # 通用异步接口
+    # ------------------------------
+    async def read(self, func: Callable[[sqlite3.Connection], Any], label: str = "read") -> Any:
+        """在只读连接上执行 func(conn)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_pool, self._run_read, label, func)
+
+    async def write(self, func: Callable[..., Any], *args, label: Optional[str] = None, **kwargs) -> Any:
+        """把 func(db, *args) 排入写队列，由写线程在写连接上执行
+
+        func 内的所有语句构成一个工作单元：要么全部提交，要么全部回滚。
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._write_queue.put((label or getattr(func, "__name__", "write"), func, args, kwargs, future, loop))
+        return await future
+
+    async def call(self, method: str, *args, **kwargs) -> Any:
+        """在写线程上调用 Database 的同名方法（适用于可能写入的复合方法）"""
+        return await self.write(getattr(Database, method), *args, label=method, **kwargs)
+
+    async def execute(self, query: str, params=None) -> int:
+        """执行写语句，返回受影响行数"""
+        return await self.write(lambda db: db.execute(query, params).rowcount, label=_label(query))
+
+    async def executemany(self, query: str, seq_of_params) -> int:
+        def run(db: Database):
+            # 由写线程统一提交（单独事务或组提交批次），这里不能自行 commit
+            return db.conn.executemany(query, seq_of_params).rowcount
+        return await self.write(run, label=_label(query))
+
+    async def fetchone(self, query: str, params=None) -> Optional[Dict[str, Any]]:
+        def run(conn: sqlite3.Connection):
+            row = conn.execute(query, params or ()).fetchone()
+            return dict(row) if row else None
+        return await self.read(run, label=_label(query))
+
+    async def fetchall(self, query: str, params=None) -> List[Dict[str, Any]]:
+        def run(conn: sqlite3.Connection):
+            return [dict(row) for row in conn.execute(query, params or ()).fetchall()]
+        return await self.read(run, label=_label(query))
+
+    # ------------------------------
+    # 缓存优先的便捷方法
+    # ------------------------------
+    async def get_group_settings(self, group_id: int):
+        """群组设置：命中缓存时直接返回（无 SQL、无线程切换），否则交给写线程加载"""
+        settings = self._writer_db.settings_cache.get(group_id)
+        if settings is not None:
+            return settings
+        return await self.call("get_group_settings", group_id)
+
+    async def update_group_settings(self, group_id: int, **kwargs):
+        await self.call("update_group_settings", group_id, **kwargs)
+        response_cache.invalidate(TOPIC_SETTINGS, group_id)
+
+    async def get_counters(self) -> Dict[str, int]:
+        """全局计数器（只读几行，与表的大小无关）"""
+        def run(conn: sqlite3.Connection):
+            counters = dict.fromkeys(COUNTER_SOURCES, 0)
+            counters.update((row["name"], row["value"]) for row in conn.execute("SELECT name, value FROM counters"))
+            return counters
+        return await self.read(run, label="counters")
+
+    # ------------------------------
+    # 监控与关闭
+    # ------------------------------
+    @property
+    def queue_depth(self) -> int:
+        """写队列中等待执行的任务数"""
+        return self._write_queue.qsize()
+
+    def stats(self) -> dict:
+        with self._latency_lock:
+            latency = {label: s.as_dict() for label, s in self._latency.items()}
+        return {
+            "write_queue_depth": self.queue_depth,
+            "read_pool_size": self.profile.read_pool_size,
+            "journal_mode": self.profile.journal_mode,
+            "settings_cache": self._writer_db.settings_cache.stats(),
+            "latency": latency,
+        }
+
+    def close(self):
+        """等待写队列清空后关闭所有连接"""
+        self._write_queue.put(_STOP)
+        self._writer.join()
+        self._read_pool.shutdown(wait=True)
+        self._readers.close()
+
+
+def _resolve(outcome):
+    future, loop, ok, value = outcome
+    loop.call_soon_threadsafe(_set_result if ok else _set_exception, future, value)
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.cancelled():
+        future.set_exception(exc)
@@ -1,7 +1,7 @@
 from telegram.ext import ApplicationBuilder
 from core.module_manager import load_modules
 # 删除不存在的 setup_owner_permissions 导入
-from core.database import Database
+from core.async_database import AsyncDatabase
 from core.events import register_events
 from dotenv import load_dotenv
 from pathlib import Path
@@ -30,7 +30,7 @@ def init_bot():
     
     # 处理数据库路径（如果未设置则使用默认路径）
     db_path = os.getenv("DATABASE_PATH") or str(project_root / "data" / "bot.db")
-    db = Database(db_path)
+    db = AsyncDatabase(db_path)
     application.bot_data["db"] = db
     
     # 存储所有者ID（转换为整数，方便后续权限判断）
@@ -0,0 +1,232 @@
+"""广播任务子系统
+
+- 每个广播是一个持久化的任务，每个目标群组有独立的投递状态（pending / sent / failed）
+- 固定数量的并发发送者执行，请求以「批量」优先级交给出站调度器（core/outbound.py），
+  单聊天预算由调度器统一控制，这里的令牌桶只限制广播占用的全局份额
+- 遇到 RetryAfter 时整体退避，其他错误按次数重试后标记失败
+- 进程重启后未完成的任务从上次停下的地方继续
+"""
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from core.outbound import PRIORITY_BULK
+from core.rate_limit import GLOBAL_RATE, TokenBucket, retry_after_seconds
+
+# 并发发送者数量
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+# 广播占用的全局发送预算（条/秒），留一部分给正常回复
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", str(GLOBAL_RATE * 0.8)))
+# 单个群组的最大尝试次数
+MAX_ATTEMPTS = 3
+# 投递状态批量写库的条数 / 间隔（秒）
+STATE_FLUSH_SIZE = 200
+STATE_FLUSH_INTERVAL = 1.0
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+
+@dataclass
+class BroadcastJob:
+    job_id: int
+    text: str
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.sent - self.failed
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def progress_text(self) -> str:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = (self.sent + self.failed) / elapsed if elapsed > 0 else 0.0
+        status = "已完成" if self.done else "进行中"
+        return (
+            f"📢 广播任务 #{self.job_id}（{status}）\n"
+            f"成功：{self.sent} / 失败：{self.failed} / 剩余：{self.pending} / 共 {self.total}\n"
+            f"速度：{rate:.1f} 条/秒"
+        )
+
+
+class BroadcastManager:
+    def __init__(self, db, bot, concurrency: int = BROADCAST_CONCURRENCY, rate: float = BROADCAST_RATE):
+        self.db = db
+        self.bot = bot
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(rate, capacity=rate)
+        self.jobs: Dict[int, BroadcastJob] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._pending_states: List[tuple] = []
+        self._last_flush = time.monotonic()
+
+    # ------------------------------
+    # 对外接口
+    # ------------------------------
+    async def create_job(self, text: str, chat_ids: List[int], created_by: Optional[int] = None) -> BroadcastJob:
+        """持久化任务和全部投递记录后立即开始发送，返回任务对象（不等待发送完成）"""
+        chat_ids = list(dict.fromkeys(chat_ids))
+
+        def insert(db):
+            cursor = db.execute(
+                "INSERT INTO broadcast_jobs (text, created_by, total, status) VALUES (?, ?, ?, ?)",
+                (text, created_by, len(chat_ids), JOB_RUNNING)
+            )
+            job_id = cursor.lastrowid
+            db.conn.executemany(
+                "INSERT INTO broadcast_deliveries (job_id, chat_id) VALUES (?, ?)",
+                [(job_id, chat_id) for chat_id in chat_ids]
+            )
+            return job_id
+
+        job_id = await self.db.write(insert, label="broadcast:create")
+        job = BroadcastJob(job_id=job_id, text=text, total=len(chat_ids))
+        self.jobs[job_id] = job
+        self._start(job)
+        return job
+
+    async def resume(self):
+        """启动时恢复所有未完成的任务"""
+        rows = await self.db.fetchall("SELECT * FROM broadcast_jobs WHERE status = ?", (JOB_RUNNING,))
+        for row in rows:
+            counts = await self.db.fetchall(
+                "SELECT status, COUNT(*) AS cnt FROM broadcast_deliveries WHERE job_id = ? GROUP BY status",
+                (row["id"],)
+            )
+            by_status = {c["status"]: c["cnt"] for c in counts}
+            job = BroadcastJob(
+                job_id=row["id"], text=row["text"], total=row["total"],
+                sent=by_status.get(STATUS_SENT, 0), failed=by_status.get(STATUS_FAILED, 0),
+            )
+            self.jobs[job.job_id] = job
+            print(f"🔁 恢复广播任务 #{job.job_id}，剩余 {job.pending} 个群组")
+            self._start(job)
+
+    async def stop(self):
+        """停止所有发送任务（未发送的投递保持 pending，下次启动继续）"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        await self._flush_states(force=True)
+
+    def get_job(self, job_id: Optional[int] = None) -> Optional[BroadcastJob]:
+        """按 ID 获取任务；不传 ID 时返回最近的任务"""
+        if job_id is None:
+            return self.jobs[max(self.jobs)] if self.jobs else None
+        return self.jobs.get(job_id)
+
+    # ------------------------------
+    # 发送
+    # ------------------------------
+    def _start(self, job: BroadcastJob):
+        self._tasks[job.job_id] = asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: BroadcastJob):
+        rows = await self.db.fetchall(
+            "SELECT chat_id, attempts FROM broadcast_deliveries WHERE job_id = ? AND status = ?",
+            (job.job_id, STATUS_PENDING)
+        )
+        queue: asyncio.Queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait((row["chat_id"], row["attempts"]))
+
+        workers = [asyncio.create_task(self._worker(job, queue)) for _ in range(min(self.concurrency, len(rows)) or 1)]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        await self._flush_states(force=True)
+        job.finished_at = time.time()
+        await self.db.execute(
+            "UPDATE broadcast_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (JOB_DONE, job.job_id)
+        )
+        self._tasks.pop(job.job_id, None)
+        print(f"📢 广播任务 #{job.job_id} 完成：成功 {job.sent}，失败 {job.failed}")
+
+    async def _worker(self, job: BroadcastJob, queue: asyncio.Queue):
+        while True:
+            chat_id, attempts = await queue.get()
+            finished = job.sent + job.failed
+            try:
+                await self._deliver(job, chat_id, attempts)
+            except Exception as e:
+                # 记录状态时的数据库错误等：不能让 worker 退出，否则 queue.join() 永远等不到
+                print(f"❌ 广播任务 #{job.job_id} 投递到 {chat_id} 出错：{str(e)}")
+                if job.sent + job.failed == finished:
+                    # 还没记录结果：按失败处理，状态留到下次批量写入
+                    job.failed += 1
+                    self._pending_states.append((STATUS_FAILED, attempts, str(e), job.job_id, chat_id))
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, job: BroadcastJob, chat_id: int, attempts: int):
+        while True:
+            await self.global_bucket.acquire()
+            attempts += 1
+            try:
+                await self.bot.send_message(
+                    chat_id=chat_id, text=job.text, rate_limit_args={"priority": PRIORITY_BULK}
+                )
+            except RetryAfter as e:
+                # 触发洪水限制：全局退避，本条不计入失败次数
+                attempts -= 1
+                self.global_bucket.pause(retry_after_seconds(e))
+                continue
+            except (Forbidden, BadRequest) as e:
+                # 被踢出群、群组不存在等永久错误，不再重试
+                await self._record(job, chat_id, STATUS_FAILED, attempts, str(e))
+                return
+            except Exception as e:
+                if attempts < MAX_ATTEMPTS:
+                    await asyncio.sleep(2 ** attempts)
+                    continue
+                await self._record(job, chat_id, STATUS_FAILED, attempts, str(e))
+                return
+            await self._record(job, chat_id, STATUS_SENT, attempts, None)
+            return
+
+    # ------------------------------
+    # 投递状态批量持久化
+    # ------------------------------
+    async def _record(self, job: BroadcastJob, chat_id: int, status: str, attempts: int, error: Optional[str]):
+        if status == STATUS_SENT:
+            job.sent += 1
+        else:
+            job.failed += 1
+        self._pending_states.append((status, attempts, error, job.job_id, chat_id))
+        await self._flush_states()
+
+    async def _flush_states(self, force: bool = False):
+        if not self._pending_states:
+            return
+        if not force and len(self._pending_states) < STATE_FLUSH_SIZE \
+                and time.monotonic() - self._last_flush < STATE_FLUSH_INTERVAL:
+            return
+        batch, self._pending_states = self._pending_states, []
+        self._last_flush = time.monotonic()
+        try:
+            await self.db.executemany(
+                "UPDATE broadcast_deliveries SET status = ?, attempts = ?, error = ?, updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND chat_id = ?",
+                batch
+            )
+        except Exception:
+            self._pending_states = batch + self._pending_states  # 下次重试
+            raise
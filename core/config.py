@@ -0,0 +1,215 @@
+"""全局配置服务：config.yaml 只解析一次，按 mtime 变化或 SIGHUP 热重载
+
+处理器通过 get_config() 读取不可变快照，整个过程没有任何文件 I/O。
+重载时先完整校验，校验失败则保留旧配置，不会因为一次错误编辑导致机器人崩溃。
+"""
+import os
+import signal
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+import yaml
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yaml"
+
+# 检查配置文件是否变化的间隔（秒）
+CONFIG_WATCH_INTERVAL = float(os.getenv("CONFIG_WATCH_INTERVAL", "5"))
+
+
+class ConfigError(ValueError):
+    """配置文件格式或取值不合法"""
+
+
+@dataclass(frozen=True)
+class GeneralSettings:
+    welcome_message: str = "欢迎 {user} 加入群组！"
+    welcome_enabled: bool = True
+
+
+@dataclass(frozen=True)
+class CheckInSettings:
+    base_points: int = 10
+    streak_bonus: int = 5
+    max_streak: int = 7
+
+
+@dataclass(frozen=True)
+class AdminSettings:
+    allow_kick: bool = True
+    allow_ban: bool = True
+    allow_mute: bool = True
+
+
+@dataclass(frozen=True)
+class AutoReplySettings:
+    enabled: bool = True
+    replies: Tuple[Tuple[str, str], ...] = ()  # ((pattern, response), ...)
+
+
+@dataclass(frozen=True)
+class FilterSettings:
+    sensitive_words: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class BotConfig:
+    """一次加载得到的完整配置快照（不可变）"""
+    general: GeneralSettings = field(default_factory=GeneralSettings)
+    check_in: CheckInSettings = field(default_factory=CheckInSettings)
+    admin: AdminSettings = field(default_factory=AdminSettings)
+    auto_reply: AutoReplySettings = field(default_factory=AutoReplySettings)
+    filter: FilterSettings = field(default_factory=FilterSettings)
+    raw: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+
+def _section(data: dict, *path: str) -> dict:
+    """按路径取出配置段，缺失时返回空字典"""
+    for key in path:
+        data = data.get(key) if isinstance(data, dict) else None
+        if data is None:
+            return {}
+    if not isinstance(data, dict):
+        raise ConfigError(f"配置段 {'.'.join(path)} 必须是字典")
+    return data
+
+
+def _value(section: dict, name: str, expected: type, default):
+    value = section.get(name, default)
+    # bool 是 int 的子类，需要单独排除
+    if expected is int and isinstance(value, bool) or not isinstance(value, expected):
+        raise ConfigError(f"配置项 {name} 应为 {expected.__name__}，实际为 {value!r}")
+    if expected is int and value < 0:
+        raise ConfigError(f"配置项 {name} 不能为负数：{value}")
+    return value
+
+
+def _str_list(section: dict, name: str) -> Tuple[str, ...]:
+    value = section.get(name) or []
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ConfigError(f"配置项 {name} 应为字符串列表")
+    return tuple(value)
+
+
+def parse_config(data: Optional[dict]) -> BotConfig:
+    """把 YAML 解析结果转换并校验为类型化的配置快照"""
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ConfigError("配置文件顶层必须是字典")
+
+    general = _section(data, "general")
+    # 兼容旧的 module_settings.welcome.message 写法
+    welcome = _section(data, "module_settings", "welcome")
+    general_settings = GeneralSettings(
+        welcome_message=_value(welcome, "message", str, None) if "message" in welcome
+        else _value(general, "welcome_message", str, GeneralSettings.welcome_message),
+        welcome_enabled=_value(general, "welcome_enabled", bool, True),
+    )
+
+    check_in = _section(data, "check_in")
+    check_in_settings = CheckInSettings(
+        base_points=_value(check_in, "base_points", int, CheckInSettings.base_points),
+        streak_bonus=_value(check_in, "streak_bonus", int, CheckInSettings.streak_bonus),
+        max_streak=_value(check_in, "max_streak", int, CheckInSettings.max_streak),
+    )
+
+    admin = _section(data, "admin")
+    admin_settings = AdminSettings(
+        allow_kick=_value(admin, "allow_kick", bool, True),
+        allow_ban=_value(admin, "allow_ban", bool, True),
+        allow_mute=_value(admin, "allow_mute", bool, True),
+    )
+
+    auto_reply = _section(data, "auto_reply")
+    replies = []
+    for rule in auto_reply.get("replies") or []:
+        if not isinstance(rule, dict):
+            raise ConfigError("auto_reply.replies 的每一项必须包含 pattern 和 response")
+        replies.append((_value(rule, "pattern", str, None), _value(rule, "response", str, None)))
+    auto_reply_settings = AutoReplySettings(
+        enabled=_value(auto_reply, "enabled", bool, True),
+        replies=tuple(replies),
+    )
+
+    # 兼容 filter 和 module_settings.filter 两种写法
+    filter_section = _section(data, "filter") or _section(data, "module_settings", "filter")
+    filter_settings = FilterSettings(sensitive_words=_str_list(filter_section, "sensitive_words"))
+
+    return BotConfig(
+        general=general_settings,
+        check_in=check_in_settings,
+        admin=admin_settings,
+        auto_reply=auto_reply_settings,
+        filter=filter_settings,
+        raw=MappingProxyType(data),
+    )
+
+
+class ConfigService:
+    """持有当前配置快照，负责检测文件变化并原子替换"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("CONFIG_PATH") or DEFAULT_CONFIG_PATH)
+        self._snapshot = BotConfig()
+        self._mtime: Optional[float] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.reload()
+
+    @property
+    def snapshot(self) -> BotConfig:
+        return self._snapshot
+
+    def reload(self) -> bool:
+        """重新读取并校验配置文件，成功后整体替换快照；失败时保留旧配置"""
+        try:
+            mtime = self.path.stat().st_mtime
+            with open(self.path, "r", encoding="utf-8") as f:
+                snapshot = parse_config(yaml.safe_load(f))
+        except (OSError, yaml.YAMLError, ConfigError) as e:
+            print(f"⚠️ 加载配置文件 {self.path} 失败，继续使用当前配置：{str(e)}")
+            return False
+        self._snapshot = snapshot  # 单次赋值即原子替换
+        self._mtime = mtime
+        print(f"✅ 已加载配置文件：{self.path}")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
+
+    def start_watching(self, interval: float = CONFIG_WATCH_INTERVAL):
+        """启动后台检查任务，并在支持的系统上监听 SIGHUP（需在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        if self._watch_task is None:
+            self._watch_task = loop.create_task(self._watch(interval))
+        if hasattr(signal, "SIGHUP"):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self.reload)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def stop_watching(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+
+# 全局配置服务实例
+config_service = ConfigService()
+
+
+def get_config() -> BotConfig:
+    """获取当前配置快照（纯内存读取）"""
+    return config_service.snapshot
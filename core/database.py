@@ -1,16 +1,43 @@
 import sqlite3
 import json  # 引入json模块，替代不安全的eval
-from typing import Dict, Any, List
+from contextlib import contextmanager
+from itertools import takewhile
+from typing import Dict, Any, Callable, Iterable, List, Mapping, Optional, Tuple
 import os
+import time
+from core.storage import AUTO_VACUUM_MODES, StorageProfile
+from core.settings_cache import SettingsCache, freeze, thaw
+
+# group_settings 中以 JSON 字符串存储的字段
+JSON_SETTINGS_FIELDS = (
+    "lottery_config", "stats_config", "auto_reply_rules",
+    "cron_jobs", "verification_rules", "ban_words_list",
+    "new_member_limit_config"
+)
+
+# 计数器 -> 从源表重新统计的 SQL（对账用，平时由写入方在同一事务中增量维护）
+COUNTER_SOURCES = {
+    "chats": "SELECT COUNT(*) FROM chats",
+    "users": "SELECT COUNT(*) FROM users",
+    "check_ins": "SELECT COALESCE(SUM(total_check_ins), 0) FROM group_user_points",
+    "points_issued": "SELECT COALESCE(SUM(earned), 0) FROM group_points_daily",
+    "messages": "SELECT COALESCE(SUM(messages), 0) FROM chat_hourly_stats",
+}
+ACTION_CHECK_IN = "check_in"
 
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, check_same_thread: bool = True, profile: Optional[StorageProfile] = None):
         db_dir = os.path.dirname(db_path)
         os.makedirs(db_dir, exist_ok=True)
         
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row  # 支持按列名访问
+        # 存储配置（WAL、synchronous、缓存等），默认从环境变量读取
+        self.profile = profile or StorageProfile.from_env()
+        # 异步门面的写线程需要关闭同线程检查（连接仍只被一个线程使用）
+        self.conn = self.profile.connect(db_path, check_same_thread=check_same_thread)
+        self._tx_depth = 0  # 当前嵌套的事务层数，大于 0 时 execute 不单独提交
+        self._commit_hooks: List[Callable[[], None]] = []  # 事务提交后才执行的回调（如更新缓存）
+        self.settings_cache = SettingsCache()
         self._create_tables()  # 初始化表结构
 
     def _create_tables(self):
@@ -46,7 +73,7 @@ class Database:
             welcome_enabled BOOLEAN DEFAULT 1,  
             welcome_message TEXT DEFAULT "🎉 欢迎 {user} 加入群组！请遵守群规～",
             filter_enabled BOOLEAN DEFAULT 1,
-            filter_words TEXT DEFAULT "广告,违规,测试",  
+            filter_words TEXT DEFAULT "",         -- 过滤词默认为空：审核按群组自行开启
             checkin_enabled BOOLEAN DEFAULT 1,
             checkin_base_reward INTEGER DEFAULT 5,
             checkin_consecutive_bonus INTEGER DEFAULT 2,
@@ -56,7 +83,7 @@ class Database:
             lottery_enabled BOOLEAN DEFAULT 1,    -- 抽奖功能开关
             lottery_config TEXT DEFAULT '{"prize": "神秘大奖", "participants": []}',  -- JSON 存规则
             stats_enabled BOOLEAN DEFAULT 1,      -- 统计功能开关
-            stats_config TEXT DEFAULT '{"message_count": 0, "active_hours": {}}',     -- JSON 存统计数据
+            stats_config TEXT DEFAULT '{"message_count": 0, "active_hours": {}}',     -- 旧版统计字段（消息统计已改用小时桶表）
             auto_reply_enabled BOOLEAN DEFAULT 1, -- 自动回复开关
             auto_reply_rules TEXT DEFAULT '{}',   -- JSON 存关键词-回复映射
             cron_enabled BOOLEAN DEFAULT 1,       -- 定时消息开关
@@ -64,7 +91,7 @@ class Database:
             verification_enabled BOOLEAN DEFAULT 1, -- 验证开关
             verification_rules TEXT DEFAULT '{"questions": ["验证问题1"]}', -- JSON 存验证规则
             ban_words_enabled BOOLEAN DEFAULT 1,  -- 违禁词开关
-            ban_words_list TEXT DEFAULT '["广告","违规"]', -- JSON 存违禁词
+            ban_words_list TEXT DEFAULT '[]',     -- JSON 存违禁词（默认为空）
             check_enabled BOOLEAN DEFAULT 1,      -- 检查功能开关
             score_enabled BOOLEAN DEFAULT 1,      -- 积分功能开关（原积分逻辑保留，新增开关）
             new_member_limit_enabled BOOLEAN DEFAULT 1, -- 新成员限制开关
@@ -85,6 +112,7 @@ class Database:
             PRIMARY KEY (group_id, user_id)  -- 联合主键确保群内用户独立
         )
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_user_points_rank ON group_user_points (group_id, points DESC)")
         
         # 4. 按群组隔离的积分日志表（原逻辑保留）
         cursor.execute("""
@@ -97,6 +125,31 @@ class Database:
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """)
+        # 覆盖索引：按群组 + 用户查询积分明细时不回表
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_group_points_log_user
+        ON group_points_log (group_id, user_id, timestamp, points, action)
+        """)
+        # 每人每天的积分汇总（与明细同一事务写入），明细超过保留期后只保留汇总
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS group_points_daily (
+            group_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,              -- 本地日期 YYYY-MM-DD
+            points INTEGER DEFAULT 0,       -- 当天积分净变化
+            earned INTEGER DEFAULT 0,       -- 当天获得的积分（只计正数）
+            changes INTEGER DEFAULT 0,      -- 当天积分变动次数
+            PRIMARY KEY (group_id, user_id, day)
+        ) WITHOUT ROWID
+        """)
+        # 汇总表是后来加的：旧库第一次启动时从现有明细生成
+        if (not cursor.execute("SELECT 1 FROM group_points_daily LIMIT 1").fetchone()
+                and cursor.execute("SELECT 1 FROM group_points_log LIMIT 1").fetchone()):
+            cursor.execute("""
+            INSERT INTO group_points_daily (group_id, user_id, day, points, earned, changes)
+            SELECT group_id, user_id, DATE(timestamp, 'localtime'), SUM(points), SUM(MAX(points, 0)), COUNT(*)
+            FROM group_points_log GROUP BY group_id, user_id, DATE(timestamp, 'localtime')
+            """)
         
         # 5. 新功能专属表（可选：复杂功能可拆表，示例抽奖参与记录表）
         cursor.execute("""
@@ -109,8 +162,132 @@ class Database:
             UNIQUE(group_id, user_id, lottery_id)
         )
         """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS group_lotteries (
+            lottery_id TEXT PRIMARY KEY,
+            group_id INTEGER NOT NULL,
+            prize TEXT NOT NULL,
+            status TEXT DEFAULT 'active',  -- active / drawing / ended
+            started_at REAL NOT NULL,
+            ended_at REAL,
+            winner_id INTEGER
+        )
+        """)
+        # 加权抽奖：抽奖模式、获奖人数、随机种子和全部获奖者（JSON），参与者的权重快照用于复核
+        self._add_missing_columns(cursor, "group_lotteries", {
+            "mode": "TEXT DEFAULT 'uniform'",
+            "winner_count": "INTEGER DEFAULT 1",
+            "seed": "INTEGER",
+            "winner_ids": "TEXT",
+            "draw_at": "REAL",            # 定时开奖时间
+            "draw_at_count": "INTEGER",   # 满多少人自动开奖
+        })
+        self._add_missing_columns(cursor, "group_lottery_participants", {"weight": "INTEGER"})
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_lotteries_status ON group_lotteries (status, group_id)")
+        
+        # 6. 用户目录表（从更新中被动收集，供排行榜、@用户名解析使用）
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            is_bot BOOLEAN DEFAULT 0,
+            last_seen REAL              -- 最后出现时间（Unix 时间戳）
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE)")
+        
+        # 7. 广播任务表 + 每个群组的投递状态（支持中断后续传）
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            created_by INTEGER,
+            total INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'running',  -- running / done
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',  -- pending / sent / failed
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (job_id, chat_id)
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_status ON broadcast_deliveries (job_id, status)")
+        
+        # 8. 持久化定时器（定时开奖等），启动时全部恢复
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timers (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fire_at REAL NOT NULL,
+            payload TEXT,
+            PRIMARY KEY (kind, key)
+        )
+        """)
+        
+        # 9. 消息统计小时桶（由统计收集器定期增量写入，报表只读聚合）
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_hourly_stats (
+            chat_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,          -- 小时起点（Unix 时间戳，UTC）
+            messages INTEGER DEFAULT 0,
+            PRIMARY KEY (chat_id, hour)
+        ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_hourly_stats (
+            chat_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            messages INTEGER DEFAULT 0,
+            PRIMARY KEY (chat_id, hour, user_id)
+        ) WITHOUT ROWID
+        """)
+        
+        # 10. 全局计数器（群组数、用户数、签到次数等），/stats 直接读取，不扫描大表
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """)
+        
+        # 11. 跨群组的全局积分 / 签到排名（与群内积分同一事务增量维护，定期从 group_user_points 对账）
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS global_user_points (
+            user_id INTEGER PRIMARY KEY,
+            points INTEGER NOT NULL DEFAULT 0,
+            check_ins INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_global_user_points_points ON global_user_points (points DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_global_user_points_check_ins ON global_user_points (check_ins DESC)")
         
         self.conn.commit()
+        # 计数器表刚创建（或旧库升级）时从源表初始化一次
+        if not cursor.execute("SELECT 1 FROM counters LIMIT 1").fetchone():
+            self.reconcile_counters()
+        # 全局排名表同理
+        if (not cursor.execute("SELECT 1 FROM global_user_points LIMIT 1").fetchone()
+                and cursor.execute("SELECT 1 FROM group_user_points LIMIT 1").fetchone()):
+            self.reconcile_global_points()
+
+    @staticmethod
+    def _add_missing_columns(cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+        """给已存在的表补上新增的列（CREATE TABLE IF NOT EXISTS 不会修改旧表）"""
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
 
     # ------------------------------
     # 通用执行方法（原逻辑保留）
@@ -118,9 +295,56 @@ class Database:
     def execute(self, query: str, params=None) -> sqlite3.Cursor:
         cursor = self.conn.cursor()
         cursor.execute(query, params or ())
-        self.conn.commit()
+        if not self._tx_depth:
+            self.conn.commit()
+            self._run_commit_hooks()
         return cursor
 
+    def on_commit(self, hook: Callable[[], None]):
+        """注册提交后回调：不在事务中时立即执行，否则等事务提交后执行、回滚时丢弃"""
+        if self._tx_depth:
+            self._commit_hooks.append(hook)
+        else:
+            hook()
+
+    def _run_commit_hooks(self):
+        hooks, self._commit_hooks = self._commit_hooks, []
+        for hook in hooks:
+            hook()
+
+    @contextmanager
+    def transaction(self):
+        """工作单元：块内的所有写操作一次提交，出现异常时整体回滚（支持嵌套，内层并入外层）"""
+        if not self._tx_depth and not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth -= 1
+            if not self._tx_depth:
+                self.conn.rollback()
+                self._commit_hooks.clear()
+            raise
+        self._tx_depth -= 1
+        if not self._tx_depth:
+            self.conn.commit()
+            self._run_commit_hooks()
+
+    @contextmanager
+    def savepoint(self, name: str = "sp"):
+        """事务内的保存点：块内出错只回滚这一部分（连同其提交后回调）"""
+        mark = len(self._commit_hooks)
+        self.conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute(f"ROLLBACK TO {name}")
+            self.conn.execute(f"RELEASE {name}")
+            del self._commit_hooks[mark:]
+            raise
+        self.conn.execute(f"RELEASE {name}")
+
     def fetchone(self, query: str, params=None) -> Dict[str, Any]:
         cursor = self.execute(query, params)
         row = cursor.fetchone()
@@ -139,44 +363,50 @@ class Database:
     # ------------------------------
     def init_group_settings(self, group_id: int):
         """新群组加入时，自动创建默认设置（含新功能）"""
+        if group_id in self.settings_cache:
+            return  # 已缓存说明设置一定存在，无需查询
         if not self.fetchone("SELECT group_id FROM group_settings WHERE group_id = ?", (group_id,)):
             self.execute("INSERT INTO group_settings (group_id) VALUES (?)", (group_id,))
             print(f"✅ 为新群组 {group_id} 初始化默认设置（含新功能）")
 
-    def get_group_settings(self, group_id: int) -> dict:
-        """获取当前群组的所有设置（自动初始化新群）"""
+    def get_group_settings(self, group_id: int) -> Mapping[str, Any]:
+        """获取当前群组的所有设置（自动初始化新群），返回缓存中的不可变对象"""
+        settings = self.settings_cache.get(group_id)
+        if settings is not None:
+            return settings
         self.init_group_settings(group_id)  # 确保设置存在
+        settings = self._load_group_settings(group_id)
+        self.on_commit(lambda: self.settings_cache.put(group_id, settings))
+        return settings
+
+    def _load_group_settings(self, group_id: int) -> Mapping[str, Any]:
         settings = self.fetchone("SELECT * FROM group_settings WHERE group_id = ?", (group_id,))
         # 将 JSON 字段转为字典，使用json.loads替代eval，增强安全性
-        for field in [
-            "lottery_config", "stats_config", "auto_reply_rules", 
-            "cron_jobs", "verification_rules", "ban_words_list", 
-            "new_member_limit_config"
-        ]:
+        for field in JSON_SETTINGS_FIELDS:
             if settings[field]:
                 try:
                     settings[field] = json.loads(settings[field])
                 except json.JSONDecodeError:
                     # 解析失败时返回空字典，避免程序崩溃
                     settings[field] = {}
-        return settings
+        return freeze(settings)
 
     def update_group_settings(self, group_id: int, **kwargs):
-        """更新当前群组的设置（支持新功能参数，自动处理 JSON 字段）"""
+        """更新当前群组的设置（支持新功能参数，自动处理 JSON 字段），提交后同步刷新缓存"""
         # 预处理 JSON 字段，使用json.dumps转为字符串，确保格式正确
-        for field in [
-            "lottery_config", "stats_config", "auto_reply_rules", 
-            "cron_jobs", "verification_rules", "ban_words_list", 
-            "new_member_limit_config"
-        ]:
+        for field in JSON_SETTINGS_FIELDS:
             if field in kwargs:
-                kwargs[field] = json.dumps(kwargs[field])
+                kwargs[field] = json.dumps(thaw(kwargs[field]))
         
         if not kwargs:
             return
         set_clause = ", ".join([f"{k} = ?" for k in kwargs.keys()])
         params = list(kwargs.values()) + [group_id]
-        self.execute(f"UPDATE group_settings SET {set_clause} WHERE group_id = ?", params)
+        with self.transaction():
+            self.init_group_settings(group_id)
+            self.execute(f"UPDATE group_settings SET {set_clause} WHERE group_id = ?", params)
+            settings = self._load_group_settings(group_id)
+            self.on_commit(lambda: self.settings_cache.put(group_id, settings))
         print(f"🔧 群组 {group_id} 更新设置：{kwargs}")
 
 
@@ -199,39 +429,84 @@ class Database:
             "total_check_ins": 0
         }
 
-    def update_group_user_points(self, group_id: int, user_id: int, points: int, action: str):
-        """更新用户在当前群组的积分（自动处理连续签到）"""
-        user_data = self.get_group_user_points(group_id, user_id)
-        new_points = user_data["points"] + points  # 计算新积分
-        
-        # 插入或更新积分记录（按群组+用户联合主键）
-        self.execute("""
-            INSERT INTO group_user_points 
-            (group_id, user_id, points, last_check_in, consecutive_days, total_check_ins)
-            VALUES (?, ?, ?, CURRENT_DATE, ?, ?)
-            ON CONFLICT(group_id, user_id) DO UPDATE SET 
-                points = ?,  -- 更新积分
-                consecutive_days = CASE 
-                    WHEN last_check_in = DATE('now', '-1 day') THEN consecutive_days + 1
-                    WHEN last_check_in = DATE('now') THEN consecutive_days
-                    ELSE 1
-                END,
-                total_check_ins = total_check_ins + CASE 
-                    WHEN last_check_in != DATE('now') THEN 1 
-                    ELSE 0 
-                END
-        """, (
-            group_id, user_id, new_points,
-            user_data["consecutive_days"], user_data["total_check_ins"],
-            new_points  # 冲突时更新的积分值
-        ))
-        
-        # 记录积分变动日志（关联群组）
-        self.execute("""
-            INSERT INTO group_points_log 
-            (group_id, user_id, action, points) 
-            VALUES (?, ?, ?, ?)
-        """, (group_id, user_id, action, points))
+    def award_points(self, group_id: int, user_id: int, points: int, action: str) -> int:
+        """给用户加（减）积分，返回新积分：points = points + ? 在数据库中计算，并发加分不会互相覆盖"""
+        # 积分、日志和计数器在同一个事务中提交
+        with self.transaction():
+            new_points = self.conn.execute("""
+                INSERT INTO group_user_points (group_id, user_id, points) VALUES (?, ?, ?)
+                ON CONFLICT(group_id, user_id) DO UPDATE SET points = points + excluded.points
+                RETURNING points
+            """, (group_id, user_id, points)).fetchone()[0]
+            self._log_points([(group_id, user_id, action, points)])
+        return new_points
+
+    def award_points_bulk(self, awards: Iterable[Tuple[int, int, int]], action: str) -> int:
+        """批量加分 [(group_id, user_id, points)]，一个事务、两条批量语句，返回处理的条数"""
+        awards = [award for award in awards if award[2]]
+        if not awards:
+            return 0
+        with self.transaction():
+            self.conn.executemany("""
+                INSERT INTO group_user_points (group_id, user_id, points) VALUES (?, ?, ?)
+                ON CONFLICT(group_id, user_id) DO UPDATE SET points = points + excluded.points
+            """, awards)
+            self._log_points([(group_id, user_id, action, points) for group_id, user_id, points in awards])
+        return len(awards)
+
+    def check_in(self, group_id: int, user_id: int, today: str, yesterday: str,
+                 base_points: int, streak_bonus: int, max_streak: int) -> Optional[Dict[str, int]]:
+        """签到：是否已签到、连续天数、累计次数和加分由一条 upsert 完成；今天已签到时返回 None
+
+        奖励 = base_points + streak_bonus × (min(连续天数, max_streak) - 1)，连续天数本身不封顶。
+        返回 {"points": 签到后总积分, "streak": 连续天数, "earned": 本次获得}
+        """
+        params = {
+            "group_id": group_id, "user_id": user_id, "today": today, "yesterday": yesterday,
+            "base": base_points, "bonus": streak_bonus, "max_streak": max(max_streak, 1),
+        }
+        with self.transaction():
+            row = self.conn.execute("""
+                INSERT INTO group_user_points
+                (group_id, user_id, points, last_check_in, consecutive_days, total_check_ins)
+                VALUES (:group_id, :user_id, :base, :today, 1, 1)
+                ON CONFLICT(group_id, user_id) DO UPDATE SET
+                    points = points + :base + :bonus * (MIN(
+                        CASE WHEN last_check_in = :yesterday THEN consecutive_days + 1 ELSE 1 END, :max_streak
+                    ) - 1),
+                    consecutive_days = CASE WHEN last_check_in = :yesterday THEN consecutive_days + 1 ELSE 1 END,
+                    total_check_ins = total_check_ins + 1,
+                    last_check_in = :today
+                WHERE last_check_in IS NULL OR last_check_in != :today
+                RETURNING points, consecutive_days
+            """, params).fetchone()
+            if row is None:
+                return None
+            streak = row[1]
+            earned = base_points + streak_bonus * (min(streak, params["max_streak"]) - 1)
+            self._log_points([(group_id, user_id, ACTION_CHECK_IN, earned)])
+            self.conn.execute("UPDATE global_user_points SET check_ins = check_ins + 1 WHERE user_id = ?", (user_id,))
+            self.bump_counters(check_ins=1)
+        return {"points": row[0], "streak": streak, "earned": earned}
+
+    def _log_points(self, entries: List[Tuple[int, int, str, int]]):
+        """在当前事务中写积分明细、当天汇总、全局排名和计数器 [(group_id, user_id, action, points)]"""
+        self.conn.executemany("""
+            INSERT INTO group_points_log (group_id, user_id, action, points) VALUES (?, ?, ?, ?)
+        """, entries)
+        self.conn.executemany("""
+            INSERT INTO group_points_daily (group_id, user_id, day, points, earned, changes)
+            VALUES (?, ?, DATE('now', 'localtime'), ?, MAX(?, 0), 1)
+            ON CONFLICT(group_id, user_id, day) DO UPDATE SET
+                points = points + excluded.points,
+                earned = earned + excluded.earned,
+                changes = changes + 1
+        """, [(group_id, user_id, points, points) for group_id, user_id, _, points in entries])
+        self.conn.executemany("""
+            INSERT INTO global_user_points (user_id, points) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET points = points + excluded.points
+        """, [(user_id, points) for _, user_id, _, points in entries])
+        self.bump_counters(points_issued=sum(max(points, 0) for _, _, _, points in entries))
 
     def get_group_top_users(self, group_id: int, limit: int = 10) -> list:
         """获取当前群组的积分排行榜（仅本群用户）"""
@@ -242,9 +517,154 @@ class Database:
         """, (group_id, limit))
 
 
+    def reconcile_global_points(self) -> int:
+        """从 group_user_points 重新汇总全局排名表（全表聚合，由后台定期执行），返回修正的用户数"""
+        with self.transaction():
+            fixed = self.conn.execute("""
+                INSERT INTO global_user_points (user_id, points, check_ins)
+                SELECT user_id, SUM(points), SUM(total_check_ins) FROM group_user_points WHERE true GROUP BY user_id
+                ON CONFLICT(user_id) DO UPDATE SET points = excluded.points, check_ins = excluded.check_ins
+                WHERE points != excluded.points OR check_ins != excluded.check_ins
+            """).rowcount
+            fixed += self.conn.execute("""
+                DELETE FROM global_user_points WHERE user_id NOT IN (SELECT user_id FROM group_user_points)
+            """).rowcount
+        return fixed
+
+    # ------------------------------
+    # 积分明细保留期与空间回收
+    # ------------------------------
+    def compact_points_log(self, cutoff: str, batch: int) -> int:
+        """删除 cutoff（UTC 'YYYY-MM-DD HH:MM:SS'）之前的一批积分明细，返回删除条数
+
+        汇总在写入时已经生成，这里只需要删掉过期明细。明细按自增 id 即时间顺序排列，
+        每批只读取最旧的 batch 行，不扫描整张表。
+        """
+        with self.transaction():
+            rows = self.conn.execute(
+                "SELECT id, timestamp FROM group_points_log ORDER BY id LIMIT ?", (batch,)
+            ).fetchall()
+            # 只取连续过期的前缀，遇到第一条未过期的明细就停止
+            expired = [row[0] for row in takewhile(lambda row: row[1] < cutoff, rows)]
+            if not expired:
+                return 0
+            return self.conn.execute("DELETE FROM group_points_log WHERE id <= ?", (expired[-1],)).rowcount
+
+    def migrate_auto_vacuum(self) -> bool:
+        """已有数据库切换到配置的 auto_vacuum 模式（只对新文件直接生效，旧文件需要一次完整 VACUUM）
+
+        返回是否执行了迁移；VACUUM 不能在事务中执行，耗时与数据库大小成正比。
+        """
+        mode = self.profile.auto_vacuum.upper()
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_MODES.index(mode):
+            return False
+        self.conn.execute(f"PRAGMA auto_vacuum = {mode}")
+        self.conn.execute("VACUUM")
+        return True
+
+    def incremental_vacuum(self, max_pages: int) -> int:
+        """把至多 max_pages 个空闲页归还给文件系统（需要 auto_vacuum = INCREMENTAL），返回回收的页数"""
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        pages = min(free, max_pages)
+        # Python 的 sqlite3 只执行 PRAGMA incremental_vacuum 的第一步（一页），需要逐页调用
+        for _ in range(pages):
+            self.conn.execute("PRAGMA incremental_vacuum(1)")
+        return pages
+
+
+    # ------------------------------
+    # 群组登记
+    # ------------------------------
+    def add_chat(self, bot_token: str, chat_id: int, chat_title: Optional[str]) -> bool:
+        """登记机器人加入的群组，返回是否为新群组"""
+        with self.transaction():
+            added = self.execute(
+                "INSERT OR IGNORE INTO chats (bot_token, chat_id, chat_title) VALUES (?, ?, ?)",
+                (bot_token, chat_id, chat_title)
+            ).rowcount > 0
+            if added:
+                self.bump_counters(chats=1)
+        return added
+
+
+    # ------------------------------
+    # 计数器
+    # ------------------------------
+    def bump_counters(self, **deltas: int):
+        """累加计数器；在调用方的事务中执行，与对应的写入一起提交或回滚"""
+        rows = [(name, delta) for name, delta in deltas.items() if delta]
+        if not rows:
+            return
+        with self.transaction():
+            self.conn.executemany("""
+                INSERT INTO counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            """, rows)
+
+    def get_counters(self) -> Dict[str, int]:
+        counters = dict.fromkeys(COUNTER_SOURCES, 0)
+        counters.update((row["name"], row["value"]) for row in self.fetchall("SELECT name, value FROM counters"))
+        return counters
+
+    def reconcile_counters(self) -> Dict[str, Dict[str, int]]:
+        """从源表重新统计所有计数器（全表扫描，仅按需执行），返回 {名称: {"before", "after"}}"""
+        with self.transaction():
+            before = self.get_counters()
+            after = {name: self.conn.execute(query).fetchone()[0] for name, query in COUNTER_SOURCES.items()}
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", list(after.items())
+            )
+        return {name: {"before": before[name], "after": after[name]} for name in COUNTER_SOURCES}
+
+
     # ------------------------------
     # 新功能专属方法（以抽奖为例，其他功能同理扩展）
     # ------------------------------
+    def create_lottery(self, lottery_id: str, group_id: int, prize: str, started_at: float,
+                       mode: str = "uniform", winner_count: int = 1,
+                       draw_at: Optional[float] = None, draw_at_count: Optional[int] = None):
+        """创建一场抽奖"""
+        self.execute("""
+            INSERT INTO group_lotteries
+            (lottery_id, group_id, prize, started_at, mode, winner_count, draw_at, draw_at_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (lottery_id, group_id, prize, started_at, mode, winner_count, draw_at, draw_at_count))
+
+    def get_lottery(self, lottery_id: str) -> Optional[Dict[str, Any]]:
+        return self.fetchone("SELECT * FROM group_lotteries WHERE lottery_id = ?", (lottery_id,))
+
+    def get_open_lotteries(self) -> List[Dict[str, Any]]:
+        """获取所有未结束的抽奖（启动时恢复用）"""
+        return self.fetchall("SELECT * FROM group_lotteries WHERE status != 'ended'")
+
+    def finish_lottery(self, lottery_id: str, winner_ids: Optional[List[int]] = None, seed: Optional[int] = None):
+        """结束抽奖（开奖或提前结束），参与记录保留以便核对"""
+        winner_ids = winner_ids or []
+        self.execute("""
+            UPDATE group_lotteries SET status = 'ended', ended_at = ?, winner_id = ?, winner_ids = ?, seed = ?
+            WHERE lottery_id = ?
+        """, (time.time(), winner_ids[0] if winner_ids else None, json.dumps(winner_ids), seed, lottery_id))
+
+    def set_lottery_weights(self, group_id: int, lottery_id: str, weights: List[tuple]):
+        """保存开奖时参与者的权重快照 [(user_id, weight), ...]"""
+        with self.transaction():
+            self.conn.executemany("""
+                UPDATE group_lottery_participants SET weight = ?
+                WHERE group_id = ? AND lottery_id = ? AND user_id = ?
+            """, [(weight, group_id, lottery_id, user_id) for user_id, weight in weights])
+
+    def add_lottery_participants(self, group_id: int, lottery_id: str, user_ids: List[int]):
+        """批量记录参与者（一次事务）"""
+        with self.transaction():
+            self.conn.executemany("""
+                INSERT INTO group_lottery_participants 
+                (group_id, user_id, lottery_id) 
+                VALUES (?, ?, ?)
+                ON CONFLICT DO NOTHING
+            """, [(group_id, user_id, lottery_id) for user_id in user_ids])
+
     def add_lottery_participant(self, group_id: int, user_id: int, lottery_id: str):
         """记录用户参与某群组的抽奖"""
         self.execute("""
@@ -257,8 +677,9 @@ class Database:
     def get_lottery_participants(self, group_id: int, lottery_id: str) -> List[Dict[str, Any]]:
         """获取某群组某抽奖的参与者"""
         return self.fetchall("""
-            SELECT user_id FROM group_lottery_participants 
+            SELECT user_id, weight FROM group_lottery_participants 
             WHERE group_id = ? AND lottery_id = ?
+            ORDER BY id
         """, (group_id, lottery_id))
 
     def clear_lottery_participants(self, group_id: int, lottery_id: str):
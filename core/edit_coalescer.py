@@ -0,0 +1,107 @@
+"""消息编辑合并器：高频刷新的消息（实时计数、内联键盘）按 (chat_id, message_id) 去抖
+
+- 只保留最新一次期望的内容，每条消息每个间隔最多真正编辑一次
+- 与上次已发送内容相同的编辑直接跳过
+- 统计提交次数和实际编辑次数，差值即节省的 API 调用
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from telegram.error import BadRequest
+
+# 同一条消息两次实际编辑之间的最小间隔（秒）
+EDIT_COALESCE_INTERVAL = float(os.getenv("EDIT_COALESCE_INTERVAL", "2"))
+# 最多跟踪的消息数
+EDIT_COALESCE_MAX_MESSAGES = 10000
+
+
+@dataclass
+class _EditState:
+    desired: Optional[Tuple[str, Dict[str, Any]]] = None  # 待发送的最新内容
+    sent: Optional[Tuple[str, Dict[str, Any]]] = None     # 最近一次已发送的内容
+    last_flush: float = 0.0
+    task: Optional[asyncio.Task] = None
+
+
+class EditCoalescer:
+    def __init__(self, interval: float = EDIT_COALESCE_INTERVAL, max_messages: int = EDIT_COALESCE_MAX_MESSAGES):
+        self.interval = interval
+        self.max_messages = max_messages
+        self._states: "OrderedDict[Tuple[int, int], _EditState]" = OrderedDict()
+        self.submitted = 0
+        self.edited = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def submit(self, bot, chat_id: int, message_id: int, text: str, **kwargs):
+        """登记一次期望的编辑（reply_markup / parse_mode 等参数原样传给 edit_message_text），立即返回"""
+        key = (chat_id, message_id)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _EditState()
+            self._evict()
+        else:
+            self._states.move_to_end(key)
+        self.submitted += 1
+        state.desired = (text, kwargs)
+        if state.task is None or state.task.done():
+            delay = max(0.0, state.last_flush + self.interval - time.monotonic())
+            state.task = asyncio.get_running_loop().create_task(self._flush(bot, key, state, delay))
+
+    async def cancel(self, chat_id: int, message_id: int):
+        """放弃某条消息尚未发出的编辑（例如消息即将被直接改成最终结果）"""
+        state = self._states.pop((chat_id, message_id), None)
+        if state and state.task and not state.task.done():
+            state.task.cancel()
+            await asyncio.gather(state.task, return_exceptions=True)
+
+    async def _flush(self, bot, key: Tuple[int, int], state: _EditState, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        while state.desired is not None:
+            desired, state.desired = state.desired, None
+            state.last_flush = time.monotonic()
+            if desired == state.sent:
+                self.unchanged += 1
+            else:
+                text, kwargs = desired
+                try:
+                    await bot.edit_message_text(text, chat_id=key[0], message_id=key[1], **kwargs)
+                    state.sent = desired
+                    self.edited += 1
+                except BadRequest as e:
+                    if "not modified" in str(e).lower():
+                        state.sent = desired
+                    else:
+                        self.failed += 1
+                        print(f"⚠️ 合并编辑失败（{key[0]}/{key[1]}）：{str(e)}")
+                except Exception as e:
+                    self.failed += 1
+                    print(f"⚠️ 合并编辑失败（{key[0]}/{key[1]}）：{str(e)}")
+            if state.desired is not None:
+                await asyncio.sleep(self.interval)
+
+    def _evict(self):
+        while len(self._states) > self.max_messages:
+            for key, state in self._states.items():
+                if state.task is None or state.task.done():
+                    del self._states[key]
+                    break
+            else:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "edited": self.edited,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "saved": self.submitted - self.edited - self.failed,
+            "tracked_messages": len(self._states),
+        }
+
+
+edit_coalescer = EditCoalescer()
@@ -11,11 +11,8 @@ async def handle_bot_added(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not chat:
             return
         db = context.bot_data["db"]
-        # 插入或忽略已存在的群组信息
-        db.execute(
-            "INSERT OR IGNORE INTO chats (bot_token, chat_id, chat_title) VALUES (?, ?, ?)",
-            (context.bot.token, chat.id, chat.title)
-        )
+        # 插入或忽略已存在的群组信息（新群组同时累加群组计数器）
+        await db.call("add_chat", context.bot.token, chat.id, chat.title)
         owner_id = context.bot_data["owner_id"]
         await context.bot.send_message(
             chat_id=owner_id,
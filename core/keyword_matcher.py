@@ -0,0 +1,118 @@
+"""多关键词匹配引擎（Aho-Corasick 自动机）
+
+一次构建、多次匹配：扫描一条消息的耗时只与消息长度和命中数有关，与词表大小无关。
+相同词表的群组共享同一个自动机实例，词表变化时才重新构建。
+"""
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 词表缓存上限（按不同词表计数，而不是按群组）
+MATCHER_CACHE_SIZE = 256
+
+
+class KeywordMatcher:
+    """Aho-Corasick 自动机，支持一次扫描返回所有命中位置"""
+
+    def __init__(self, words: Iterable[str], ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        # 去重、去空白，保持稳定顺序
+        self.words: Tuple[str, ...] = tuple(dict.fromkeys(w.strip() for w in words if w and w.strip()))
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]  # 每个状态命中的词（下标）
+        self._build()
+
+    def _build(self):
+        # 1. 构建字典树
+        for index, word in enumerate(self.words):
+            state = 0
+            for char in self._normalize(word):
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] = self._output[state] + (index,)
+
+        # 2. BFS 计算失败指针，并把失败链上的输出合并到当前状态
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _normalize(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
+
+    def _scan(self, text: str):
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(self._normalize(text)):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield position, output[state]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """返回所有命中：[(起始位置, 结束位置, 关键词), ...]，一次扫描完成"""
+        matches = []
+        if not self.words or not text:
+            return matches
+        for position, word_indexes in self._scan(text):
+            for index in word_indexes:
+                word = self.words[index]
+                matches.append((position - len(word) + 1, position + 1, word))
+        return matches
+
+    def search(self, text: str) -> Optional[str]:
+        """返回第一个命中的关键词（没有命中返回 None），命中即停止扫描"""
+        if not self.words or not text:
+            return None
+        for _, word_indexes in self._scan(text):
+            return self.words[word_indexes[0]]
+        return None
+
+    def __contains__(self, text: str) -> bool:
+        return self.search(text) is not None
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+_matchers: "OrderedDict[Tuple[Tuple[str, ...], bool], KeywordMatcher]" = OrderedDict()
+
+
+def get_matcher(words: Iterable[str], ignore_case: bool = True) -> KeywordMatcher:
+    """按词表获取（或构建）共享的匹配器，词表内容相同的群组复用同一个自动机"""
+    key = (tuple(sorted({w.strip() for w in words if w and w.strip()})), ignore_case)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = KeywordMatcher(key[0], ignore_case=ignore_case)
+        _matchers[key] = matcher
+        if len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    else:
+        _matchers.move_to_end(key)
+    return matcher
+
+
+def parse_word_list(value) -> List[str]:
+    """兼容群组设置中的两种词表格式：JSON 列表（ban_words_list）或逗号分隔字符串（filter_words）"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [w.strip() for w in value.replace("，", ",").split(",") if w.strip()]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [str(w).strip() for w in value if str(w).strip()]
+    return []
@@ -0,0 +1,219 @@
+"""积分排行榜：每个群在内存中维护一个按积分有序的数组，排名查询不再排序整个群
+
+- 启动时从 group_user_points 一次性重建
+- 每次积分变动由积分服务增量更新：二分定位、删除旧位置、插入新位置
+- 前 N 名、某人的排名、"我附近的人" 都是一次二分 + 切片，O(log n)
+- 排序键把 (-积分, user_id) 编码成单个整数，20 万成员的群只占几 MB
+
+全局排行榜（跨群组）：
+- global_user_points 是物化的每人总积分 / 总签到次数，与群内积分在同一事务中增量更新
+- 内存中只保留每个指标的前 K 名；榜内用户的变动直接更新，无法确定结果时（榜外用户加分、
+  榜内用户减分）标记失效，下次查询按索引重新读取前 K 行
+- 后台定期从 group_user_points 对账，修正物化表的任何偏差
+"""
+import os
+import asyncio
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_USER_BITS = 64
+
+GLOBAL_TOP_K = int(os.getenv("GLOBAL_TOP_K", "100"))
+# 全局排名表对账间隔（秒）
+GLOBAL_RECONCILE_INTERVAL = float(os.getenv("GLOBAL_RECONCILE_INTERVAL", "21600"))
+GLOBAL_METRICS = ("points", "check_ins")
+
+
+def _key(points: int, user_id: int) -> int:
+    """积分高的在前，同分按 user_id 升序"""
+    return (-points << _USER_BITS) + user_id
+
+
+def _decode(key: int) -> Tuple[int, int]:
+    """排序键 -> (user_id, points)"""
+    return key & ((1 << _USER_BITS) - 1), -(key >> _USER_BITS)
+
+
+class GroupRanking:
+    def __init__(self, entries: Iterable[Tuple[int, int]] = ()):
+        self.points: Dict[int, int] = dict(entries)
+        self.keys: List[int] = sorted(_key(points, user_id) for user_id, points in self.points.items())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, user_id: int, delta: int):
+        old = self.points.get(user_id)
+        if old is not None:
+            index = bisect_left(self.keys, _key(old, user_id))
+            del self.keys[index]
+        new = (old or 0) + delta
+        self.points[user_id] = new
+        insort(self.keys, _key(new, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """名次（从 1 开始，同分同名次），不在榜上返回 None"""
+        points = self.points.get(user_id)
+        if points is None:
+            return None
+        # 积分严格更高的人数 + 1
+        return bisect_left(self.keys, -points << _USER_BITS) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, int]]:
+        return [_decode(key) for key in self.keys[:limit]]
+
+    def around(self, user_id: int, radius: int) -> List[Tuple[int, int, int]]:
+        """某人前后各 radius 名 [(名次, user_id, points)]"""
+        points = self.points.get(user_id)
+        if points is None:
+            return []
+        index = bisect_left(self.keys, _key(points, user_id))
+        start = max(index - radius, 0)
+        window = [_decode(key) for key in self.keys[start:index + radius + 1]]
+        return [(self.rank(uid), uid, pts) for uid, pts in window]
+
+
+class Leaderboard:
+    def __init__(self, db):
+        self.db = db
+        self.groups: Dict[int, GroupRanking] = {}
+        self.loaded = False
+
+    async def load(self):
+        """从数据库重建所有群的排行榜"""
+        def read(conn):
+            groups: Dict[int, List[Tuple[int, int]]] = {}
+            for group_id, user_id, points in conn.execute(
+                "SELECT group_id, user_id, points FROM group_user_points"
+            ):
+                groups.setdefault(group_id, []).append((user_id, points or 0))
+            return {group_id: GroupRanking(entries) for group_id, entries in groups.items()}
+
+        self.groups = await self.db.read(read, label="leaderboard:load")
+        self.loaded = True
+        members = sum(len(ranking) for ranking in self.groups.values())
+        print(f"🏆 排行榜已加载：{len(self.groups)} 个群组，{members} 名成员")
+
+    def apply(self, changes: Iterable[Tuple[int, int, int]]):
+        """积分变动已提交后调用 [(group_id, user_id, delta)]；只用增量，多个并发变动的先后顺序不影响结果"""
+        if not self.loaded:
+            return  # 加载时会读到已提交的最新积分
+        for group_id, user_id, delta in changes:
+            ranking = self.groups.get(group_id)
+            if ranking is None:
+                ranking = self.groups[group_id] = GroupRanking()
+            ranking.add(user_id, delta)
+
+    def top(self, group_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+        """前 limit 名 [(user_id, points)]"""
+        ranking = self.groups.get(group_id)
+        return ranking.top(limit) if ranking else []
+
+    def rank(self, group_id: int, user_id: int) -> Optional[Tuple[int, int, int]]:
+        """(名次, 积分, 群内上榜人数)，不在榜上返回 None"""
+        ranking = self.groups.get(group_id)
+        if not ranking or user_id not in ranking.points:
+            return None
+        return ranking.rank(user_id), ranking.points[user_id], len(ranking)
+
+    def around(self, group_id: int, user_id: int, radius: int = 2) -> List[Tuple[int, int, int]]:
+        ranking = self.groups.get(group_id)
+        return ranking.around(user_id, radius) if ranking else []
+
+    def stats(self) -> dict:
+        return {"groups": len(self.groups), "members": sum(len(r) for r in self.groups.values())}
+
+
+class TopK:
+    """某个指标的前 K 名缓存"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.values: Dict[int, int] = {}
+        self.complete = False  # 总人数不足 K 时缓存包含所有人，任何变动都能直接更新
+        self.stale = True
+
+    def load(self, rows: List[Tuple[int, int]]):
+        self.values = dict(rows)
+        self.complete = len(rows) < self.limit
+        self.stale = False
+
+    def apply(self, user_id: int, delta: int):
+        if self.stale or not delta:
+            return
+        if user_id in self.values:
+            self.values[user_id] += delta
+            if delta < 0 and not self.complete:
+                self.stale = True  # 榜外的人可能反超
+        elif self.complete:
+            self.values[user_id] = delta  # 缓存包含所有人，不在其中说明之前没有记录
+            if len(self.values) > self.limit:
+                del self.values[min(self.values, key=lambda uid: (self.values[uid], -uid))]
+                self.complete = False
+        elif delta > 0:
+            self.stale = True  # 榜外用户的总数未知，可能进入前 K
+
+    def ranking(self, limit: int) -> List[Tuple[int, int]]:
+        ordered = sorted(self.values.items(), key=lambda item: (-item[1], item[0]))
+        return ordered[:min(limit, self.limit)]
+
+
+class GlobalLeaderboard:
+    def __init__(self, db, top_k: int = GLOBAL_TOP_K):
+        self.db = db
+        self.boards: Dict[str, TopK] = {metric: TopK(top_k) for metric in GLOBAL_METRICS}
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.reconciled = 0
+
+    def apply(self, changes: Iterable[Tuple[int, int, int]]):
+        """积分变动已提交后调用 [(group_id, user_id, delta)]"""
+        board = self.boards["points"]
+        for _, user_id, delta in changes:
+            board.apply(user_id, delta)
+
+    def check_in(self, user_id: int):
+        self.boards["check_ins"].apply(user_id, 1)
+
+    async def top(self, metric: str, limit: int = 10) -> List[Tuple[int, int]]:
+        """全局前 limit 名 [(user_id, 数值)]；缓存有效时不访问数据库"""
+        board = self.boards[metric]
+        if board.stale:
+            rows = await self.db.fetchall(
+                f"SELECT user_id, {metric} AS value FROM global_user_points ORDER BY {metric} DESC LIMIT ?",
+                (board.limit,)
+            )
+            board.load([(row["user_id"], row["value"]) for row in rows])
+            self.reloads += 1
+        return board.ranking(limit)
+
+    async def reconcile(self) -> int:
+        """从各群积分重新汇总物化表，返回修正的用户数"""
+        fixed = await self.db.call("reconcile_global_points")
+        for board in self.boards.values():
+            board.stale = True
+        self.reconciled += fixed
+        return fixed
+
+    async def _loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                fixed = await self.reconcile()
+                if fixed:
+                    print(f"🔧 全局排行榜对账：修正 {fixed} 名用户")
+            except Exception as e:
+                print(f"⚠️ 全局排行榜对账失败：{str(e)}")
+
+    def start(self, interval: float = GLOBAL_RECONCILE_INTERVAL):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"reloads": self.reloads, "reconciled": self.reconciled}
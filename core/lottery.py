@@ -0,0 +1,204 @@
+"""抽奖状态存储：抽奖和参与记录持久化在数据库中，重启后自动恢复
+
+- 每场抽奖在内存中只保存紧凑的参与者 ID 数组 + 集合索引，重复参与检查 O(1)
+- 参与记录攒成一批写库（group_lottery_participants），不在点击路径上等待磁盘
+- 抽奖在 ID 数组上 O(1) 随机取样；加权模式（积分 / 连续签到天数作为票数）用树状数组 O(k log n) 抽取多名获奖者
+- 每次开奖使用新生成并落库的随机种子，配合参与顺序和权重快照可以复现结果
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from core.weighted_draw import weighted_sample
+
+# 参与记录批量写库的间隔（秒）
+LOTTERY_FLUSH_INTERVAL = float(os.getenv("LOTTERY_FLUSH_INTERVAL", "1"))
+
+STATUS_ACTIVE = "active"
+STATUS_DRAWING = "drawing"
+STATUS_ENDED = "ended"
+
+# 抽奖模式 -> group_user_points 中作为票数的列（None 表示等概率）
+MODES = {
+    "uniform": None,
+    "points": "points",
+    "streak": "consecutive_days",
+}
+MAX_WINNERS = 100
+
+
+def pick_winners(participant_ids: Sequence[int], weights: Optional[Sequence[int]], winner_count: int,
+                 seed: int) -> List[int]:
+    """由参与顺序、权重（None 为等概率）和种子确定获奖者，开奖和复核共用"""
+    rng = random.Random(seed)
+    if weights is None:
+        indexes = rng.sample(range(len(participant_ids)), min(winner_count, len(participant_ids)))
+    else:
+        indexes = weighted_sample(weights, winner_count, rng)
+    return [participant_ids[i] for i in indexes]
+
+
+@dataclass
+class Lottery:
+    lottery_id: str
+    chat_id: int
+    prize: str
+    start_time: float
+    status: str = STATUS_ACTIVE
+    mode: str = "uniform"
+    winner_count: int = 1
+    draw_at: Optional[float] = None        # 定时开奖时间
+    draw_at_count: Optional[int] = None    # 满多少人自动开奖
+    participant_ids: array = field(default_factory=lambda: array("q"))  # 按参与顺序
+    _index: set = field(default_factory=set)
+
+    def __len__(self) -> int:
+        return len(self.participant_ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._index
+
+    def add(self, user_id: int) -> bool:
+        if user_id in self._index:
+            return False
+        self._index.add(user_id)
+        self.participant_ids.append(user_id)
+        return True
+
+    def draw(self, rng: Optional[random.Random] = None) -> int:
+        """均匀抽取一名参与者（动画展示用，正式开奖见 LotteryStore.draw）"""
+        return (rng or random).choice(self.participant_ids)
+
+
+class LotteryStore:
+    def __init__(self, db):
+        self.db = db
+        self.lotteries: Dict[int, Lottery] = {}  # chat_id -> 进行中的抽奖
+        self._pending: List[Tuple[Lottery, int]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        """启动时恢复所有未结束的抽奖（开奖中断的恢复为进行中）"""
+        for row in await self.db.call("get_open_lotteries"):
+            lottery = Lottery(
+                lottery_id=row["lottery_id"], chat_id=row["group_id"],
+                prize=row["prize"], start_time=row["started_at"],
+                mode=row["mode"] or "uniform", winner_count=row["winner_count"] or 1,
+                draw_at=row["draw_at"], draw_at_count=row["draw_at_count"],
+            )
+            for participant in await self.db.call("get_lottery_participants", lottery.chat_id, lottery.lottery_id):
+                lottery.add(participant["user_id"])
+            self.lotteries[lottery.chat_id] = lottery
+        if self.lotteries:
+            print(f"🔁 恢复 {len(self.lotteries)} 个进行中的抽奖")
+
+    def get(self, chat_id: int) -> Optional[Lottery]:
+        return self.lotteries.get(chat_id)
+
+    async def start(self, chat_id: int, prize: str, mode: str = "uniform", winner_count: int = 1,
+                    draw_at: Optional[float] = None, draw_at_count: Optional[int] = None) -> Lottery:
+        now = time.time()
+        lottery = Lottery(
+            lottery_id=f"{chat_id}:{int(now * 1000)}", chat_id=chat_id, prize=prize, start_time=now,
+            mode=mode, winner_count=winner_count, draw_at=draw_at, draw_at_count=draw_at_count,
+        )
+        await self.db.call(
+            "create_lottery", lottery.lottery_id, chat_id, prize, now, mode, winner_count, draw_at, draw_at_count
+        )
+        self.lotteries[chat_id] = lottery
+        return lottery
+
+    def join(self, lottery: Lottery, user_id: int) -> bool:
+        """登记参与（同步、O(1)），返回 False 表示已参与过；写库在后台批量进行"""
+        if not lottery.add(user_id):
+            return False
+        self._pending.append((lottery, user_id))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later(LOTTERY_FLUSH_INTERVAL))
+        return True
+
+    async def finish(self, lottery: Lottery, winner_ids: Optional[List[int]] = None, seed: Optional[int] = None):
+        """开奖或提前结束：先把未写入的参与记录落库，再标记结束"""
+        await self.flush()
+        lottery.status = STATUS_ENDED
+        if self.lotteries.get(lottery.chat_id) is lottery:
+            del self.lotteries[lottery.chat_id]
+        await self.db.call("finish_lottery", lottery.lottery_id, winner_ids, seed)
+
+    async def _weights(self, lottery: Lottery) -> Optional[List[int]]:
+        """每人的票数 = 1 + 对应列的值（未签到过的参与者也有一票）"""
+        column = MODES[lottery.mode]
+        if column is None:
+            return None
+        rows = await self.db.fetchall(
+            f"SELECT user_id, {column} AS value FROM group_user_points WHERE group_id = ?", (lottery.chat_id,)
+        )
+        values = {row["user_id"]: max(row["value"] or 0, 0) for row in rows}
+        return [1 + values.get(user_id, 0) for user_id in lottery.participant_ids]
+
+    async def draw(self, lottery: Lottery) -> Tuple[List[int], int]:
+        """正式开奖：生成并记录种子、（加权模式）保存权重快照，返回 (获奖者列表, 种子)"""
+        lottery.status = STATUS_DRAWING
+        seed = random.SystemRandom().getrandbits(63)
+        weights = await self._weights(lottery)
+        winner_ids = pick_winners(lottery.participant_ids, weights, lottery.winner_count, seed)
+        await self.flush()
+        if weights is not None:
+            await self.db.call(
+                "set_lottery_weights", lottery.chat_id, lottery.lottery_id,
+                list(zip(lottery.participant_ids, weights))
+            )
+        await self.finish(lottery, winner_ids, seed)
+        return winner_ids, seed
+
+    async def replay(self, lottery_id: str) -> Optional[Tuple[List[int], List[int]]]:
+        """复核已结束的抽奖：返回 (记录的获奖者, 按种子重新计算的获奖者)"""
+        row = await self.db.call("get_lottery", lottery_id)
+        if not row or row["seed"] is None:
+            return None
+        participants = await self.db.call("get_lottery_participants", row["group_id"], lottery_id)
+        participant_ids = [p["user_id"] for p in participants]
+        weights = None
+        if MODES.get(row["mode"] or "uniform") is not None:
+            weights = [p["weight"] or 0 for p in participants]
+        recomputed = pick_winners(participant_ids, weights, row["winner_count"] or 1, row["seed"])
+        return json.loads(row["winner_ids"] or "[]"), recomputed
+
+    # ------------------------------
+    # 批量写库
+    # ------------------------------
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ 抽奖参与记录写库失败：{str(e)}")
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        by_lottery: Dict[str, Tuple[Lottery, List[int]]] = {}
+        for lottery, user_id in batch:
+            by_lottery.setdefault(lottery.lottery_id, (lottery, []))[1].append(user_id)
+
+        def write(db):
+            for lottery, user_ids in by_lottery.values():
+                db.add_lottery_participants(lottery.chat_id, lottery.lottery_id, user_ids)
+
+        try:
+            await self.db.write(write, label="lottery:join_batch")
+        except Exception:
+            self._pending = batch + self._pending  # 下次重试
+            raise
+        return len(batch)
+
+    async def stop(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        await self.flush()
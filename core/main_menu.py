@@ -1,6 +1,7 @@
 from telegram.ext import CommandHandler, filters, ContextTypes
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from core.permissions import is_chat_admin
+from core.response_cache import TOPIC_ADMINS, TOPIC_SETTINGS, CachedResponse, response_cache
 
 def register_main_menu(application):
     """注册启动命令和主菜单"""
@@ -44,28 +45,23 @@ async def group_settings_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("❌ 数据库未初始化")
         return
     
-    # 获取群组设置
-    settings = await db.fetchone(
-        "SELECT welcome_enabled, check_in_enabled FROM group_settings WHERE chat_id = ?",
-        (chat.id,)
-    )
-    if not settings:
-        # 初始化默认设置
-        settings = {"welcome_enabled": True, "check_in_enabled": True}
-        await db.execute(
-            "INSERT INTO group_settings (chat_id, welcome_enabled, check_in_enabled) VALUES (?, ?, ?)",
-            (chat.id, True, True)
-        )
+    is_admin = await is_chat_admin(update, context)
     
-    settings_text = "⚙️ 本群功能设置\n\n"
-    settings_text += f"欢迎消息：{'开启' if settings['welcome_enabled'] else '关闭'}\n"
-    settings_text += f"签到功能：{'开启' if settings['check_in_enabled'] else '关闭'}\n"
+    async def render() -> CachedResponse:
+        # 设置读自群组设置缓存，新群自动初始化默认设置
+        settings = await db.get_group_settings(chat.id)
+        settings_text = "⚙️ 本群功能设置\n\n"
+        settings_text += f"欢迎消息：{'开启' if settings['welcome_enabled'] else '关闭'}\n"
+        settings_text += f"签到功能：{'开启' if settings['checkin_enabled'] else '关闭'}\n"
+        
+        # 管理员可看到设置按钮
+        if is_admin:
+            keyboard = [[InlineKeyboardButton("修改设置", callback_data="settings:edit")]]
+            return CachedResponse(settings_text, {"reply_markup": InlineKeyboardMarkup(keyboard)})
+        return CachedResponse(settings_text)
     
-    # 管理员可看到设置按钮
-    if await is_chat_admin(update, context):
-        keyboard = [[InlineKeyboardButton("修改设置", callback_data="settings:edit")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(settings_text, reply_markup=reply_markup)
-    else:
-        await update.message.reply_text(settings_text)
-    
\ No newline at end of file
+    response = await response_cache.fetch(
+        chat.id, "group_settings", "admin" if is_admin else "member",
+        ((TOPIC_SETTINGS, chat.id), (TOPIC_ADMINS, chat.id)), render
+    )
+    await update.message.reply_text(response.text, **response.kwargs)
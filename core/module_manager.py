@@ -3,12 +3,16 @@ import importlib
 from pathlib import Path
 
 def load_modules(application):
-    """动态加载所有模块，排除filter模块"""
+    """动态加载所有模块（文本消息类模块通过 core.pipeline 挂载阶段，不会再互相遮蔽）
+
+    filter 模块也会加载，但审核是按群组开启的：全局敏感词默认为空，群组词表默认为空，
+    旧库中的表结构默认词表也不生效，只有群组自己保存过词表才会删除消息。
+    """
     modules_dir = Path(__file__).parent.parent / "modules"
     
-    # 遍历模块目录，排除filter模块
+    # 遍历模块目录
     for item in modules_dir.iterdir():
-        if item.is_dir() and item.name != "filter":  # 排除filter模块
+        if item.is_dir() and not item.name.startswith("__"):
             try:
                 # 导入模块的main.py
                 module_name = f"modules.{item.name}.main"
@@ -0,0 +1,340 @@
+"""出站请求调度器：所有 Bot API 调用按优先级排队，统一遵守发送预算
+
+作为 PTB 的 rate_limiter 安装（ApplicationBuilder().rate_limiter(...)），因此
+context.bot.*、message.reply_text、query.edit_message_text 等调用都会经过这里，模块无需改动。
+
+- 优先级：审核（删消息/封禁/禁言） > 回复 > 编辑 > 批量（广播）
+- 全局令牌桶约束总发送速率；回复、编辑、批量还受单聊天令牌桶约束，审核操作只受全局约束，
+  刷屏时删除不会排在同一群组的动画编辑后面
+- 同一条消息排队中的多次编辑合并为最后一次；积压严重时丢弃过期的编辑
+- 收到 RetryAfter 时暂停全部发送，并把该请求重新排到队首
+
+调度器只能重排已经排队的请求：更新是逐个处理的，处理器 await 一条被单聊天限流的回复时，
+后续更新都要等着。审核、动画等路径上的低优先级发送用 send_detached 放到后台，不阻塞调用方。
+"""
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+from core.rate_limit import GLOBAL_RATE, KeyedBuckets, TokenBucket, chat_rate, retry_after_seconds
+
+PRIORITY_MODERATION = 0
+PRIORITY_REPLY = 1
+PRIORITY_EDIT = 2
+PRIORITY_BULK = 3
+PRIORITY_NAMES = ("moderation", "reply", "edit", "bulk")
+
+MODERATION_ENDPOINTS = frozenset({
+    "deleteMessage", "deleteMessages", "banChatMember", "unbanChatMember",
+    "restrictChatMember", "banChatSenderChat", "declineChatJoinRequest",
+})
+EDIT_ENDPOINTS = frozenset({
+    "editMessageText", "editMessageCaption", "editMessageMedia",
+    "editMessageReplyMarkup", "editMessageLiveLocation",
+})
+REPLY_ENDPOINTS = frozenset({
+    "copyMessage", "forwardMessage", "answerCallbackQuery", "pinChatMessage", "unpinChatMessage",
+})
+
+# 全局发送预算（条/秒）
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", str(GLOBAL_RATE)))
+# 单聊天允许的突发条数
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "5"))
+# 队列积压超过该长度时开始丢弃过期编辑
+OUTBOUND_HIGH_WATER = int(os.getenv("OUTBOUND_HIGH_WATER", "500"))
+# 编辑请求的过期时间（秒）
+OUTBOUND_EDIT_TTL = float(os.getenv("OUTBOUND_EDIT_TTL", "30"))
+# RetryAfter 后的最大重试次数
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "1"))
+# 每个优先级队列里为寻找可发送请求最多向后查看的条数（避免单个群组堵住整个队列）
+SCAN_DEPTH = 64
+
+
+class OutboundDropped(TelegramError):
+    """请求因积压过期被调度器丢弃"""
+
+
+_detached: set = set()
+
+
+def send_detached(request: Awaitable[Any], what: str = "后台发送") -> asyncio.Task:
+    """在后台执行一次发送（仍经过调度器排队），调用方立即返回；失败只记录日志"""
+    async def run():
+        try:
+            await request
+        except Exception as e:
+            print(f"⚠️ {what}失败：{str(e)}")
+
+    task = asyncio.get_running_loop().create_task(run())
+    _detached.add(task)
+    task.add_done_callback(_detached.discard)
+    return task
+
+
+def classify(endpoint: str) -> Optional[int]:
+    """按 API 方法返回优先级；None 表示不排队（getChat、getChatMember 等查询类请求）"""
+    if endpoint in MODERATION_ENDPOINTS:
+        return PRIORITY_MODERATION
+    if endpoint in EDIT_ENDPOINTS:
+        return PRIORITY_EDIT
+    if endpoint.startswith("send") or endpoint in REPLY_ENDPOINTS:
+        return PRIORITY_REPLY
+    return None
+
+
+@dataclass
+class OutboundRequest:
+    priority: int
+    endpoint: str
+    callback: Callable
+    args: Any
+    kwargs: Dict[str, Any]
+    chat_id: Optional[int]
+    merge_key: Optional[Tuple] = None
+    futures: List[asyncio.Future] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    retries: int = 0
+
+    @property
+    def abandoned(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+
+@dataclass
+class ClassStats:
+    sent: int = 0
+    merged: int = 0
+    dropped: int = 0
+    retried: int = 0
+    errors: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "errors": self.errors,
+            "avg_wait_ms": self.total_wait / self.sent * 1000 if self.sent else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def _chat_key(chat_id: Any) -> Optional[int]:
+    if isinstance(chat_id, str):
+        try:
+            return int(chat_id)
+        except ValueError:
+            return None  # @channel 用户名
+    return chat_id if isinstance(chat_id, int) else None
+
+
+class OutboundScheduler(BaseRateLimiter[Dict[str, Any]]):
+    """rate_limit_args 可传 {"priority": PRIORITY_BULK} 覆盖按方法推断的优先级"""
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_burst: float = OUTBOUND_CHAT_BURST,
+                 high_water: int = OUTBOUND_HIGH_WATER, edit_ttl: float = OUTBOUND_EDIT_TTL,
+                 max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets = KeyedBuckets()
+        self.chat_burst = chat_burst
+        self.high_water = high_water
+        self.edit_ttl = edit_ttl
+        self.max_retries = max_retries
+        self._queues: List[Deque[OutboundRequest]] = [deque() for _ in PRIORITY_NAMES]
+        self._edits: Dict[Tuple, OutboundRequest] = {}
+        self._stats = [ClassStats() for _ in PRIORITY_NAMES]
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._inflight: set = set()
+
+    # ------------------------------
+    # BaseRateLimiter 接口
+    # ------------------------------
+    async def initialize(self):
+        self._ensure_dispatcher()
+
+    async def shutdown(self):
+        if self._dispatcher:
+            # wait_for 在内部等待恰好完成时会吞掉取消，所以另设停止标志
+            self._stopping = True
+            self._wakeup.set()
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        for queue in self._queues:
+            while queue:
+                self._resolve(queue.popleft(), error=OutboundDropped("调度器已关闭"))
+        self._edits.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = classify(endpoint)
+        if rate_limit_args and "priority" in rate_limit_args:
+            priority = rate_limit_args["priority"]
+        if priority is None:
+            return await callback(*args, **kwargs)
+
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        chat_id = _chat_key(data.get("chat_id"))
+        merge_key = None
+        if endpoint in EDIT_ENDPOINTS:
+            merge_key = (endpoint, chat_id, data.get("message_id"), data.get("inline_message_id"))
+            queued = self._edits.get(merge_key)
+            if queued is not None:
+                # 同一条消息还有未发出的编辑：用最新内容替换，两个调用方拿到同一个结果
+                queued.callback, queued.args, queued.kwargs = callback, args, kwargs
+                queued.futures.append(future)
+                self._stats[queued.priority].merged += 1
+                return await future
+
+        request = OutboundRequest(priority, endpoint, callback, args, kwargs, chat_id, merge_key, [future])
+        if merge_key:
+            self._edits[merge_key] = request
+        self._queues[priority].append(request)
+        self._wakeup.set()
+        return await future
+
+    # ------------------------------
+    # 调度
+    # ------------------------------
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    def _chat_bucket(self, request: OutboundRequest) -> Optional[TokenBucket]:
+        if request.priority == PRIORITY_MODERATION or request.chat_id is None:
+            return None
+        return self.chat_buckets.get(request.chat_id, chat_rate(request.chat_id), self.chat_burst)
+
+    def _next_ready(self) -> Tuple[Optional[OutboundRequest], Optional[float]]:
+        """取出下一个可以发送的请求；没有时返回需要等待的秒数（None 表示等新请求）"""
+        if self.queued() > self.high_water:
+            self._shed_stale_edits()
+        if not self.queued():
+            return None, None
+        global_wait = self.global_bucket.delay()
+        if global_wait > 0:
+            return None, global_wait
+
+        wait = None
+        for queue in self._queues:
+            for index, request in enumerate(itertools.islice(queue, SCAN_DEPTH)):
+                if request.abandoned:
+                    del queue[index]
+                    self._forget(request)
+                    return None, 0.0
+                bucket = self._chat_bucket(request)
+                if bucket is None or bucket.try_acquire():
+                    del queue[index]
+                    self._forget(request)
+                    self.global_bucket.try_acquire()
+                    return request, None
+                delay = bucket.delay()
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _dispatch_loop(self):
+        while not self._stopping:
+            request, wait = self._next_ready()
+            if request is not None:
+                task = asyncio.get_running_loop().create_task(self._execute(request))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                continue
+            if wait == 0.0:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, request: OutboundRequest):
+        stats = self._stats[request.priority]
+        waited = time.monotonic() - request.enqueued_at
+        try:
+            result = await request.callback(*request.args, **request.kwargs)
+        except RetryAfter as e:
+            # 洪水限制针对整个机器人：暂停全部发送，本请求回到队首
+            self.global_bucket.pause(retry_after_seconds(e))
+            if request.retries < self.max_retries:
+                request.retries += 1
+                stats.retried += 1
+                newer = self._edits.get(request.merge_key) if request.merge_key else None
+                if newer is not None:
+                    # 重试期间同一条消息又有新的编辑排队：旧内容不必再发，调用方等新编辑的结果
+                    newer.futures.extend(request.futures)
+                    stats.merged += 1
+                    return
+                if request.merge_key:
+                    self._edits[request.merge_key] = request  # 出队时已移除，重新登记以便后续编辑合并
+                self._queues[request.priority].appendleft(request)
+                self._wakeup.set()
+                return
+            stats.errors += 1
+            self._resolve(request, error=e)
+            return
+        except Exception as e:
+            stats.errors += 1
+            self._resolve(request, error=e)
+            return
+        stats.sent += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        self._resolve(request, result=result)
+
+    # ------------------------------
+    # 合并 / 丢弃
+    # ------------------------------
+    def _forget(self, request: OutboundRequest):
+        if request.merge_key and self._edits.get(request.merge_key) is request:
+            del self._edits[request.merge_key]
+
+    def _shed_stale_edits(self):
+        """积压时丢弃排队超过 edit_ttl 的编辑（回复和审核永远不丢）"""
+        queue = self._queues[PRIORITY_EDIT]
+        cutoff = time.monotonic() - self.edit_ttl
+        kept = deque()
+        for request in queue:
+            if request.enqueued_at < cutoff:
+                self._forget(request)
+                self._stats[PRIORITY_EDIT].dropped += 1
+                self._resolve(request, error=OutboundDropped("编辑请求积压过久，已丢弃"))
+            else:
+                kept.append(request)
+        self._queues[PRIORITY_EDIT] = kept
+
+    @staticmethod
+    def _resolve(request: OutboundRequest, result: Any = None, error: Optional[BaseException] = None):
+        for future in request.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # ------------------------------
+    # 统计
+    # ------------------------------
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def stats(self) -> dict:
+        return {
+            "queued": {name: len(queue) for name, queue in zip(PRIORITY_NAMES, self._queues)},
+            "inflight": len(self._inflight),
+            "classes": {name: stats.as_dict() for name, stats in zip(PRIORITY_NAMES, self._stats)},
+        }
@@ -1,14 +1,95 @@
 import os
+import time
 import asyncio
 from functools import wraps
-from telegram import Update
-from telegram.ext import ContextTypes
+from typing import Dict, FrozenSet, Tuple
+from telegram import Update, ChatMember
+from telegram.ext import ContextTypes, ChatMemberHandler
+from core.response_cache import TOPIC_ADMINS, response_cache
 
 # 从环境变量获取机器人所有者ID
 OWNER_ID = os.getenv("OWNER_ID")
 if OWNER_ID:
     OWNER_ID = int(OWNER_ID)
 
+# 管理员名单缓存有效期（秒），可通过环境变量调整
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "300"))
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class AdminCache:
+    """按群组缓存管理员名单：TTL 过期 + 成员变动事件刷新 + 并发请求合并"""
+
+    def __init__(self, ttl: float = ADMIN_CACHE_TTL):
+        self.ttl = ttl
+        self._rosters: Dict[int, Tuple[float, FrozenSet[int]]] = {}  # chat_id -> (过期时间, 管理员ID集合)
+        self._inflight: Dict[int, asyncio.Task] = {}  # 正在拉取的请求，避免缓存击穿
+        self.hits = 0
+        self.misses = 0
+
+    async def get_admin_ids(self, bot, chat_id: int) -> FrozenSet[int]:
+        """获取群组管理员ID集合，命中缓存时不产生任何 API 调用"""
+        entry = self._rosters.get(chat_id)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        task = self._inflight.get(chat_id)
+        if task is None:
+            # 同一群组的并发检查共享同一次拉取
+            task = asyncio.ensure_future(self._fetch(bot, chat_id))
+            self._inflight[chat_id] = task
+            task.add_done_callback(lambda t: self._drop_inflight(chat_id, t))
+        return await asyncio.shield(task)
+
+    async def is_admin(self, bot, chat_id: int, user_id: int) -> bool:
+        return user_id in await self.get_admin_ids(bot, chat_id)
+
+    async def _fetch(self, bot, chat_id: int) -> FrozenSet[int]:
+        admins = await bot.get_chat_administrators(chat_id)
+        admin_ids = frozenset(admin.user.id for admin in admins)
+        self._rosters[chat_id] = (time.monotonic() + self.ttl, admin_ids)
+        return admin_ids
+
+    def _drop_inflight(self, chat_id: int, task: asyncio.Task):
+        if self._inflight.get(chat_id) is task:
+            del self._inflight[chat_id]
+
+    def apply_member_update(self, chat_id: int, user_id: int, status: str):
+        """根据成员状态变化直接修改已缓存的名单（提升/撤销管理员）"""
+        entry = self._rosters.get(chat_id)
+        if not entry:
+            return
+        expires_at, admin_ids = entry
+        if status in ADMIN_STATUSES:
+            admin_ids = admin_ids | {user_id}
+        else:
+            admin_ids = admin_ids - {user_id}
+        self._rosters[chat_id] = (expires_at, admin_ids)
+
+    def invalidate(self, chat_id: int = None):
+        """使某个群组（或全部）的缓存失效，下次检查时重新拉取"""
+        if chat_id is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "cached_chats": len(self._rosters),
+        }
+
+
+# 全局管理员缓存实例
+admin_cache = AdminCache()
+
+
 def admin_required(func):
     """检查用户是否为群组管理员的装饰器"""
     @wraps(func)
@@ -17,15 +98,14 @@ def admin_required(func):
         if not update.effective_chat or not update.effective_chat.type in ["group", "supergroup"]:
             await update.effective_message.reply_text("此命令仅能在群组中使用！")
             return None
-        
+
         # 检查用户是否为管理员
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
-        
-        # 获取管理员列表
-        admins = await context.bot.get_chat_administrators(chat_id)
-        admin_ids = [admin.user.id for admin in admins]
-        
+
+        # 从缓存获取管理员列表
+        admin_ids = await admin_cache.get_admin_ids(context.bot, chat_id)
+
         if user_id in admin_ids or (OWNER_ID and user_id == OWNER_ID):
             return await func(update, context, *args, **kwargs)
         else:
@@ -40,7 +120,7 @@ def owner_required(func):
         if not OWNER_ID:
             await update.effective_message.reply_text("未配置机器人所有者！")
             return None
-            
+
         user_id = update.effective_user.id
         if user_id == OWNER_ID:
             return await func(update, context, *args, **kwargs)
@@ -53,13 +133,12 @@ async def is_chat_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> b
     """检查用户是否为当前聊天的管理员"""
     if not update.effective_chat or not update.effective_chat.type in ["group", "supergroup"]:
         return False
-        
+
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    
-    admins = await context.bot.get_chat_administrators(chat_id)
-    admin_ids = [admin.user.id for admin in admins]
-    
+
+    admin_ids = await admin_cache.get_admin_ids(context.bot, chat_id)
+
     return user_id in admin_ids or (OWNER_ID and user_id == OWNER_ID)
 
 async def is_bot_owner(user_id: int) -> bool:
@@ -67,4 +146,25 @@ async def is_bot_owner(user_id: int) -> bool:
     if not OWNER_ID:
         return False
     return user_id == OWNER_ID
-    
\ No newline at end of file
+
+
+async def handle_admin_changes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """监听成员状态变化，刷新管理员缓存"""
+    if update.chat_member:
+        change = update.chat_member
+        admin_cache.apply_member_update(
+            change.chat.id, change.new_chat_member.user.id, change.new_chat_member.status
+        )
+        response_cache.invalidate(TOPIC_ADMINS, change.chat.id)
+    elif update.my_chat_member:
+        # 机器人自身被提升、降级或重新拉入群组时，整份名单可能已变化
+        admin_cache.invalidate(update.my_chat_member.chat.id)
+        response_cache.invalidate(TOPIC_ADMINS, update.my_chat_member.chat.id)
+
+
+def register_admin_cache(application):
+    """注册管理员缓存的事件处理器（放在 -1 组，不影响其他成员事件处理器）"""
+    application.add_handler(
+        ChatMemberHandler(handle_admin_changes, ChatMemberHandler.ANY_CHAT_MEMBER),
+        group=-1
+    )
@@ -0,0 +1,144 @@
+"""统一的文本消息处理管道
+
+PTB 同一个 handler group 里只会执行第一个匹配的处理器，多个模块各自注册
+MessageHandler(filters.TEXT & ~filters.COMMAND) 会互相遮蔽。这里只注册一个处理器，
+各模块以「阶段」的形式按顺序挂载，并共享同一份按更新解析一次的上下文。
+
+阶段函数签名：async def stage(ctx: MessageContext) -> Optional[bool]，返回 STOP 表示
+已处理完毕、后续阶段不再执行（标记为 always 的阶段除外）。
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+from telegram import Update
+from telegram.ext import ContextTypes, MessageHandler, filters
+from core.permissions import OWNER_ID, admin_cache
+
+STOP = True
+
+# 标准阶段顺序（数字越小越先执行）
+ORDER_SESSION_INPUT = 10   # 会话输入（如 /switch_chat 等待用户输入群 ID）
+ORDER_MODERATION = 20      # 内容审核（敏感词过滤）
+ORDER_ANTI_FLOOD = 30      # 防刷屏
+ORDER_AUTO_REPLY = 40      # 自动回复
+
+
+class MessageContext:
+    """单条消息在整个管道中共享的上下文，管理员判断和群组设置只解析一次"""
+
+    def __init__(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self.update = update
+        self.context = context
+        self.message = update.effective_message
+        self.chat = update.effective_chat
+        self.user = update.effective_user
+        self.chat_id = self.chat.id if self.chat else None
+        self.user_id = self.user.id if self.user else None
+        self.text: str = (self.message.text or "") if self.message else ""
+        self.is_group = bool(self.chat and self.chat.type in ("group", "supergroup"))
+        self._is_admin: Optional[bool] = None
+        self._settings: Optional[Mapping[str, Any]] = None
+
+    @property
+    def db(self):
+        return self.context.bot_data.get("db")
+
+    async def is_admin(self) -> bool:
+        """发送者是否为本群管理员（或机器人所有者）"""
+        if self._is_admin is None:
+            if not self.is_group or self.user_id is None:
+                self._is_admin = False
+            else:
+                self._is_admin = bool(
+                    await admin_cache.is_admin(self.context.bot, self.chat_id, self.user_id)
+                    or (OWNER_ID and self.user_id == OWNER_ID)
+                )
+        return self._is_admin
+
+    async def settings(self) -> Mapping[str, Any]:
+        """当前群组的设置（来自设置缓存）"""
+        if self._settings is None:
+            db = self.db
+            self._settings = await db.get_group_settings(self.chat_id) if db and self.chat_id else {}
+        return self._settings
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    stops: int = 0
+    errors: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "stops": self.stops,
+            "errors": self.errors,
+            "avg_ms": self.total / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+@dataclass
+class Stage:
+    name: str
+    order: int
+    func: Callable[[MessageContext], Awaitable[Optional[bool]]]
+    always: bool = False  # 即使前面的阶段已 STOP 也执行
+    stats: StageStats = field(default_factory=StageStats)
+
+
+class MessagePipeline:
+    def __init__(self):
+        self._stages: List[Stage] = []
+        self.messages = 0
+
+    def add_stage(self, name: str, order: int, func: Callable[[MessageContext], Awaitable[Optional[bool]]],
+                  always: bool = False):
+        if any(stage.name == name for stage in self._stages):
+            raise ValueError(f"消息管道阶段重复注册：{name}")
+        self._stages.append(Stage(name, order, func, always))
+        self._stages.sort(key=lambda stage: stage.order)
+
+    async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not update.effective_message:
+            return
+        self.messages += 1
+        ctx = MessageContext(update, context)
+        stopped = False
+        for stage in self._stages:
+            if stopped and not stage.always:
+                continue
+            started = time.perf_counter()
+            try:
+                result = await stage.func(ctx)
+            except Exception as e:
+                stage.stats.errors += 1
+                print(f"❌ 消息管道阶段 {stage.name} 出错：{str(e)}")
+                result = None
+            elapsed = time.perf_counter() - started
+            stage.stats.calls += 1
+            stage.stats.total += elapsed
+            stage.stats.max = max(stage.stats.max, elapsed)
+            if result is STOP and not stopped:
+                stage.stats.stops += 1
+                stopped = True
+
+    def stats(self) -> Dict[str, Any]:
+        """每个阶段的调用次数、短路次数和耗时，便于定位单条消息的延迟来源"""
+        return {
+            "messages": self.messages,
+            "stages": {stage.name: stage.stats.as_dict() for stage in self._stages},
+        }
+
+
+def get_pipeline(application) -> MessagePipeline:
+    """获取应用的消息管道，首次调用时创建并注册唯一的文本消息处理器"""
+    pipeline = application.bot_data.get("pipeline")
+    if pipeline is None:
+        pipeline = MessagePipeline()
+        application.bot_data["pipeline"] = pipeline
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, pipeline.process))
+    return pipeline
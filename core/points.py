@@ -0,0 +1,93 @@
+"""积分服务：签到和加减积分都是一次写操作，积分在数据库中原子累加（points = points + ?）
+
+- 不再先读后写，并发给同一用户加分不会丢失更新
+- 签到的"今天是否已签到"、连续天数、累计次数和奖励在同一条 upsert 中完成
+- 积分日志、全局计数器与积分变动在同一事务中提交
+- award_many 在一个事务里批量加分（抽奖发奖、管理员给全群加分等）
+- 写入成功后把积分增量同步给内存排行榜（群内排行榜和全局前 K 名），并使缓存的排行榜回复失效
+"""
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from core.config import CheckInSettings, get_config
+from core.response_cache import TOPIC_POINTS, response_cache
+
+
+@dataclass(frozen=True)
+class CheckInResult:
+    points: int   # 签到后的总积分
+    earned: int   # 本次获得的积分
+    base: int     # 其中的基础积分
+    streak: int   # 当前连续签到天数
+
+    @property
+    def bonus(self) -> int:
+        return self.earned - self.base
+
+
+class PointsService:
+    def __init__(self, db, leaderboard=None, global_leaderboard=None):
+        self.db = db
+        self.leaderboard = leaderboard
+        self.global_leaderboard = global_leaderboard
+
+    async def check_in(self, group_id: int, user_id: int, settings: Optional[CheckInSettings] = None,
+                       now: Optional[float] = None) -> Optional[CheckInResult]:
+        """签到（按本地日期），今天已签到过时返回 None"""
+        settings = settings or get_config().check_in
+        now = time.time() if now is None else now
+        today = time.strftime("%Y-%m-%d", time.localtime(now))
+        yesterday = time.strftime("%Y-%m-%d", time.localtime(now - 86400))
+        result = await self.db.call(
+            "check_in", group_id, user_id, today, yesterday,
+            settings.base_points, settings.streak_bonus, settings.max_streak
+        )
+        if result is None:
+            return None
+        self._ranked([(group_id, user_id, result["earned"])])
+        if self.global_leaderboard is not None:
+            self.global_leaderboard.check_in(user_id)
+        return CheckInResult(
+            points=result["points"], earned=result["earned"], base=settings.base_points, streak=result["streak"]
+        )
+
+    async def award(self, group_id: int, user_id: int, points: int, action: str) -> int:
+        """给单个用户加（减）积分，返回新积分"""
+        new_points = await self.db.call("award_points", group_id, user_id, points, action)
+        self._ranked([(group_id, user_id, points)])
+        return new_points
+
+    async def award_many(self, awards: Iterable[Tuple[int, int, int]], action: str) -> int:
+        """批量加分 [(group_id, user_id, points)]，返回处理的条数"""
+        awards = [award for award in awards if award[2]]
+        count = await self.db.call("award_points_bulk", awards, action)
+        self._ranked(awards)
+        return count
+
+    def _ranked(self, changes: List[Tuple[int, int, int]]):
+        for group_id in {group_id for group_id, _, _ in changes}:
+            response_cache.invalidate(TOPIC_POINTS, group_id)
+        if self.leaderboard is not None:
+            self.leaderboard.apply(changes)
+        if self.global_leaderboard is not None:
+            self.global_leaderboard.apply(changes)
+
+    async def get(self, group_id: int, user_id: int) -> int:
+        row = await self.db.fetchone(
+            "SELECT points FROM group_user_points WHERE group_id = ? AND user_id = ?", (group_id, user_id)
+        )
+        return row["points"] if row else 0
+
+    async def members(self, group_id: int) -> List[int]:
+        """本群有积分记录的所有用户"""
+        rows = await self.db.fetchall("SELECT user_id FROM group_user_points WHERE group_id = ?", (group_id,))
+        return [row["user_id"] for row in rows]
+
+    async def top(self, group_id: int, limit: int = 10) -> List[Dict[str, int]]:
+        if self.leaderboard is not None and self.leaderboard.loaded:
+            return [{"user_id": user_id, "points": points} for user_id, points in self.leaderboard.top(group_id, limit)]
+        return await self.db.fetchall("""
+            SELECT user_id, points FROM group_user_points
+            WHERE group_id = ?
+            ORDER BY points DESC LIMIT ?
+        """, (group_id, limit))
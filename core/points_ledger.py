@@ -0,0 +1,109 @@
+"""积分账本：明细只保留一段时间，长期统计读每日汇总
+
+- group_points_log 是只追加的明细，(group_id, user_id, timestamp) 覆盖索引支撑个人明细查询
+- group_points_daily 按 (群组, 用户, 本地日期) 汇总，与明细在同一事务中写入
+- "本月获得多少积分" 等统计只读汇总表，不扫描明细
+- 后台任务定期删除超过保留期的明细（分批进行，不长时间占用写锁），再增量回收空闲页
+"""
+import os
+import time
+import asyncio
+from typing import Dict, List, Optional
+
+# 明细保留天数；超过后只保留每日汇总
+POINTS_LOG_RETENTION_DAYS = int(os.getenv("POINTS_LOG_RETENTION_DAYS", "90"))
+# 后台维护间隔（秒）、每批删除的明细条数、每次最多回收的空闲页数
+LEDGER_MAINTENANCE_INTERVAL = float(os.getenv("LEDGER_MAINTENANCE_INTERVAL", "3600"))
+LEDGER_COMPACT_BATCH = int(os.getenv("LEDGER_COMPACT_BATCH", "5000"))
+LEDGER_VACUUM_PAGES = int(os.getenv("LEDGER_VACUUM_PAGES", "2000"))
+
+
+class PointsLedger:
+    def __init__(self, db, retention_days: int = POINTS_LOG_RETENTION_DAYS):
+        self.db = db
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+        self.compacted = 0
+        self.vacuumed_pages = 0
+
+    # ------------------------------
+    # 查询
+    # ------------------------------
+    async def earned_since(self, group_id: int, user_id: int, since_day: str) -> int:
+        """since_day（本地日期 YYYY-MM-DD，含当天）以来获得的积分，只读汇总表"""
+        row = await self.db.fetchone("""
+            SELECT COALESCE(SUM(earned), 0) AS earned FROM group_points_daily
+            WHERE group_id = ? AND user_id = ? AND day >= ?
+        """, (group_id, user_id, since_day))
+        return row["earned"]
+
+    async def earned_this_month(self, group_id: int, user_id: int) -> int:
+        return await self.earned_since(group_id, user_id, time.strftime("%Y-%m-01"))
+
+    async def top_earners(self, group_id: int, since_day: str, limit: int = 10) -> List[Dict[str, int]]:
+        return await self.db.fetchall("""
+            SELECT user_id, SUM(earned) AS earned FROM group_points_daily
+            WHERE group_id = ? AND day >= ?
+            GROUP BY user_id ORDER BY earned DESC LIMIT ?
+        """, (group_id, since_day, limit))
+
+    async def history(self, group_id: int, user_id: int, limit: int = 10) -> List[Dict[str, object]]:
+        """最近的积分明细（只在保留期内可查），走覆盖索引"""
+        return await self.db.fetchall("""
+            SELECT timestamp, action, points FROM group_points_log
+            WHERE group_id = ? AND user_id = ?
+            ORDER BY timestamp DESC LIMIT ?
+        """, (group_id, user_id, limit))
+
+    # ------------------------------
+    # 保留期与空间回收
+    # ------------------------------
+    async def compact(self, now: Optional[float] = None) -> int:
+        """分批删除超过保留期的明细，返回删除条数"""
+        now = time.time() if now is None else now
+        # 明细的 timestamp 是 SQLite 的 CURRENT_TIMESTAMP（UTC）
+        cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - self.retention_days * 86400))
+        total = 0
+        while True:
+            deleted = await self.db.call("compact_points_log", cutoff, LEDGER_COMPACT_BATCH)
+            total += deleted
+            if deleted < LEDGER_COMPACT_BATCH:
+                break
+        self.compacted += total
+        return total
+
+    async def vacuum(self) -> int:
+        pages = await self.db.call("incremental_vacuum", LEDGER_VACUUM_PAGES)
+        self.vacuumed_pages += pages
+        return pages
+
+    async def maintain(self):
+        deleted = await self.compact()
+        pages = await self.vacuum()
+        if deleted or pages:
+            print(f"🧹 积分明细清理：删除 {deleted} 条过期明细，回收 {pages} 个空闲页")
+
+    async def _loop(self, interval: float):
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                print(f"⚠️ 积分明细清理失败：{str(e)}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = LEDGER_MAINTENANCE_INTERVAL):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "retention_days": self.retention_days,
+            "compacted": self.compacted,
+            "vacuumed_pages": self.vacuumed_pages,
+        }
@@ -0,0 +1,87 @@
+"""令牌桶限流（异步）
+
+Telegram 的发送限制大致为：全局约 30 条/秒，同一群组约 20 条/分钟，同一私聊约 1 条/秒。
+"""
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Hashable
+
+# Telegram 默认发送预算
+GLOBAL_RATE = 30.0          # 条/秒
+GROUP_RATE = 20.0 / 60      # 条/秒（每个群组）
+PRIVATE_RATE = 1.0          # 条/秒（每个私聊）
+
+
+class TokenBucket:
+    """经典令牌桶：rate 为每秒补充的令牌数，capacity 为突发上限"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """不等待地尝试取令牌"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """距离能取到令牌还需要等待的秒数（不消耗令牌）"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, (tokens - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+        return max(wait, self.paused_until - now)
+
+    async def acquire(self, tokens: float = 1.0):
+        """等待直到取到令牌（同一个桶的等待者按先来后到排队）"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds: float):
+        """收到 RetryAfter 时暂停整个桶，并清空已积累的令牌"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class KeyedBuckets:
+    """按键（如 chat_id）分配令牌桶，只保留最近使用的若干个"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def get(self, key: Hashable, rate: float, capacity: float = None) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+def retry_after_seconds(error) -> float:
+    """RetryAfter.retry_after 在新版 PTB 中是 timedelta，旧版是秒数"""
+    retry_after = error.retry_after
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+
+def chat_rate(chat_id: int) -> float:
+    """按聊天类型返回单聊天发送预算：群组/频道的 ID 为负数"""
+    return GROUP_RATE if chat_id < 0 else PRIVATE_RATE
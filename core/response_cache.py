@@ -0,0 +1,89 @@
+"""已渲染回复的进程内缓存（排行榜、帮助、群设置等高频命令）
+
+- 键为 (聊天, 命令, 角色)，每个条目记录渲染时所依赖数据的版本号
+- 数据变化时由写入方显式调用 invalidate(主题, 聊天) 递增版本号（积分变动 -> points，
+  管理员变动 -> admins，群设置修改 -> settings），旧条目在下次读取时自然失效
+- 命中时直接返回渲染好的文本和参数，不访问数据库也不调用 Bot API
+- 另有 TTL 兜底（用户改名等没有失效事件的变化），按 LRU 淘汰
+"""
+import os
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Mapping, Tuple
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+TOPIC_POINTS = "points"
+TOPIC_ADMINS = "admins"
+TOPIC_SETTINGS = "settings"
+
+Topic = Tuple[str, Hashable]  # (主题, 聊天)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    text: str
+    kwargs: Mapping[str, Any] = field(default_factory=dict)  # reply_text 的其他参数（parse_mode、reply_markup）
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    versions: Tuple[int, ...]
+    response: CachedResponse
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[Hashable, str, str], _Entry]" = OrderedDict()
+        self._versions: Dict[Topic, int] = defaultdict(int)
+        self._counts: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  # 命令 -> [命中, 未命中]
+
+    def _snapshot(self, topics: Tuple[Topic, ...]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(topic, 0) for topic in topics)
+
+    async def fetch(self, chat: Hashable, command: str, role: str, topics: Tuple[Topic, ...],
+                    render: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        """命中且依赖数据未变化时直接返回，否则调用 render() 渲染并缓存"""
+        key = (chat, command, role)
+        # 渲染前记下版本号：渲染期间数据若有变化，这个结果下次读取时就会失效
+        versions = self._snapshot(topics)
+        entry = self._entries.get(key)
+        if entry and entry.versions == versions and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self._counts[command][0] += 1
+            return entry.response
+
+        self._counts[command][1] += 1
+        response = await render()
+        self._entries[key] = _Entry(time.monotonic() + self.ttl, versions, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return response
+
+    def invalidate(self, topic: str, chat: Hashable):
+        """某个聊天的某类数据发生变化，依赖它的缓存全部失效"""
+        self._versions[(topic, chat)] += 1
+
+    def stats(self) -> dict:
+        hits = sum(count[0] for count in self._counts.values())
+        misses = sum(count[1] for count in self._counts.values())
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "commands": {
+                command: {"hits": h, "misses": m, "hit_rate": h / (h + m) if h + m else 0.0}
+                for command, (h, m) in self._counts.items()
+            },
+        }
+
+
+# 全局回复缓存实例
+response_cache = ResponseCache()
@@ -0,0 +1,80 @@
+"""群组设置的进程内缓存
+
+缓存中保存的是已经解析好 JSON 字段的不可变设置对象，热路径读取无需 SQL 和 json.loads。
+由 Database 在事务提交后写入（写穿透），按 LRU 淘汰不活跃的群组。
+"""
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+# 最多缓存多少个群组的设置
+GROUP_SETTINGS_CACHE_SIZE = int(os.getenv("GROUP_SETTINGS_CACHE_SIZE", "10000"))
+
+
+def freeze(value: Any) -> Any:
+    """递归转换为不可变结构：dict -> MappingProxyType，list -> tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """freeze 的逆操作，得到可修改（可 json.dumps）的副本"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class SettingsCache:
+    """group_id -> 不可变设置对象，线程安全的 LRU 缓存"""
+
+    def __init__(self, maxsize: int = GROUP_SETTINGS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, Mapping[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group_id: int) -> Optional[Mapping[str, Any]]:
+        with self._lock:
+            settings = self._data.get(group_id)
+            if settings is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(group_id)
+            self.hits += 1
+            return settings
+
+    def __contains__(self, group_id: int) -> bool:
+        with self._lock:
+            return group_id in self._data
+
+    def put(self, group_id: int, settings: Mapping[str, Any]):
+        with self._lock:
+            self._data[group_id] = settings
+            self._data.move_to_end(group_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, group_id: Optional[int] = None):
+        with self._lock:
+            if group_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(group_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,129 @@
+"""消息统计收集器：内存中按 (群组, 小时) 和 (群组, 小时, 用户) 计数，定期把增量写入小时桶表
+
+- 每条消息只是几次字典自增，不读写数据库
+- 每隔 STATS_FLUSH_INTERVAL 秒把增量 upsert 到 chat_hourly_stats / user_hourly_stats
+- 报表只读取小时聚合，不扫描原始消息
+"""
+import os
+import time
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 增量写库间隔（秒）
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "30"))
+HOUR = 3600
+
+
+def hour_bucket(ts: float) -> int:
+    """时间戳所在小时的起点（UTC）"""
+    return int(ts // HOUR) * HOUR
+
+
+class StatsCollector:
+    def __init__(self, db):
+        self.db = db
+        self._chat_hours: Dict[Tuple[int, int], int] = defaultdict(int)
+        self._user_hours: Dict[Tuple[int, int, int], int] = defaultdict(int)
+        self._flush_task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.flushed_rows = 0
+        self._versions: Dict[int, int] = defaultdict(int)  # 每个群已写库数据的版本号，报表缓存据此失效
+
+    def record(self, chat_id: int, user_id: Optional[int], ts: Optional[float] = None):
+        hour = hour_bucket(time.time() if ts is None else ts)
+        self._chat_hours[(chat_id, hour)] += 1
+        if user_id is not None:
+            self._user_hours[(chat_id, hour, user_id)] += 1
+        self.recorded += 1
+
+    # ------------------------------
+    # 批量写库
+    # ------------------------------
+    async def flush(self) -> int:
+        if not self._chat_hours:
+            return 0
+        chat_hours, self._chat_hours = self._chat_hours, defaultdict(int)
+        user_hours, self._user_hours = self._user_hours, defaultdict(int)
+
+        def write(db):
+            db.conn.executemany("""
+                INSERT INTO chat_hourly_stats (chat_id, hour, messages) VALUES (?, ?, ?)
+                ON CONFLICT(chat_id, hour) DO UPDATE SET messages = messages + excluded.messages
+            """, [(chat_id, hour, count) for (chat_id, hour), count in chat_hours.items()])
+            db.conn.executemany("""
+                INSERT INTO user_hourly_stats (chat_id, hour, user_id, messages) VALUES (?, ?, ?, ?)
+                ON CONFLICT(chat_id, hour, user_id) DO UPDATE SET messages = messages + excluded.messages
+            """, [(chat_id, hour, user_id, count) for (chat_id, hour, user_id), count in user_hours.items()])
+            db.bump_counters(messages=sum(chat_hours.values()))
+
+        try:
+            await self.db.write(write, label="stats:flush")
+        except Exception:
+            # 写入失败时把增量合并回去，下次重试
+            for key, count in chat_hours.items():
+                self._chat_hours[key] += count
+            for key, count in user_hours.items():
+                self._user_hours[key] += count
+            raise
+        for chat_id, _ in chat_hours:
+            self._versions[chat_id] += 1
+        rows = len(chat_hours) + len(user_hours)
+        self.flushed_rows += rows
+        return rows
+
+    async def _flush_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ 消息统计写库失败：{str(e)}")
+
+    def start(self, interval: float = STATS_FLUSH_INTERVAL):
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    # ------------------------------
+    # 查询（小时聚合 + 尚未写库的增量）
+    # ------------------------------
+    async def hourly_messages(self, chat_id: int, days: int = 30) -> List[Tuple[int, int]]:
+        """最近 days 天每小时的消息数 [(小时起点, 消息数)]，按时间升序，没有消息的小时不返回"""
+        since = hour_bucket(time.time()) - days * 24 * HOUR
+        rows = await self.db.fetchall(
+            "SELECT hour, messages FROM chat_hourly_stats WHERE chat_id = ? AND hour >= ? ORDER BY hour",
+            (chat_id, since)
+        )
+        series = {row["hour"]: row["messages"] for row in rows}
+        for (pending_chat, hour), count in self._chat_hours.items():
+            if pending_chat == chat_id and hour >= since:
+                series[hour] = series.get(hour, 0) + count
+        return sorted(series.items())
+
+    async def top_users(self, chat_id: int, days: int = 30, limit: int = 10) -> List[Tuple[int, int]]:
+        """最近 days 天发言最多的用户 [(user_id, 消息数)]（只统计已写库的部分）"""
+        since = hour_bucket(time.time()) - days * 24 * HOUR
+        rows = await self.db.fetchall("""
+            SELECT user_id, SUM(messages) AS messages FROM user_hourly_stats
+            WHERE chat_id = ? AND hour >= ?
+            GROUP BY user_id ORDER BY messages DESC LIMIT ?
+        """, (chat_id, since, limit))
+        return [(row["user_id"], row["messages"]) for row in rows]
+
+    def version(self, chat_id: int) -> int:
+        """群组已写库统计数据的版本号，每次有该群的增量写库后加一"""
+        return self._versions.get(chat_id, 0)
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "pending_chat_buckets": len(self._chat_hours),
+            "pending_user_buckets": len(self._user_hours),
+            "flushed_rows": self.flushed_rows,
+        }
@@ -1,5 +1,6 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+from core.pipeline import MessageContext, ORDER_SESSION_INPUT, STOP, get_pipeline
 
 async def show_switch_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """展示切换群菜单，引导用户选择或输入要管理的群"""
@@ -18,21 +19,23 @@ async def switch_manual_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.edit_message_text("请发送目标群组的 ID（纯数字，为 Telegram 群组的实际 ID）")
     context.user_data["waiting_chat_id"] = "switch"  # 标记等待用户输入群 ID
 
-async def handle_chat_id_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """处理用户输入的群 ID，暂存到 bot_data 中，用于后续功能的多群隔离"""
-    if "waiting_chat_id" in context.user_data:
+async def handle_chat_id_input(ctx: MessageContext):
+    """处理用户输入的群 ID，暂存到 bot_data 中，用于后续功能的多群隔离（消息管道的会话输入阶段）"""
+    context = ctx.context
+    if context.user_data is not None and "waiting_chat_id" in context.user_data:
         try:
-            chat_id = int(update.message.text)
+            chat_id = int(ctx.text)
             # 将当前操作的群 ID 暂存，后续功能基于此 chat_id 操作对应群组的配置
             context.bot_data["current_chat"] = chat_id  
-            await update.message.reply_text(f"已切换至群组 {chat_id}，可开始配置该群组功能！")
+            await ctx.message.reply_text(f"已切换至群组 {chat_id}，可开始配置该群组功能！")
         except ValueError:
-            await update.message.reply_text("无效的群 ID，请输入纯数字的 Telegram 群组 ID 重新尝试")
+            await ctx.message.reply_text("无效的群 ID，请输入纯数字的 Telegram 群组 ID 重新尝试")
         finally:
             del context.user_data["waiting_chat_id"]
+        return STOP
 
 def register_switch_chat(application):
     """注册切换群相关的处理器到应用中"""
     application.add_handler(CommandHandler("switch_chat", show_switch_menu))
     application.add_handler(CallbackQueryHandler(switch_manual_callback, pattern="switch_manual"))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_chat_id_input))
\ No newline at end of file
+    get_pipeline(application).add_stage("session_input", ORDER_SESSION_INPUT, handle_chat_id_input)
\ No newline at end of file
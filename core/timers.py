@@ -0,0 +1,113 @@
+"""持久化定时器：所有定时任务共用一个调度协程
+
+- 定时器按 (kind, key) 唯一，存放在 timers 表中；重复 schedule 会覆盖触发时间
+- 内存中用最小堆按触发时间排序，只有一个协程睡到最近的触发时间，空闲时几乎零开销
+- 启动时从数据库恢复全部定时器，已过期的立即触发
+- 各模块用 register(kind, handler) 注册处理函数：async def handler(key, payload)
+"""
+import json
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+TimerHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class TimerStore:
+    def __init__(self, db):
+        self.db = db
+        self._handlers: Dict[str, TimerHandler] = {}
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._timers: Dict[Tuple[str, str], Tuple[float, int, Dict[str, Any]]] = {}  # 当前有效的定时器
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self.fired = 0
+
+    def register(self, kind: str, handler: TimerHandler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        """恢复数据库中的全部定时器并启动调度协程"""
+        rows = await self.db.fetchall("SELECT kind, key, fire_at, payload FROM timers")
+        for row in rows:
+            self._push(row["kind"], row["key"], row["fire_at"], json.loads(row["payload"] or "{}"))
+        if rows:
+            overdue = sum(1 for row in rows if row["fire_at"] <= time.time())
+            print(f"⏰ 恢复 {len(rows)} 个定时器（{overdue} 个已到期，立即执行）")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def schedule(self, kind: str, key: str, fire_at: float, payload: Optional[Dict[str, Any]] = None):
+        """新增或改期一个定时器（wall-clock 时间戳）"""
+        payload = payload or {}
+        await self.db.execute("""
+            INSERT INTO timers (kind, key, fire_at, payload) VALUES (?, ?, ?, ?)
+            ON CONFLICT(kind, key) DO UPDATE SET fire_at = excluded.fire_at, payload = excluded.payload
+        """, (kind, key, fire_at, json.dumps(payload)))
+        self._push(kind, key, fire_at, payload)
+
+    async def cancel(self, kind: str, key: str):
+        # 堆中的旧条目不删除，出堆时发现已失效直接跳过
+        if self._timers.pop((kind, key), None) is not None:
+            await self.db.execute("DELETE FROM timers WHERE kind = ? AND key = ?", (kind, key))
+
+    def get(self, kind: str, key: str) -> Optional[float]:
+        """返回定时器的触发时间，不存在时返回 None"""
+        timer = self._timers.get((kind, key))
+        return timer[0] if timer else None
+
+    def _push(self, kind: str, key: str, fire_at: float, payload: Dict[str, Any]):
+        seq = next(self._seq)
+        self._timers[(kind, key)] = (fire_at, seq, payload)
+        heapq.heappush(self._heap, (fire_at, seq, kind, key))
+        if self._wakeup and self._heap[0][1] == seq:
+            self._wakeup.set()  # 新定时器比当前等待的更早
+
+    async def _loop(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, seq, kind, key = heapq.heappop(self._heap)
+                timer = self._timers.get((kind, key))
+                if timer is None or timer[1] != seq:
+                    continue  # 已取消或已改期
+                del self._timers[(kind, key)]
+                task = asyncio.get_running_loop().create_task(self._fire(kind, key, fire_at, timer[2]))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, kind: str, key: str, fire_at: float, payload: Dict[str, Any]):
+        handler = self._handlers.get(kind)
+        if handler is None:
+            print(f"⚠️ 定时器 {kind}:{key} 没有对应的处理函数，保留到下次启动")
+            return
+        try:
+            await handler(key, payload)
+            self.fired += 1
+        except Exception as e:
+            print(f"❌ 定时器 {kind}:{key} 执行失败：{str(e)}")
+        finally:
+            # 只删除本次触发的记录（处理期间可能已被改期）
+            await self.db.execute(
+                "DELETE FROM timers WHERE kind = ? AND key = ? AND fire_at = ?", (kind, key, fire_at)
+            )
+
+    def stats(self) -> dict:
+        return {"pending": len(self._timers), "heap": len(self._heap), "fired": self.fired}
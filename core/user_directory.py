@@ -0,0 +1,250 @@
+"""本地用户目录：从每个更新被动收集用户资料，避免逐个调用 get_chat / get_chat_member
+
+- 内存 LRU 保存最近活跃用户（id、名字、用户名、最后出现时间）
+- 变化的资料攒成一批，定期写入 users 表
+- 渲染排行榜、解析 @用户名 时优先查内存，其次查库，最后才并发请求 Bot API
+"""
+import os
+import html
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+# 内存中最多缓存的用户数
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+# 批量写库的间隔（秒）
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "10"))
+# 同一用户 last_seen 的最小刷新间隔（秒），避免每条消息都产生写入
+LAST_SEEN_RESOLUTION = 60
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    """与 telegram.User 字段同名，可直接替代使用（id / first_name / username）"""
+    id: int
+    first_name: str
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+    is_bot: bool = False
+    last_seen: float = 0.0
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}" if self.last_name else self.first_name
+
+    def mention_html(self) -> str:
+        return f'<a href="tg://user?id={self.id}">{html.escape(self.full_name)}</a>'
+
+    def same_identity(self, other: "UserProfile") -> bool:
+        return (self.first_name, self.last_name, self.username) == (other.first_name, other.last_name, other.username)
+
+
+class UserDirectory:
+    def __init__(self, db, maxsize: int = USER_CACHE_SIZE):
+        self.db = db
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[int, UserProfile]" = OrderedDict()
+        self._by_username: Dict[str, int] = {}
+        self._dirty: Dict[int, UserProfile] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.api_fetches = 0
+
+    # ------------------------------
+    # 内存缓存
+    # ------------------------------
+    def _remember(self, profile: UserProfile):
+        old = self._cache.get(profile.id)
+        if old and old.username and old.username.lower() != (profile.username or "").lower():
+            self._by_username.pop(old.username.lower(), None)
+        self._cache[profile.id] = profile
+        self._cache.move_to_end(profile.id)
+        if profile.username:
+            self._by_username[profile.username.lower()] = profile.id
+        while len(self._cache) > self.maxsize:
+            _, evicted = self._cache.popitem(last=False)
+            if evicted.username and self._by_username.get(evicted.username.lower()) == evicted.id:
+                del self._by_username[evicted.username.lower()]
+
+    def observe(self, user, seen_at: Optional[float] = None):
+        """记录一个 telegram.User（来自任意更新），资料变化或 last_seen 过期时标记待写库"""
+        if user is None:
+            return
+        now = time.time() if seen_at is None else seen_at
+        profile = UserProfile(
+            id=user.id,
+            first_name=user.first_name or "",
+            last_name=user.last_name,
+            username=user.username,
+            is_bot=bool(getattr(user, "is_bot", False)),  # get_chat 返回的 Chat 没有 is_bot
+            last_seen=now,
+        )
+        old = self._cache.get(user.id)
+        if old and old.same_identity(profile) and now - old.last_seen < LAST_SEEN_RESOLUTION:
+            self._cache.move_to_end(user.id)
+            return
+        self._remember(profile)
+        self._dirty[user.id] = profile
+
+    def get_cached(self, user_id: int) -> Optional[UserProfile]:
+        return self._cache.get(user_id)
+
+    # ------------------------------
+    # 查询（内存 -> 数据库 -> Bot API）
+    # ------------------------------
+    async def resolve(self, bot, user_ids: Iterable[int]) -> Dict[int, UserProfile]:
+        """批量解析用户资料；常见情况下零 API 调用，冷数据并发拉取"""
+        result: Dict[int, UserProfile] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            profile = self._cache.get(user_id)
+            if profile:
+                self.hits += 1
+                result[user_id] = profile
+            else:
+                self.misses += 1
+                missing.append(user_id)
+        if not missing:
+            return result
+
+        placeholders = ",".join("?" * len(missing))
+        rows = await self.db.fetchall(
+            f"SELECT * FROM users WHERE user_id IN ({placeholders})", missing
+        )
+        for row in rows:
+            profile = UserProfile(
+                id=row["user_id"], first_name=row["first_name"] or "", last_name=row["last_name"],
+                username=row["username"], is_bot=bool(row["is_bot"]), last_seen=row["last_seen"] or 0.0,
+            )
+            self._remember(profile)
+            result[profile.id] = profile
+
+        still_missing = [user_id for user_id in missing if user_id not in result]
+        if still_missing and bot is not None:
+            self.api_fetches += len(still_missing)
+            chats = await asyncio.gather(*(bot.get_chat(user_id) for user_id in still_missing),
+                                         return_exceptions=True)
+            for user_id, chat in zip(still_missing, chats):
+                if isinstance(chat, Exception):
+                    continue
+                self.observe(chat, seen_at=0.0)
+                result[user_id] = self._cache[user_id]
+        return result
+
+    async def get(self, bot, user_id: int) -> Optional[UserProfile]:
+        return (await self.resolve(bot, [user_id])).get(user_id)
+
+    async def find_by_username(self, username: str) -> Optional[UserProfile]:
+        """按用户名（不含 @，不区分大小写）查找，只查本地目录"""
+        username = username.lstrip("@").lower()
+        user_id = self._by_username.get(username)
+        if user_id is not None:
+            self.hits += 1
+            return self._cache[user_id]
+        self.misses += 1
+        row = await self.db.fetchone(
+            "SELECT * FROM users WHERE username = ? COLLATE NOCASE ORDER BY last_seen DESC LIMIT 1", (username,)
+        )
+        if not row:
+            return None
+        profile = UserProfile(
+            id=row["user_id"], first_name=row["first_name"] or "", last_name=row["last_name"],
+            username=row["username"], is_bot=bool(row["is_bot"]), last_seen=row["last_seen"] or 0.0,
+        )
+        self._remember(profile)
+        return profile
+
+    # ------------------------------
+    # 批量写库
+    # ------------------------------
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+
+        def write(db):
+            # 先数出批次中已存在的用户，新用户数与 upsert 在同一事务中计入计数器
+            ids = list(batch)
+            known = 0
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                known += db.conn.execute(
+                    f"SELECT COUNT(*) FROM users WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchone()[0]
+            db.conn.executemany("""
+                INSERT INTO users (user_id, first_name, last_name, username, is_bot, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    username = excluded.username,
+                    last_seen = MAX(COALESCE(last_seen, 0), excluded.last_seen)
+            """, [
+                (p.id, p.first_name, p.last_name, p.username, int(p.is_bot), p.last_seen)
+                for p in batch.values()
+            ])
+            db.bump_counters(users=len(ids) - known)
+
+        try:
+            await self.db.write(write, label="users:flush")
+        except Exception:
+            # 写入失败时把批次合并回去，下次重试；期间又更新过的用户保留较新的资料
+            self._dirty = {**batch, **self._dirty}
+            raise
+        return len(batch)
+
+    async def _flush_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ 用户目录写库失败：{str(e)}")
+
+    def start(self, interval: float = USER_FLUSH_INTERVAL):
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cached_users": len(self._cache),
+            "pending_writes": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "api_fetches": self.api_fetches,
+        }
+
+
+async def observe_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """从每个更新中收集用户资料（发送者、被回复者、新成员）"""
+    directory: UserDirectory = context.bot_data.get("users")
+    if not directory:
+        return
+    directory.observe(update.effective_user)
+    message = update.effective_message
+    if message:
+        if message.reply_to_message:
+            directory.observe(message.reply_to_message.from_user)
+        for member in message.new_chat_members or ():
+            directory.observe(member)
+    if update.chat_member:
+        directory.observe(update.chat_member.new_chat_member.user)
+
+
+def register_user_directory(application, directory: UserDirectory):
+    """把用户目录放入 bot_data，并在最前面的 handler group 里被动收集用户资料"""
+    application.bot_data["users"] = directory
+    application.add_handler(TypeHandler(Update, observe_update), group=-2)
@@ -0,0 +1,56 @@
+"""加权不放回抽样（树状数组 / Fenwick tree）
+
+建树 O(n)，每抽出一人 O(log n)：按前缀和二分定位中签者，再把其权重清零，
+从 n 人中抽 k 人总计 O(n + k log n)，不需要每次重新扫描整个奖池。
+权重使用整数（票数），没有浮点误差；给定同样的权重序列和种子，结果完全可复现。
+"""
+import random
+from typing import List, Sequence
+
+
+class FenwickTree:
+    def __init__(self, weights: Sequence[int]):
+        n = len(weights)
+        self.size = n
+        self.tree = [0] * (n + 1)
+        for i, weight in enumerate(weights, 1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(weights)
+        # 不超过 n 的最大 2 的幂，供 find 自顶向下二分
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, index: int, delta: int):
+        """第 index 个元素（从 0 开始）的权重加上 delta"""
+        self.total += delta
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target: int) -> int:
+        """返回前缀和首次超过 target 的元素下标（从 0 开始），要求 0 <= target < total"""
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+def weighted_sample(weights: Sequence[int], k: int, rng: random.Random) -> List[int]:
+    """按权重不放回地抽取至多 k 个下标；权重为 0 的元素不会被抽中"""
+    tree = FenwickTree(weights)
+    remaining = list(weights)
+    picked = []
+    while len(picked) < k and tree.total > 0:
+        index = tree.find(rng.randrange(tree.total))
+        picked.append(index)
+        tree.add(index, -remaining[index])
+        remaining[index] = 0
+    return picked
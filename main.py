@@ -2,11 +2,24 @@ import os
 import logging
 import asyncio
 from platform import system
+from telegram import Update
 from telegram.ext import ApplicationBuilder
-from core.database import Database
+from core.async_database import AsyncDatabase
 from core.module_manager import load_modules
 from core.switch_chat import register_switch_chat
 from core.main_menu import register_main_menu
+from core.permissions import register_admin_cache
+from core.config import config_service
+from core.user_directory import UserDirectory, register_user_directory
+from core.broadcast import BroadcastManager
+from core.outbound import OutboundScheduler
+from core.lottery import LotteryStore
+from core.timers import TimerStore
+from core.stats_collector import StatsCollector
+from core.activity_report import ActivityReports
+from core.points import PointsService
+from core.leaderboard import GlobalLeaderboard, Leaderboard
+from core.points_ledger import PointsLedger
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -28,20 +41,34 @@ async def init_bot():
     if not token:
         raise ValueError("TELEGRAM_BOT_TOKEN 未设置！")
     
-    application = ApplicationBuilder().token(token).build()
+    # 所有出站请求经过优先级调度器（审核 > 回复 > 编辑 > 广播）
+    application = ApplicationBuilder().token(token).rate_limiter(OutboundScheduler()).build()
     
     # 数据库路径处理（确保目录存在）
     db_path = os.getenv("DATABASE_PATH", "data/bot.db")
     db_dir = os.path.dirname(db_path)
     os.makedirs(db_dir, exist_ok=True)  # 自动创建数据库目录
-    db = Database(db_path)
+    db = AsyncDatabase(db_path)
     application.bot_data["db"] = db
+    register_user_directory(application, UserDirectory(db))
+    application.bot_data["broadcasts"] = BroadcastManager(db, application.bot)
+    application.bot_data["lotteries"] = LotteryStore(db)
+    application.bot_data["timers"] = TimerStore(db)
+    application.bot_data["leaderboard"] = Leaderboard(db)
+    application.bot_data["global_leaderboard"] = GlobalLeaderboard(db)
+    application.bot_data["points"] = PointsService(
+        db, application.bot_data["leaderboard"], application.bot_data["global_leaderboard"]
+    )
+    application.bot_data["ledger"] = PointsLedger(db)
+    application.bot_data["stats"] = StatsCollector(db)
+    application.bot_data["reports"] = ActivityReports(db, application.bot_data["stats"])
     
     # 动态加载模块
     load_modules(application)
     
     register_switch_chat(application)
     register_main_menu(application)
+    register_admin_cache(application)
     
     # 输出机器人信息
     try:
@@ -59,16 +86,44 @@ async def main():
         # 显式管理应用生命周期
         await app.initialize()
         await app.start()
-        await app.updater.start_polling()
+        # 监听配置文件变化（mtime 轮询 + SIGHUP）
+        config_service.start_watching()
+        # 用户目录定期批量写库
+        app.bot_data["users"].start()
+        # 消息统计定期增量写库
+        app.bot_data["stats"].start()
+        # 定期清理过期的积分明细并回收空间
+        app.bot_data["ledger"].start()
+        # 从积分表重建内存排行榜
+        await app.bot_data["leaderboard"].load()
+        # 全局排名表定期对账
+        app.bot_data["global_leaderboard"].start()
+        # 恢复进行中的抽奖
+        await app.bot_data["lotteries"].load()
+        # 恢复持久化定时器（已到期的立即触发），需在抽奖恢复之后
+        await app.bot_data["timers"].start()
+        # 继续上次未完成的广播任务
+        await app.bot_data["broadcasts"].resume()
+        # 需要显式订阅 chat_member 更新，管理员缓存和入群欢迎依赖它
+        await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
         # 保持运行直到被中断
         await asyncio.Event().wait()
     except KeyboardInterrupt:
         print("\n⏹️ 正在停止机器人...")
     finally:
         # 确保资源正确释放
+        config_service.stop_watching()
+        await app.bot_data["timers"].stop()
+        await app.bot_data["ledger"].stop()
+        await app.bot_data["global_leaderboard"].stop()
+        await app.bot_data["broadcasts"].stop()
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        await app.bot_data["users"].stop()
+        await app.bot_data["stats"].stop()
+        await app.bot_data["lotteries"].stop()
+        app.bot_data["db"].close()
 
 if __name__ == "__main__":
     try:
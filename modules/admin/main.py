@@ -1,8 +1,22 @@
 from telegram.ext import CommandHandler, ContextTypes
 from telegram import Update, User, ChatPermissions
-from core.permissions import is_chat_admin
+from core.permissions import is_chat_admin, admin_cache
 from telegram.error import BadRequest
 
+class InvalidUserArg(ValueError):
+    """命令参数既不是用户ID也不是 @用户名"""
+
+async def resolve_user_arg(context: ContextTypes.DEFAULT_TYPE, arg: str):
+    """把命令参数（用户ID 或 @用户名）解析为用户资料，优先查本地用户目录，找不到返回 None"""
+    directory = context.bot_data["users"]
+    try:
+        user_id = int(arg)
+    except ValueError:
+        if not arg.startswith('@'):
+            raise InvalidUserArg(arg)
+        return await directory.find_by_username(arg[1:])
+    return await directory.get(context.bot, user_id)
+
 async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await is_chat_admin(update, context):
         await update.message.reply_text("❌ 你没有权限执行此操作")
@@ -21,20 +35,13 @@ async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         arg = args[0]
         try:
-            user_id = int(arg)
-            chat_member = await context.bot.get_chat_member(chat_id, user_id)
-            target_user = chat_member.user
-        except ValueError:
-            if not arg.startswith('@'):
-                await update.message.reply_text("请使用 @用户名 或 回复消息")
-                return
-            username = arg[1:]
-            try:
-                chat_member = await context.bot.get_chat_member(chat_id, username)
-                target_user = chat_member.user
-            except Exception as e:
-                await update.message.reply_text(f"未找到用户：{arg}")
-                return
+            target_user = await resolve_user_arg(context, arg)
+        except InvalidUserArg:
+            await update.message.reply_text("请使用 @用户名 或 回复消息")
+            return
+        if not target_user:
+            await update.message.reply_text(f"未找到用户：{arg}")
+            return
     
     if target_user.id == update.effective_user.id:
         await update.message.reply_text("❌ 你不能踢自己")
@@ -45,8 +52,8 @@ async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        target_status = (await context.bot.get_chat_member(chat_id, target_user.id)).status
-        if target_status in ['administrator', 'creator']:
+        # 管理员名单来自缓存，无需逐个查询 get_chat_member
+        if await admin_cache.is_admin(context.bot, chat_id, target_user.id):
             await update.message.reply_text("❌ 无法踢管理员")
             return
     except Exception as e:
@@ -77,20 +84,13 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         arg = args[0]
         try:
-            user_id = int(arg)
-            chat_member = await context.bot.get_chat_member(chat_id, user_id)
-            target_user = chat_member.user
-        except ValueError:
-            if not arg.startswith('@'):
-                await update.message.reply_text("请使用 @用户名 或 回复消息")
-                return
-            username = arg[1:]
-            try:
-                chat_member = await context.bot.get_chat_member(chat_id, username)
-                target_user = chat_member.user
-            except Exception as e:
-                await update.message.reply_text(f"未找到用户：{arg}")
-                return
+            target_user = await resolve_user_arg(context, arg)
+        except InvalidUserArg:
+            await update.message.reply_text("请使用 @用户名 或 回复消息")
+            return
+        if not target_user:
+            await update.message.reply_text(f"未找到用户：{arg}")
+            return
     
     if target_user.id == update.effective_user.id:
         await update.message.reply_text("❌ 你不能封禁自己")
@@ -101,8 +101,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        target_status = (await context.bot.get_chat_member(chat_id, target_user.id)).status
-        if target_status in ['administrator', 'creator']:
+        if await admin_cache.is_admin(context.bot, chat_id, target_user.id):
             await update.message.reply_text("❌ 无法封禁管理员")
             return
     except Exception as e:
@@ -185,20 +184,13 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         duration_str = args[1]
         
         try:
-            user_id = int(user_arg)
-            chat_member = await context.bot.get_chat_member(chat_id, user_id)
-            target_user = chat_member.user
-        except ValueError:
-            if not user_arg.startswith('@'):
-                await update.message.reply_text("请使用 @用户名 或 回复消息")
-                return
-            username = user_arg[1:]
-            try:
-                chat_member = await context.bot.get_chat_member(chat_id, username)
-                target_user = chat_member.user
-            except Exception as e:
-                await update.message.reply_text(f"未找到用户：{user_arg}")
-                return
+            target_user = await resolve_user_arg(context, user_arg)
+        except InvalidUserArg:
+            await update.message.reply_text("请使用 @用户名 或 回复消息")
+            return
+        if not target_user:
+            await update.message.reply_text(f"未找到用户：{user_arg}")
+            return
         
         duration, unit = parse_duration(duration_str)
         if not duration:
@@ -214,8 +206,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        target_status = (await context.bot.get_chat_member(chat_id, target_user.id)).status
-        if target_status in ['administrator', 'creator']:
+        if await admin_cache.is_admin(context.bot, chat_id, target_user.id):
             await update.message.reply_text("❌ 无法禁言管理员")
             return
     except Exception as e:
@@ -276,15 +267,14 @@ def parse_duration(duration_str):
     return value * time_units[unit], unit
 
 async def get_user_id_by_username(context, chat_id, username):
-    try:
-        chat_member = await context.bot.get_chat_member(chat_id, username)
-        return chat_member.user.id
-    except Exception:
-        members = await context.bot.get_chat_administrators(chat_id)
-        for member in members:
-            if member.user.username and member.user.username.lower() == username.lower():
-                return member.user.id
-        return None
+    profile = await context.bot_data["users"].find_by_username(username)
+    if profile:
+        return profile.id
+    members = await context.bot.get_chat_administrators(chat_id)
+    for member in members:
+        if member.user.username and member.user.username.lower() == username.lower():
+            return member.user.id
+    return None
 
 # 帮助文本
 HELP_TEXT = """
@@ -1,49 +1,103 @@
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
+from telegram.ext import ContextTypes, CommandHandler
 from telegram import Update
-from core.database import Database
+from core.async_database import AsyncDatabase
+from core.permissions import is_chat_admin
+from core.pipeline import MessageContext, ORDER_AUTO_REPLY, STOP, get_pipeline
+from core.settings_cache import thaw
+from modules.auto_reply.matcher import MODES, DEFAULT_COOLDOWN, RuleIndex, parse_rules, regex_problem
+
+# 全局规则索引（按群组缓存编译好的匹配器）
+rule_index = RuleIndex()
+
+def _parse_options(args):
+    """解析 /auto_reply_add 开头的可选参数：mode=exact priority=5 cooldown=30"""
+    options = {}
+    while args and "=" in args[0] and args[0].split("=", 1)[0] in ("mode", "priority", "cooldown"):
+        key, value = args[0].split("=", 1)
+        options[key] = value
+        args = args[1:]
+    return options, args
+
+def _group_chat_id(update: Update):
+    """规则属于发出命令的群组；私聊中没有目标群组"""
+    chat = update.effective_chat
+    return chat.id if chat and chat.type in ("group", "supergroup") else None
 
 async def add_auto_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = context.bot_data.get("current_chat")
+    """管理员：为本群添加自动回复规则"""
+    chat_id = _group_chat_id(update)
     if not chat_id:
-        await update.message.reply_text("请先 /switch_chat 选择群组！")
+        await update.message.reply_text("请在群组中使用此命令！")
+        return
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("❌ 只有管理员可以执行此操作")
+        return
+    options, args = _parse_options(context.args or [])
+    if len(args) < 2:
+        await update.message.reply_text(
+            "用法：/auto_reply_add [mode=exact|prefix|contains|regex] [priority=数字] [cooldown=秒] 关键词 回复内容"
+        )
         return
-    if len(context.args) < 2:
-        await update.message.reply_text("用法：/auto_reply_add 关键词 回复内容")
+    keyword = args[0]
+    reply = " ".join(args[1:])
+    try:
+        rule = {
+            "reply": reply,
+            "mode": options.get("mode", "contains"),
+            "priority": int(options.get("priority", 0)),
+            "cooldown": float(options.get("cooldown", DEFAULT_COOLDOWN)),
+        }
+    except ValueError:
+        await update.message.reply_text("priority 必须是整数，cooldown 必须是数字")
         return
-    keyword = context.args[0]
-    reply = " ".join(context.args[1:])
-    db: Database = context.bot_data["db"]
-    config = db.get_config(chat_id, "auto_reply")
-    config["rules"][keyword] = reply
-    db.save_config(chat_id, "auto_reply", config)
+    if rule["mode"] not in MODES:
+        await update.message.reply_text(f"不支持的匹配模式：{rule['mode']}")
+        return
+    if rule["mode"] == "regex":
+        problem = regex_problem(keyword)
+        if problem:
+            await update.message.reply_text(f"规则无效：{problem}")
+            return
+    if not parse_rules({keyword: rule}):
+        await update.message.reply_text("规则无效")
+        return
+    db: AsyncDatabase = context.bot_data["db"]
+    settings = await db.get_group_settings(chat_id)
+    rules = thaw(settings.get("auto_reply_rules") or {})
+    rules[keyword] = rule
+    await db.update_group_settings(chat_id, auto_reply_rules=rules)
+    rule_index.invalidate(chat_id)
     await update.message.reply_text(f"已添加自动回复：{keyword} → {reply}")
 
 async def list_auto_replies(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = context.bot_data.get("current_chat")
+    chat_id = _group_chat_id(update)
     if not chat_id:
-        await update.message.reply_text("请先 /switch_chat 选择群组！")
+        await update.message.reply_text("请在群组中使用此命令！")
         return
-    db: Database = context.bot_data["db"]
-    config = db.get_config(chat_id, "auto_reply")
-    if not config["rules"]:
+    db: AsyncDatabase = context.bot_data["db"]
+    settings = await db.get_group_settings(chat_id)
+    rules = parse_rules(settings.get("auto_reply_rules"))
+    if not rules:
         await update.message.reply_text("暂无自动回复规则")
         return
     reply_text = "自动回复规则：\n"
-    for keyword, reply in config["rules"].items():
-        reply_text += f"{keyword} → {reply}\n"
+    for rule in sorted(rules, key=lambda r: r.sort_key):
+        reply_text += f"[{rule.mode}|优先级{rule.priority}] {rule.pattern} → {rule.reply}\n"
     await update.message.reply_text(reply_text)
 
-async def auto_reply_listener(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = context.bot_data.get("current_chat", update.effective_chat.id)
-    db: Database = context.bot_data["db"]
-    config = db.get_config(chat_id, "auto_reply")
-    message_text = update.message.text
-    for keyword, reply in config["rules"].items():
-        if keyword in message_text:
-            await update.message.reply_text(reply)
-            break
+async def auto_reply_listener(ctx: MessageContext):
+    """消息管道的自动回复阶段"""
+    if not ctx.chat_id or not ctx.text:
+        return
+    settings = await ctx.settings()
+    if not settings.get("auto_reply_enabled"):
+        return
+    rule = rule_index.get(ctx.chat_id, settings).match(ctx.text)
+    if rule:
+        await ctx.message.reply_text(rule.reply)
+        return STOP
 
 def register(application):
     application.add_handler(CommandHandler("auto_reply_add", add_auto_reply))
     application.add_handler(CommandHandler("auto_reply_list", list_auto_replies))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, auto_reply_listener))
\ No newline at end of file
+    get_pipeline(application).add_stage("auto_reply", ORDER_AUTO_REPLY, auto_reply_listener)
@@ -0,0 +1,178 @@
+"""自动回复规则索引：每个群组的规则编译成一个匹配器并缓存
+
+- exact：整条消息完全相等（字典查找）
+- prefix / contains：所有关键词合并进一个 Aho-Corasick 自动机，一次扫描
+- regex：合并成一个大正则做预筛，没有任何命中时直接跳过
+
+命中多条规则时按 priority（大优先）、匹配模式、添加顺序选出一条，并受每条规则的冷却时间限制。
+
+正则在事件循环上对每条群消息执行，Python 的 re 不支持超时，因此限制正则长度、拒绝嵌套量词
+（灾难性回溯的常见来源），并且只对消息的前 REGEX_MAX_TEXT 个字符做正则匹配。
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from core.keyword_matcher import KeywordMatcher
+
+MODES = ("exact", "prefix", "contains", "regex")
+# 同优先级时的模式顺序：越精确越优先
+MODE_RANK = {mode: rank for rank, mode in enumerate(MODES)}
+
+# 默认冷却时间（秒）：同一条规则在同一群组内两次触发的最小间隔
+DEFAULT_COOLDOWN = 5.0
+
+# 正则规则的最大长度，以及参与正则匹配的消息长度上限
+REGEX_MAX_PATTERN = 200
+REGEX_MAX_TEXT = 1000
+# 被量词修饰、且内部也带量词的分组，如 (a+)+、(\w*x)*、(a{2,})+
+_NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*(?:[*+]|\{\d*,?\d*\})(?:[^()\\]|\\.)*\)(?:[*+]|\{\d*,?\d*\})")
+
+
+def regex_problem(pattern: str) -> Optional[str]:
+    """检查正则规则能否安全使用，返回问题说明；没有问题返回 None"""
+    if len(pattern) > REGEX_MAX_PATTERN:
+        return f"正则过长（最多 {REGEX_MAX_PATTERN} 个字符）"
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return f"正则无效：{e}"
+    if _NESTED_QUANTIFIER.search(pattern):
+        return "正则包含嵌套量词，可能导致匹配极慢"
+    return None
+
+
+@dataclass(frozen=True)
+class ReplyRule:
+    pattern: str
+    reply: str
+    mode: str = "contains"
+    priority: int = 0
+    cooldown: float = DEFAULT_COOLDOWN
+    order: int = 0  # 添加顺序，用于同优先级排序
+
+    @property
+    def sort_key(self) -> Tuple[int, int, int]:
+        return (-self.priority, MODE_RANK[self.mode], self.order)
+
+
+def parse_rules(raw: Any) -> List[ReplyRule]:
+    """解析 group_settings.auto_reply_rules
+
+    兼容旧格式 {关键词: 回复}，新格式为 {关键词: {"reply", "mode", "priority", "cooldown"}}。
+    """
+    rules = []
+    if not isinstance(raw, Mapping):
+        return rules
+    for order, (pattern, value) in enumerate(raw.items()):
+        if isinstance(value, str):
+            rules.append(ReplyRule(pattern=pattern, reply=value, order=order))
+            continue
+        if not isinstance(value, Mapping) or not value.get("reply"):
+            continue
+        mode = value.get("mode", "contains")
+        if mode not in MODES:
+            continue
+        if mode == "regex":
+            problem = regex_problem(pattern)
+            if problem:
+                print(f"⚠️ 自动回复规则已跳过（{problem}）：{pattern}")
+                continue
+        rules.append(ReplyRule(
+            pattern=pattern,
+            reply=value["reply"],
+            mode=mode,
+            priority=int(value.get("priority", 0)),
+            cooldown=float(value.get("cooldown", DEFAULT_COOLDOWN)),
+            order=order,
+        ))
+    return rules
+
+
+class RuleMatcher:
+    """一个群组全部规则编译后的匹配器"""
+
+    def __init__(self, rules: List[ReplyRule]):
+        self.rules = rules
+        self._exact: Dict[str, ReplyRule] = {}
+        self._keyword_rules: Dict[str, List[ReplyRule]] = {}
+        self._regex_rules: List[Tuple[re.Pattern, ReplyRule]] = []
+        self.last_fired: Dict[str, float] = {}  # pattern -> 上次触发时间
+
+        for rule in sorted(rules, key=lambda r: r.sort_key):
+            if rule.mode == "regex":
+                self._regex_rules.append((re.compile(rule.pattern, re.IGNORECASE), rule))
+                continue
+            # 与 KeywordMatcher 和消息的处理方式一致：去空白、忽略大小写
+            key = rule.pattern.strip().lower()
+            if not key:
+                continue
+            if rule.mode == "exact":
+                self._exact.setdefault(key, rule)
+            else:
+                self._keyword_rules.setdefault(key, []).append(rule)
+
+        self._keywords = KeywordMatcher(self._keyword_rules.keys())
+        self._regex_any = self._combine_regex()
+
+    def _combine_regex(self) -> Optional[re.Pattern]:
+        """合并所有正则做一次预筛；无法合并（行内全局标志、重名分组等）时返回 None，逐条匹配"""
+        if len(self._regex_rules) < 2:
+            return None
+        try:
+            return re.compile(
+                "|".join(f"(?:{pattern.pattern})" for pattern, _ in self._regex_rules), re.IGNORECASE
+            )
+        except re.error:
+            return None
+
+    def _candidates(self, text: str) -> List[ReplyRule]:
+        candidates = []
+        rule = self._exact.get(text.strip().lower())
+        if rule:
+            candidates.append(rule)
+        for start, _, keyword in self._keywords.find_all(text):
+            for rule in self._keyword_rules[keyword]:
+                if rule.mode == "contains" or start == 0:
+                    candidates.append(rule)
+        if self._regex_rules:
+            head = text[:REGEX_MAX_TEXT]
+            if self._regex_any is None or self._regex_any.search(head):
+                candidates.extend(rule for pattern, rule in self._regex_rules if pattern.search(head))
+        return candidates
+
+    def match(self, text: str, now: Optional[float] = None) -> Optional[ReplyRule]:
+        """返回应触发的规则（考虑优先级和冷却），没有则返回 None；命中后记录触发时间"""
+        if not text:
+            return None
+        now = time.monotonic() if now is None else now
+        for rule in sorted(self._candidates(text), key=lambda r: r.sort_key):
+            last = self.last_fired.get(rule.pattern)
+            if last is not None and now - last < rule.cooldown:
+                continue
+            self.last_fired[rule.pattern] = now
+            return rule
+        return None
+
+
+class RuleIndex:
+    """按群组缓存编译好的匹配器；群组设置对象变化（写穿透缓存会换新对象）时重新编译"""
+
+    def __init__(self):
+        self._matchers: Dict[int, Tuple[Any, RuleMatcher]] = {}
+
+    def get(self, chat_id: int, settings: Mapping[str, Any]) -> RuleMatcher:
+        cached = self._matchers.get(chat_id)
+        if cached and cached[0] is settings:
+            return cached[1]
+        matcher = RuleMatcher(parse_rules(settings.get("auto_reply_rules")))
+        if cached:
+            matcher.last_fired = cached[1].last_fired  # 规则更新后保留冷却状态
+        self._matchers[chat_id] = (settings, matcher)
+        return matcher
+
+    def invalidate(self, chat_id: int):
+        """强制下次读取时重新编译（保留冷却状态）"""
+        cached = self._matchers.get(chat_id)
+        if cached:
+            self._matchers[chat_id] = (None, cached[1])
@@ -1,7 +1,11 @@
 from telegram.ext import CommandHandler, filters, ContextTypes
 from telegram import Update
-from core.database import Database
-import time
+from core.permissions import is_chat_admin
+from core.points import PointsService
+from core.response_cache import TOPIC_POINTS, CachedResponse, response_cache
+from modules.admin.main import InvalidUserArg, resolve_user_arg
+
+BONUS_ACTION = "admin_bonus"
 
 def register(application):
     """注册签到相关命令"""
@@ -20,65 +24,37 @@ def register(application):
         leaderboard_command, 
         filters=~filters.UpdateType.EDITED_MESSAGE
     ))
-    print("✅ 签到模块已加载，命令: ['check_in', 'points', 'leaderboard']")
+    application.add_handler(CommandHandler(
+        "rank", 
+        rank_command, 
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
+    application.add_handler(CommandHandler(
+        "bonus", 
+        bonus_command, 
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
+    print("✅ 签到模块已加载，命令: ['check_in', 'points', 'leaderboard', 'rank', 'bonus']")
 
 async def check_in_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """每日签到获取积分"""
+    """每日签到获取积分（奖励规则见 config.yaml 的 check_in 段）"""
     if not update.effective_message or not update.effective_user or not update.effective_chat:
         return
     
     user = update.effective_user
     chat = update.effective_chat
-    db: Database = context.bot_data.get("db")
-    if not db:
-        await update.effective_message.reply_text("❌ 数据库未初始化，无法签到")
-        return
-    
-    # 检查今日是否已签到
-    today = time.strftime("%Y-%m-%d")
-    check_in_record = await db.fetchone(
-        "SELECT * FROM check_ins WHERE user_id = ? AND chat_id = ? AND date = ?",
-        (user.id, chat.id, today)
-    )
+    points: PointsService = context.bot_data["points"]
     
-    if check_in_record:
+    # 是否已签到、连续天数和加分在一次原子写入中完成
+    result = await points.check_in(chat.id, user.id)
+    if result is None:
         await update.effective_message.reply_text("你今天已经签过到啦！明天再来吧～")
         return
     
-    # 计算连续签到天数
-    yesterday = time.strftime("%Y-%m-%d", time.localtime(time.time() - 86400))
-    last_check_in = await db.fetchone(
-        "SELECT streak FROM check_ins WHERE user_id = ? AND chat_id = ? AND date = ?",
-        (user.id, chat.id, yesterday)
-    )
-    streak = last_check_in["streak"] + 1 if last_check_in else 1
-    streak = min(streak, 7)  # 最大连续签到奖励为7天
-    
-    # 计算积分（基础10分+连续奖励）
-    base_points = 10
-    bonus = 5 * (streak - 1)
-    total_points = base_points + bonus
-    
-    # 保存签到记录
-    await db.execute(
-        "INSERT INTO check_ins (user_id, chat_id, date, points, streak) VALUES (?, ?, ?, ?, ?)",
-        (user.id, chat.id, today, total_points, streak)
-    )
-    
-    # 更新用户总积分
-    await db.execute(
-        "INSERT OR IGNORE INTO user_points (user_id, chat_id, points) VALUES (?, ?, 0)",
-        (user.id, chat.id)
-    )
-    await db.execute(
-        "UPDATE user_points SET points = points + ? WHERE user_id = ? AND chat_id = ?",
-        (total_points, user.id, chat.id)
-    )
-    
     await update.effective_message.reply_text(
         f"✅ 签到成功！\n"
-        f"获得 {total_points} 积分（基础 {base_points} + 连续签到奖励 {bonus}）\n"
-        f"当前连续签到 {streak} 天"
+        f"获得 {result.earned} 积分（基础 {result.base} + 连续签到奖励 {result.bonus}）\n"
+        f"当前连续签到 {result.streak} 天，总积分 {result.points}"
     )
 
 async def points_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -88,20 +64,22 @@ async def points_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     user = update.effective_user
     chat = update.effective_chat
-    db: Database = context.bot_data.get("db")
-    if not db:
-        await update.effective_message.reply_text("❌ 数据库未初始化")
-        return
+    user_points = await context.bot_data["points"].get(chat.id, user.id)
     
-    user_points = await db.fetchone(
-        "SELECT points FROM user_points WHERE user_id = ? AND chat_id = ?",
-        (user.id, chat.id)
-    )
-    
-    if not user_points or user_points["points"] == 0:
+    if user_points == 0:
         await update.effective_message.reply_text("你当前的积分为 0，赶紧签到获取吧～")
-    else:
-        await update.effective_message.reply_text(f"你的当前积分为：{user_points['points']}")
+        return
+    
+    # 本月统计读每日汇总，最近明细走覆盖索引
+    ledger = context.bot_data["ledger"]
+    text = f"你的当前积分为：{user_points}\n"
+    text += f"本月获得：{await ledger.earned_this_month(chat.id, user.id)} 积分\n"
+    history = await ledger.history(chat.id, user.id, limit=5)
+    if history:
+        text += "\n最近变动：\n"
+        for record in history:
+            text += f"{record['timestamp']} {record['action']} {record['points']:+d}\n"
+    await update.effective_message.reply_text(text)
 
 async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """查看积分排行榜"""
@@ -109,26 +87,99 @@ async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     chat = update.effective_chat
-    db: Database = context.bot_data.get("db")
-    if not db:
-        await update.effective_message.reply_text("❌ 数据库未初始化")
+    
+    async def render() -> CachedResponse:
+        top_users = await context.bot_data["points"].top(chat.id, 10)
+        if not top_users:
+            return CachedResponse("暂无积分记录，大家快来签到吧～")
+        
+        # 用户资料来自本地用户目录，常见情况下无需调用 Bot API
+        directory = context.bot_data["users"]
+        profiles = await directory.resolve(context.bot, [record["user_id"] for record in top_users])
+        
+        leaderboard = "🏆 积分排行榜（前10名）\n\n"
+        for i, record in enumerate(top_users, 1):
+            profile = profiles.get(record["user_id"])
+            if profile:
+                leaderboard += f"{i}. {profile.mention_html()} - {record['points']} 积分\n"
+            else:
+                leaderboard += f"{i}. [未知用户] - {record['points']} 积分\n"
+        return CachedResponse(leaderboard, {"parse_mode": "HTML"})
+    
+    # 榜单部分按群缓存，积分变动时失效；个人排名来自内存排行榜，每次单独追加
+    response = await response_cache.fetch(chat.id, "leaderboard", "all", ((TOPIC_POINTS, chat.id),), render)
+    text = response.text
+    user = update.effective_user
+    position = context.bot_data["leaderboard"].rank(chat.id, user.id) if user else None
+    if position:
+        text += f"\n你的排名：第 {position[0]} 名（共 {position[2]} 人）"
+    
+    await update.effective_message.reply_text(text, **response.kwargs)
+
+async def rank_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看我的排名和前后几名（内存排行榜，O(log n)）"""
+    if not update.effective_message or not update.effective_user or not update.effective_chat:
         return
     
-    top_users = await db.fetchall(
-        "SELECT user_id, points FROM user_points WHERE chat_id = ? ORDER BY points DESC LIMIT 10",
-        (chat.id,)
-    )
+    user = update.effective_user
+    chat = update.effective_chat
+    leaderboard = context.bot_data["leaderboard"]
+    position = leaderboard.rank(chat.id, user.id)
+    if not position:
+        await update.effective_message.reply_text("你还没有积分记录，赶紧签到上榜吧～")
+        return
+    
+    rank, user_points, total = position
+    neighbours = leaderboard.around(chat.id, user.id, radius=2)
+    profiles = await context.bot_data["users"].resolve(context.bot, [user_id for _, user_id, _ in neighbours])
+    
+    text = f"📍 你的排名：第 {rank} 名（共 {total} 人），积分 {user_points}\n\n"
+    for neighbour_rank, user_id, neighbour_points in neighbours:
+        profile = profiles.get(user_id)
+        name = profile.mention_html() if profile else "[未知用户]"
+        marker = "👉 " if user_id == user.id else ""
+        text += f"{marker}{neighbour_rank}. {name} - {neighbour_points} 积分\n"
+    await update.effective_message.reply_text(text, parse_mode="HTML")
+
+async def bonus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """管理员加减积分：回复消息或 /bonus <积分> <用户ID|@用户名>；/bonus <积分> all 给本群所有有积分记录的成员"""
+    message = update.effective_message
+    chat = update.effective_chat
+    if not message or not chat or chat.type not in ("group", "supergroup"):
+        return
+    if not await is_chat_admin(update, context):
+        await message.reply_text("❌ 你没有权限执行此操作")
+        return
+    
+    args = context.args or []
+    try:
+        amount = int(args[0])
+    except (IndexError, ValueError):
+        amount = 0
+    if not amount:
+        await message.reply_text("用法：/bonus <积分> [用户ID|@用户名|all]（或回复某人的消息）")
+        return
     
-    if not top_users:
-        await update.effective_message.reply_text("暂无积分记录，大家快来签到吧～")
+    points: PointsService = context.bot_data["points"]
+    if len(args) > 1 and args[1].lower() == "all":
+        members = await points.members(chat.id)
+        count = await points.award_many([(chat.id, user_id, amount) for user_id in members], BONUS_ACTION)
+        await message.reply_text(f"✅ 已为 {count} 名成员各发放 {amount} 积分")
         return
     
-    leaderboard = "🏆 积分排行榜（前10名）\n\n"
-    for i, record in enumerate(top_users, 1):
+    if message.reply_to_message:
+        target = message.reply_to_message.from_user
+    elif len(args) > 1:
         try:
-            user = await context.bot.get_chat(record["user_id"])
-            leaderboard += f"{i}. {user.mention_html()} - {record['points']} 积分\n"
-        except Exception:
-            leaderboard += f"{i}. [未知用户] - {record['points']} 积分\n"
+            target = await resolve_user_arg(context, args[1])
+        except InvalidUserArg:
+            await message.reply_text("请使用 用户ID、@用户名 或 回复消息")
+            return
+    else:
+        target = None
+    if not target:
+        await message.reply_text("未找到目标用户")
+        return
     
-    await update.effective_message.reply_text(leaderboard, parse_mode="HTML")
+    new_points = await points.award(chat.id, target.id, amount, BONUS_ACTION)
+    await message.reply_text(f"✅ 已为 {target.first_name} 发放 {amount} 积分，当前积分 {new_points}")
@@ -1,21 +1,52 @@
-from telegram.ext import MessageHandler, filters, ContextTypes
-from telegram import Update
-from core.permissions import is_chat_admin
-import yaml
+from core.pipeline import MessageContext, ORDER_MODERATION, STOP, get_pipeline
+from core.keyword_matcher import KeywordMatcher, get_matcher, parse_word_list
+from core.config import get_config
+from core.outbound import send_detached
+from typing import Any, Dict, List, Tuple
 
-async def filter_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if await is_chat_admin(update, context):
+# 每个群组当前使用的匹配器：chat_id -> (全局词表, 群组设置, 匹配器)
+# 全局配置快照和群组设置都是不可变对象，只要对象没换就说明词表没变，无需重新构建
+_group_matchers: Dict[int, Tuple[Any, Any, KeywordMatcher]] = {}
+
+# 旧版 group_settings 表结构的默认词表：在此之前创建、从未保存过词表的群组读到的都是这些值，视为未配置
+_SCHEMA_DEFAULT_WORDS = {
+    "filter_words": ("广告", "违规", "测试"),
+    "ban_words_list": ("广告", "违规"),
+}
+
+def _group_words(settings) -> List[str]:
+    """群组自己保存的过滤词（filter_words）和违禁词（ban_words_list），表结构默认值不生效"""
+    words = []
+    for enabled, field in (("filter_enabled", "filter_words"), ("ban_words_enabled", "ban_words_list")):
+        if not settings.get(enabled):
+            continue
+        saved = parse_word_list(settings.get(field))
+        if tuple(saved) != _SCHEMA_DEFAULT_WORDS[field]:
+            words += saved
+    return words
+
+def _matcher_for(chat_id: int, settings) -> KeywordMatcher:
+    sensitive_words = get_config().filter.sensitive_words
+    cached = _group_matchers.get(chat_id)
+    if cached and cached[0] is sensitive_words and cached[1] is settings:
+        return cached[2]
+    # 与原先的 `word in text` 一致，区分大小写
+    matcher = get_matcher(list(sensitive_words) + _group_words(settings), ignore_case=False)
+    _group_matchers[chat_id] = (sensitive_words, settings, matcher)
+    return matcher
+
+async def filter_message(ctx: MessageContext):
+    """消息管道的审核阶段：命中敏感词则删除消息并终止后续阶段"""
+    if not ctx.is_group or not ctx.text:
         return
-    if not update.effective_message.text:
+    if await ctx.is_admin():
         return
-    with open("../config/config.yaml", "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    sensitive_words = config.get("module_settings", {}).get("filter", {}).get("sensitive_words", [])
-    for word in sensitive_words:
-        if word in update.effective_message.text:
-            await update.effective_message.delete()
-            await update.message.reply_text("❌ 消息包含敏感内容，已删除")
-            break
+    matcher = _matcher_for(ctx.chat_id, await ctx.settings())
+    if matcher.search(ctx.text):
+        await ctx.message.delete()
+        # 提示受单聊天限流，刷屏时可能要排队几秒；放到后台，不让后续消息的删除等它
+        send_detached(ctx.message.reply_text("❌ 消息包含敏感内容，已删除"), "敏感内容提示")
+        return STOP
 
 def register(application):
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, filter_message))
\ No newline at end of file
+    get_pipeline(application).add_stage("moderation", ORDER_MODERATION, filter_message)
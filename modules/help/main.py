@@ -1,35 +1,44 @@
 from telegram.ext import CommandHandler, filters, ContextTypes
 from telegram import Update
 from core.permissions import is_bot_owner, is_chat_admin
+from core.response_cache import TOPIC_ADMINS, CachedResponse, response_cache
 
 # 帮助信息字典，供其他模块（如admin）导入
 HELP_MESSAGES = {
     "general": [
         "/help - 显示帮助菜单",
         "/start - 启动机器人",
-        "/group_settings - 查看本群功能设置（仅群组）"
+        "/group_settings - 查看本群功能设置（仅群组）",
+        "/activity [天数] - 查看本群发言统计（仅群组）"
     ],
     "check_in": [
         "/check_in - 每日签到获取积分",
         "/points - 查看我的积分",
-        "/leaderboard - 查看积分排行榜"
+        "/leaderboard - 查看积分排行榜",
+        "/rank - 查看我的排名"
     ],
     "lottery": [
         "/lottery - 查看抽奖状态",
-        "/lottery start [奖品] - 开始抽奖（管理员）",
+        "/lottery start [winners=人数] [weight=points|streak] [at=HH:MM] [count=人数] [奖品] - 开始抽奖（管理员）",
         "/lottery stop - 停止抽奖（管理员）",
-        "/lottery draw - 抽取获奖者（管理员）"
+        "/lottery draw - 抽取获奖者（管理员）",
+        "/lottery verify [抽奖ID] - 复核开奖结果（管理员）"
     ],
     "admin": [
         "/kick [用户] - 踢出用户",
         "/ban [用户] - 封禁用户",
         "/mute [用户] [时长] - 禁言用户",
-        "/unmute [用户] - 解除禁言"
+        "/unmute [用户] - 解除禁言",
+        "/bonus [积分] [用户|all] - 发放或扣除积分",
+        "/report [天数] [png] - 查看本群活跃度报表"
     ],
     "owner": [
         "/list_chats - 查看机器人加入的所有群组",
         "/broadcast [消息] - 向所有群组发送广播",
-        "/stats - 查看机器人统计信息"
+        "/broadcast_status [任务ID] - 查看广播进度",
+        "/stats [reconcile] - 查看机器人统计信息（reconcile 重新核对计数器）",
+        "/report <群组ID> [天数] [png] - 查看指定群组的活跃度报表",
+        "/global_top [points|check_ins] [人数] - 查看跨群组排行榜"
     ]
 }
 
@@ -43,7 +52,7 @@ def register(application):
     print("✅ 已加载模块: help")
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """显示帮助菜单，根据权限展示不同命令"""
+    """显示帮助菜单，根据权限展示不同命令（按聊天和角色缓存渲染结果）"""
     if not update.effective_message:
         return
     user = update.effective_user
@@ -51,32 +60,50 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user or not chat:
         return
     
-    is_owner = is_bot_owner(user.id)
-    is_admin = await is_chat_admin(update, context)
+    is_owner = await is_bot_owner(user.id)
+    is_admin = await is_chat_admin(update, context)  # 管理员名单有缓存，命中时不调用 Bot API
+    is_group = chat.type in ["group", "supergroup"]
+    role = "owner" if is_owner else "member"
+    if is_admin:
+        role += "+admin"
+    
+    # 私聊的帮助内容只取决于角色，所有私聊共用一份；群组内随管理员变动失效
+    scope = chat.id if is_group else "private"
+    topics = ((TOPIC_ADMINS, chat.id),) if is_group else ()
     
-    # 构建帮助文本
+    async def render() -> CachedResponse:
+        return CachedResponse(render_help(is_group, is_admin, is_owner))
+    
+    response = await response_cache.fetch(scope, "help", role, topics, render)
+    await update.effective_message.reply_text(response.text, **response.kwargs)
+
+def render_help(is_group: bool, is_admin: bool, is_owner: bool) -> str:
+    """构建帮助文本"""
     help_text = "📋 帮助菜单\n\n"
     
     # 通用命令
     help_text += "🔸 通用命令：\n"
     help_text += "/help - 显示此帮助菜单\n"
     help_text += "/start - 启动机器人\n"
-    if chat.type in ["group", "supergroup"]:
+    if is_group:
         help_text += "/group_settings - 查看本群功能设置（仅群组）\n"
+        help_text += "/activity [天数] - 查看本群发言统计（仅群组）\n"
     
     # 积分命令
     help_text += "\n🔸 积分命令：\n"
     help_text += "/check_in - 每日签到获取积分\n"
     help_text += "/points - 查看我的积分\n"
     help_text += "/leaderboard - 查看积分排行榜\n"
+    help_text += "/rank - 查看我的排名和前后几名\n"
     
     # 抽奖命令
     help_text += "\n🔸 抽奖命令：\n"
     help_text += "/lottery - 查看抽奖状态\n"
     if is_admin:
-        help_text += "/lottery start [奖品] - 开始抽奖（管理员）\n"
+        help_text += "/lottery start [winners=人数] [weight=points|streak] [at=HH:MM] [count=人数] [奖品] - 开始抽奖（管理员）\n"
         help_text += "/lottery stop - 停止抽奖（管理员）\n"
         help_text += "/lottery draw - 抽取获奖者（管理员）\n"
+        help_text += "/lottery verify [抽奖ID] - 复核开奖结果（管理员）\n"
     
     # 管理员命令
     if is_admin:
@@ -85,12 +112,17 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         help_text += "/ban [用户] - 封禁用户（回复用户消息或@用户）\n"
         help_text += "/mute [用户] [时长] - 禁言用户（例如：/mute @user 60代表禁言60分钟）\n"
         help_text += "/unmute [用户] - 解除禁言（回复用户消息或@用户）\n"
+        help_text += "/bonus [积分] [用户|all] - 发放或扣除积分（回复用户消息、@用户 或 all 全体）\n"
+        help_text += "/report [天数] [png] - 查看本群活跃度报表\n"
     
     # 所有者命令
     if is_owner:
         help_text += "\n🔸 所有者命令：\n"
         help_text += "/list_chats - 查看机器人加入的所有群组\n"
         help_text += "/broadcast [消息] - 向所有群组发送广播\n"
-        help_text += "/stats - 查看机器人统计信息\n"
+        help_text += "/broadcast_status [任务ID] - 查看广播进度\n"
+        help_text += "/stats [reconcile] - 查看机器人统计信息（reconcile 重新核对计数器）\n"
+        help_text += "/report <群组ID> [天数] [png] - 查看指定群组的活跃度报表\n"
+        help_text += "/global_top [points|check_ins] [人数] - 查看跨群组排行榜（reconcile 立即对账）\n"
     
-    await update.effective_message.reply_text(help_text)
+    return help_text
@@ -1,16 +1,105 @@
 import asyncio
-import random
+import html
 import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import partial
 from telegram.ext import CommandHandler, CallbackQueryHandler, filters, ContextTypes
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telegram.constants import ParseMode
 from core.permissions import admin_required, is_chat_admin
+from core.edit_coalescer import edit_coalescer
+from core.outbound import send_detached
+from core.lottery import LotteryStore, MAX_WINNERS, MODES, STATUS_ACTIVE
 
-# 存储当前正在进行的抽奖
-active_lotteries = {}
+# 抽奖模式的显示名称
+MODE_NAMES = {"uniform": "等概率", "points": "按积分加权", "streak": "按连续签到天数加权"}
+# 自动开奖定时器类型（key 为 lottery_id）
+TIMER_KIND = "lottery_draw"
+# 自动开奖公告发送失败后的重试次数和间隔（秒）
+ANNOUNCE_RETRIES = 5
+ANNOUNCE_RETRY_DELAY = 60
+
+# 参与者列表分页：每页人数；渲染结果按 (抽奖, 参与人数, 页码) 缓存，有人参与后自然失效
+PAGE_SIZE = 15
+PAGE_CACHE_SIZE = 256
+_page_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def get_lottery_store(context: ContextTypes.DEFAULT_TYPE) -> LotteryStore:
+    """进行中的抽奖保存在 bot_data["lotteries"]（持久化在数据库，启动时恢复）"""
+    return context.bot_data["lotteries"]
+
+def _parse_draw_time(value: str):
+    """解析定时开奖时间：HH:MM（已过则为明天）或 YYYY-MM-DDTHH:MM，返回时间戳"""
+    now = datetime.now()
+    try:
+        when = datetime.combine(now.date(), datetime.strptime(value, "%H:%M").time())
+        if when <= now:
+            when += timedelta(days=1)
+    except ValueError:
+        try:
+            when = datetime.strptime(value, "%Y-%m-%dT%H:%M")
+        except ValueError:
+            return None
+    return when.timestamp()
+
+def _mention(profiles, user_id):
+    return profiles[user_id].mention_html() if user_id in profiles else str(user_id)
+
+def _result_text(lottery, winner_ids, seed, profiles):
+    return (
+        f"🏆 抽奖结果公布！\n\n"
+        f"恭喜 {'、'.join(_mention(profiles, winner_id) for winner_id in winner_ids)} 获得 {html.escape(lottery.prize)}！\n\n"
+        f"🎊 感谢所有参与者的支持！\n"
+        f"🔐 抽奖ID: <code>{lottery.lottery_id}</code>，种子: <code>{seed}</code>"
+    )
+
+def _trigger_text(lottery):
+    """自动开奖条件说明"""
+    lines = []
+    if lottery.draw_at:
+        lines.append(f"⏰ 开奖时间: {time.strftime('%Y-%m-%d %H:%M', time.localtime(lottery.draw_at))}\n")
+    if lottery.draw_at_count:
+        lines.append(f"👥 满 {lottery.draw_at_count} 人自动开奖\n")
+    return "".join(lines)
+
+async def auto_draw(application, lottery_id, payload):
+    """定时器触发的自动开奖（到达开奖时间或参与人数）
+
+    开奖结果一经记录就不能重抽，所以公告发送失败时把公告内容存进定时器改期重发，
+    直到发送成功或用完重试次数。
+    """
+    announcement = payload.get("announcement")
+    if announcement is None:
+        store: LotteryStore = application.bot_data["lotteries"]
+        lottery = store.get(payload.get("chat_id"))
+        if not lottery or lottery.lottery_id != lottery_id or lottery.status != STATUS_ACTIVE:
+            return  # 已手动开奖或结束
+        
+        if not len(lottery):
+            await store.finish(lottery)
+            announcement = {"text": f"⏰ 抽奖「{lottery.prize}」无人参与，已自动结束"}
+        else:
+            winner_ids, seed = await store.draw(lottery)
+            profiles = await application.bot_data["users"].resolve(application.bot, winner_ids)
+            announcement = {"text": _result_text(lottery, winner_ids, seed, profiles), "parse_mode": ParseMode.HTML}
+    
+    try:
+        await application.bot.send_message(
+            payload["chat_id"], announcement["text"], parse_mode=announcement.get("parse_mode")
+        )
+    except Exception:
+        attempts = payload.get("attempts", 0) + 1
+        if attempts <= ANNOUNCE_RETRIES:
+            await application.bot_data["timers"].schedule(
+                TIMER_KIND, lottery_id, time.time() + ANNOUNCE_RETRY_DELAY,
+                {"chat_id": payload["chat_id"], "announcement": announcement, "attempts": attempts}
+            )
+        raise
 
 def register(application):
     """注册抽奖模块的命令和处理器"""
+    application.bot_data["timers"].register(TIMER_KIND, partial(auto_draw, application))
     application.add_handler(CommandHandler(
         "lottery", 
         lottery_command, 
@@ -32,10 +121,10 @@ async def lottery_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args or []
     
     # 检查是否有正在进行的抽奖
-    has_active = chat_id in active_lotteries
+    has_active = get_lottery_store(context).get(chat_id) is not None
     
     # 管理员命令处理
-    if args and args[0] in ["start", "stop", "draw"]:
+    if args and args[0] in ["start", "stop", "draw", "verify"]:
         if not await is_chat_admin(update, context):
             await update.effective_message.reply_text("❌ 只有管理员可以执行此操作")
             return
@@ -46,6 +135,8 @@ async def lottery_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await stop_lottery(update, context)
         elif args[0] == "draw":
             await draw_winner(update, context)
+        elif args[0] == "verify":
+            await verify_lottery(update, context, args[1:])
     else:
         # 普通用户查看抽奖状态或参与
         if has_active:
@@ -63,24 +154,55 @@ async def start_lottery(update: Update, context: ContextTypes.DEFAULT_TYPE, args
         return
     
     chat_id = update.effective_chat.id
+    store = get_lottery_store(context)
     
-    if chat_id in active_lotteries:
+    if store.get(chat_id):
         await update.effective_message.reply_text("⚠️ 当前已有正在进行的抽奖，请先结束它！")
         return
     
+    # 可选参数：winners=获奖人数 weight=points|streak（按积分 / 连续签到天数加权）
+    #          at=HH:MM|YYYY-MM-DDTHH:MM（定时开奖） count=人数（满员自动开奖）
+    options = {}
+    while args and "=" in args[0] and args[0].split("=", 1)[0] in ("winners", "weight", "at", "count"):
+        key, value = args[0].split("=", 1)
+        options[key] = value
+        args = args[1:]
+    
     if not args:
-        await update.effective_message.reply_text("❌ 请指定奖品名称！使用格式: /lottery start [奖品名称]")
+        await update.effective_message.reply_text(
+            "❌ 请指定奖品名称！使用格式: /lottery start [winners=人数] [weight=points|streak] "
+            "[at=HH:MM] [count=人数] [奖品名称]"
+        )
         return
     
+    mode = options.get("weight", "uniform")
+    try:
+        winner_count = int(options.get("winners", 1))
+    except ValueError:
+        winner_count = 0
+    if mode not in MODES or not 1 <= winner_count <= MAX_WINNERS:
+        await update.effective_message.reply_text(
+            f"❌ 参数无效：weight 可选 points / streak，winners 为 1~{MAX_WINNERS}"
+        )
+        return
+    
+    draw_at = _parse_draw_time(options["at"]) if "at" in options else None
+    if "at" in options and draw_at is None:
+        await update.effective_message.reply_text("❌ 开奖时间格式无效，示例：at=20:00 或 at=2024-12-31T20:00")
+        return
+    draw_at_count = None
+    if "count" in options:
+        draw_at_count = int(options["count"]) if options["count"].isdigit() else 0
+        if draw_at_count < 1:
+            await update.effective_message.reply_text("❌ count 必须为正整数")
+            return
+    
     prize_name = " ".join(args)
     
-    # 初始化抽奖数据
-    active_lotteries[chat_id] = {
-        "start_time": time.time(),
-        "participants": [],
-        "prize": prize_name,
-        "status": "active"  # active, drawing, ended
-    }
+    # 初始化抽奖数据（写入数据库），定时开奖交给持久化定时器
+    lottery = await store.start(chat_id, prize_name, mode, winner_count, draw_at, draw_at_count)
+    if draw_at:
+        await context.bot_data["timers"].schedule(TIMER_KIND, lottery.lottery_id, draw_at, {"chat_id": chat_id})
     
     # 创建操作键盘
     keyboard = [
@@ -93,7 +215,9 @@ async def start_lottery(update: Update, context: ContextTypes.DEFAULT_TYPE, args
     await update.effective_message.reply_text(
         f"🎉 抽奖活动开始啦！\n\n"
         f"🏆 奖品: {prize_name}\n"
-        f"⏰ 开始时间: {time.strftime('%Y-%m-%d %H:%M', time.localtime())}\n\n"
+        f"🎯 获奖人数: {winner_count}（{MODE_NAMES[mode]}）\n"
+        f"⏰ 开始时间: {time.strftime('%Y-%m-%d %H:%M', time.localtime())}\n"
+        f"{_trigger_text(lottery)}\n"
         f"点击下方按钮参与抽奖吧！",
         reply_markup=reply_markup
     )
@@ -105,13 +229,16 @@ async def stop_lottery(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     chat_id = update.effective_chat.id
+    store = get_lottery_store(context)
+    lottery = store.get(chat_id)
     
-    if chat_id not in active_lotteries:
+    if not lottery:
         await update.effective_message.reply_text("⚠️ 当前没有正在进行的抽奖！")
         return
     
-    # 移除抽奖
-    del active_lotteries[chat_id]
+    # 结束抽奖
+    await store.finish(lottery)
+    await context.bot_data["timers"].cancel(TIMER_KIND, lottery.lottery_id)
     await update.effective_message.reply_text("🔴 抽奖已提前结束！")
 
 async def show_lottery_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -120,14 +247,14 @@ async def show_lottery_status(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     chat_id = update.effective_chat.id
-    lottery = active_lotteries.get(chat_id)
+    lottery = get_lottery_store(context).get(chat_id)
     
     if not lottery:
         await update.effective_message.reply_text("当前没有正在进行的抽奖！")
         return
     
     # 计算抽奖持续时间
-    duration = int(time.time() - lottery["start_time"])
+    duration = int(time.time() - lottery.start_time)
     hours, remainder = divmod(duration, 3600)
     minutes, seconds = divmod(remainder, 60)
     
@@ -143,9 +270,10 @@ async def show_lottery_status(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await update.effective_message.reply_text(
         f"🎰 当前正在进行的抽奖\n\n"
-        f"🏆 奖品: {lottery['prize']}\n"
+        f"🏆 奖品: {lottery.prize}\n"
         f"⏳ 已持续: {hours}时{minutes}分{seconds}秒\n"
-        f"👥 参与人数: {len(lottery['participants'])}\n\n"
+        f"👥 参与人数: {len(lottery)}\n"
+        f"{_trigger_text(lottery)}\n"
         f"点击按钮参与或查看详情",
         reply_markup=reply_markup
     )
@@ -157,7 +285,7 @@ async def handle_lottery_actions(update: Update, context: ContextTypes.DEFAULT_T
         return
     await query.answer()
     
-    # 解析回调数据
+    # 解析回调数据：lottery:<操作>:<群组ID>[:<页码>]
     parts = query.data.split(":")
     if len(parts) < 3:
         await query.edit_message_text("❌ 无效操作")
@@ -165,18 +293,25 @@ async def handle_lottery_actions(update: Update, context: ContextTypes.DEFAULT_T
     
     action = parts[1]
     chat_id = int(parts[2])
+    if action == "noop":
+        return
     
     # 检查抽奖是否存在
-    if chat_id not in active_lotteries:
+    lottery = get_lottery_store(context).get(chat_id)
+    if not lottery:
         await query.edit_message_text("❌ 抽奖已结束或不存在！")
         return
     
-    lottery = active_lotteries[chat_id]
-    
     if action == "join":
         await handle_join_lottery(query, lottery, chat_id, context)
     elif action == "list":
         await handle_show_participants(query, lottery, context)
+    elif action == "page":
+        page = int(parts[3]) if len(parts) > 3 and parts[3].isdigit() else 0
+        await handle_show_participants(query, lottery, context, page)
+    elif action == "home":
+        text, reply_markup = _home_view(lottery, chat_id)
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
     elif action == "draw":
         if await is_chat_admin(update, context):
             await draw_winner(update, context, chat_id, is_query=True)
@@ -189,75 +324,96 @@ async def handle_join_lottery(query: CallbackQuery, lottery, chat_id, context: C
     if not user:
         return
     
-    # 检查是否已参与
-    if user.id in [p["id"] for p in lottery["participants"]]:
-        await query.answer("你已经参与过抽奖啦！", show_alert=True)
+    if lottery.status != STATUS_ACTIVE:
+        await query.answer("抽奖正在开奖，无法参与", show_alert=True)
         return
     
-    # 添加参与者
-    lottery["participants"].append({
-        "id": user.id,
-        "name": user.mention_html(),
-        "join_time": time.time()
-    })
+    # 检查是否已参与并添加参与者（集合索引 O(1)，后台批量写库）
+    if not get_lottery_store(context).join(lottery, user.id):
+        await query.answer("你已经参与过抽奖啦！", show_alert=True)
+        return
     
-    # 更新消息
+    # 达到满员人数：立即触发自动开奖（经由定时器，重启也不会丢）
+    if lottery.draw_at_count and len(lottery) >= lottery.draw_at_count:
+        timers = context.bot_data["timers"]
+        due = timers.get(TIMER_KIND, lottery.lottery_id)
+        if due is None or due > time.time():
+            await timers.schedule(TIMER_KIND, lottery.lottery_id, time.time(), {"chat_id": chat_id})
+    
+    # 更新消息：参与高峰时每次点击都编辑会触发频率限制，交给合并器按间隔刷新
+    text, reply_markup = _home_view(lottery, chat_id)
+    edit_coalescer.submit(
+        context.bot,
+        query.message.chat.id,
+        query.message.message_id,
+        text,
+        reply_markup=reply_markup,
+        parse_mode=ParseMode.HTML
+    )
+
+def _home_view(lottery, chat_id):
+    """抽奖主页（实时参与人数 + 操作按钮）"""
     keyboard = [
         [InlineKeyboardButton("🎲 参与抽奖", callback_data=f"lottery:join:{chat_id}")],
         [InlineKeyboardButton("📊 查看参与者", callback_data=f"lottery:list:{chat_id}")],
         [InlineKeyboardButton("🎁 抽取获奖者", callback_data=f"lottery:draw:{chat_id}")]
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        f"🎉 你已成功参与抽奖！\n\n"
-        f"🏆 奖品: {lottery['prize']}\n"
-        f"👥 当前参与人数: {len(lottery['participants'])}\n"
-        f"⏰ 参与时间: {time.strftime('%H:%M:%S', time.localtime())}",
-        reply_markup=reply_markup,
-        parse_mode=ParseMode.HTML
+    text = (
+        f"🎉 抽奖进行中！\n\n"
+        f"🏆 奖品: {html.escape(lottery.prize)}\n"
+        f"👥 当前参与人数: {len(lottery)}\n\n"
+        f"点击下方按钮参与抽奖吧！"
     )
+    return text, InlineKeyboardMarkup(keyboard)
 
-async def handle_show_participants(query: CallbackQuery, lottery, context: ContextTypes.DEFAULT_TYPE):
-    """显示参与者列表"""
-    if not lottery["participants"]:
-        await query.edit_message_text("暂无参与者，请邀请好友参与吧！")
-        return
-    
-    # 生成参与者列表
-    participants_list = []
-    for i, participant in enumerate(lottery["participants"], 1):
-        participants_list.append(f"{i}. {participant['name']}")
-    
-    # 分页处理
-    page_size = 15
-    total_pages = (len(participants_list) + page_size - 1) // page_size
-    current_page = 0
-    start = current_page * page_size
-    end = start + page_size
-    page_content = participants_list[start:end]
-    
-    # 分页键盘
+async def _render_participants_page(context: ContextTypes.DEFAULT_TYPE, lottery, chat_id, page):
+    """渲染参与者列表的一页：直接按页切片参与者数组，只解析本页的名字"""
+    total = len(lottery)
+    total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = min(max(page, 0), total_pages - 1)
+    cache_key = (lottery.lottery_id, total, page)
+    cached = _page_cache.get(cache_key)
+    if cached:
+        _page_cache.move_to_end(cache_key)
+        return cached
+    
+    start = page * PAGE_SIZE
+    page_ids = lottery.participant_ids[start:start + PAGE_SIZE]
+    profiles = await context.bot_data["users"].resolve(context.bot, page_ids)
+    page_content = [f"{i}. {_mention(profiles, user_id)}" for i, user_id in enumerate(page_ids, start + 1)]
+    
+    # 分页键盘：页码直接编码在回调数据里
     pagination_keyboard = []
     if total_pages > 1:
-        pagination_keyboard.append([
-            InlineKeyboardButton("上一页", callback_data=f"lottery:prev:{query.message.chat.id}"),
-            InlineKeyboardButton(f"{current_page+1}/{total_pages}", callback_data="lottery:page"),
-            InlineKeyboardButton("下一页", callback_data=f"lottery:next:{query.message.chat.id}")
-        ])
+        row = []
+        if page > 0:
+            row.append(InlineKeyboardButton("上一页", callback_data=f"lottery:page:{chat_id}:{page - 1}"))
+        row.append(InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data=f"lottery:noop:{chat_id}"))
+        if page < total_pages - 1:
+            row.append(InlineKeyboardButton("下一页", callback_data=f"lottery:page:{chat_id}:{page + 1}"))
+        pagination_keyboard.append(row)
     
     pagination_keyboard.append([
-        InlineKeyboardButton("返回抽奖主页", callback_data=f"lottery:home:{query.message.chat.id}")
+        InlineKeyboardButton("返回抽奖主页", callback_data=f"lottery:home:{chat_id}")
     ])
     
-    reply_markup = InlineKeyboardMarkup(pagination_keyboard)
-    
-    await query.edit_message_text(
-        f"📊 抽奖参与者 ({len(lottery['participants'])}人)\n\n"
-        f"{chr(10).join(page_content)}",
-        reply_markup=reply_markup,
-        parse_mode=ParseMode.HTML
+    rendered = (
+        f"📊 抽奖参与者 ({total}人)\n\n{chr(10).join(page_content)}",
+        InlineKeyboardMarkup(pagination_keyboard)
     )
+    _page_cache[cache_key] = rendered
+    while len(_page_cache) > PAGE_CACHE_SIZE:
+        _page_cache.popitem(last=False)
+    return rendered
+
+async def handle_show_participants(query: CallbackQuery, lottery, context: ContextTypes.DEFAULT_TYPE, page=0):
+    """显示参与者列表（分页）"""
+    if not len(lottery):
+        await query.edit_message_text("暂无参与者，请邀请好友参与吧！")
+        return
+    
+    text, reply_markup = await _render_participants_page(context, lottery, lottery.chat_id, page)
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
 async def draw_winner(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id=None, is_query=False):
     """抽取获奖者"""
@@ -273,45 +429,65 @@ async def draw_winner(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_i
         message = update.effective_message
         chat_id = chat_id or update.effective_chat.id
     
-    lottery = active_lotteries.get(chat_id)
-    if not lottery:
+    store = get_lottery_store(context)
+    lottery = store.get(chat_id)
+    if not lottery or lottery.status != STATUS_ACTIVE:
         await message.edit_text("❌ 抽奖已结束或不存在！")
         return
     
-    if len(lottery["participants"]) < 1:
+    if len(lottery) < 1:
         await message.edit_text("❌ 参与人数不足，无法抽奖！")
         return
     
-    # 显示抽奖动画
-    lottery["status"] = "drawing"
+    # 先确定并记录获奖者和种子（动画中途失败也不影响结果），动画中的候选人一起解析名字
+    winner_ids, seed = await store.draw(lottery)
+    await context.bot_data["timers"].cancel(TIMER_KIND, lottery.lottery_id)
+    temp_ids = [lottery.draw() for _ in range(5)]
+    profiles = await context.bot_data["users"].resolve(context.bot, temp_ids + winner_ids)
+    
+    # 先丢弃还没发出的参与人数刷新，避免覆盖结果
+    await edit_coalescer.cancel(message.chat.id, message.message_id)
+    # 结果已确定并记录，动画和结果编辑放到后台：受单聊天限流时不阻塞后续更新的处理
+    send_detached(_animate_draw(message, lottery, chat_id, temp_ids, winner_ids, seed, profiles), "开奖动画")
+
+async def _animate_draw(message, lottery, chat_id, temp_ids, winner_ids, seed, profiles):
+    """显示抽奖动画，最后改为开奖结果"""
     await message.edit_text("🎲 正在抽取获奖者...")
     
-    for _ in range(5):
-        temp_winner = random.choice(lottery["participants"])
+    for temp_id in temp_ids:
         await message.edit_text(
             f"🎲 正在抽取获奖者...\n"
-            f"当前选中: {temp_winner['name']}",
+            f"当前选中: {_mention(profiles, temp_id)}",
             parse_mode=ParseMode.HTML
         )
         await asyncio.sleep(0.5)
     
-    # 最终确定获奖者
-    winner = random.choice(lottery["participants"])
-    lottery["status"] = "ended"
-    
     # 显示结果
     keyboard = [
         [InlineKeyboardButton("查看完整名单", callback_data=f"lottery:list:{chat_id}")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    result_msg = (
-        f"🏆 抽奖结果公布！\n\n"
-        f"恭喜 {winner['name']} 获得 {lottery['prize']}！\n\n"
-        f"🎊 感谢所有参与者的支持！"
-    )
+    result_msg = _result_text(lottery, winner_ids, seed, profiles)
     
     await message.edit_text(result_msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+
+@admin_required
+async def verify_lottery(update: Update, context: ContextTypes.DEFAULT_TYPE, args):
+    """管理员：按记录的种子和权重快照重新计算，核对开奖结果"""
+    if not args:
+        await update.effective_message.reply_text("用法：/lottery verify [抽奖ID]")
+        return
     
-    # 移除抽奖
-    del active_lotteries[chat_id]
+    result = await get_lottery_store(context).replay(args[0])
+    if result is None:
+        await update.effective_message.reply_text("❌ 未找到已开奖的抽奖记录")
+        return
+    
+    recorded, recomputed = result
+    if recorded == recomputed:
+        await update.effective_message.reply_text(f"✅ 复核一致，获奖者：{', '.join(map(str, recorded))}")
+    else:
+        await update.effective_message.reply_text(
+            f"❌ 复核不一致！\n记录：{', '.join(map(str, recorded))}\n重算：{', '.join(map(str, recomputed))}"
+        )
@@ -1,8 +1,10 @@
-import asyncio
 from telegram.ext import CommandHandler, filters, ContextTypes
 from telegram import Update
 from core.permissions import owner_required
-from core.database import Database
+from core.edit_coalescer import edit_coalescer
+from core.response_cache import response_cache
+from core.leaderboard import GLOBAL_METRICS, GLOBAL_TOP_K
+from core.async_database import AsyncDatabase
 import time
 
 def register(application):
@@ -17,11 +19,21 @@ def register(application):
         broadcast_command, 
         filters=~filters.UpdateType.EDITED_MESSAGE
     ))
+    application.add_handler(CommandHandler(
+        "broadcast_status", 
+        broadcast_status_command, 
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
     application.add_handler(CommandHandler(
         "stats", 
         stats_command, 
         filters=~filters.UpdateType.EDITED_MESSAGE
     ))
+    application.add_handler(CommandHandler(
+        "global_top", 
+        global_top_command, 
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
     print("✅ 已加载模块: owner")
 
 @owner_required
@@ -30,7 +42,7 @@ async def list_chats_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not update.effective_message:
         return
     
-    db: Database = context.bot_data.get("db")
+    db: AsyncDatabase = context.bot_data.get("db")
     if not db:
         await update.effective_message.reply_text("❌ 数据库未初始化")
         return
@@ -54,41 +66,74 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     message = " ".join(context.args)
-    db: Database = context.bot_data.get("db")
+    db: AsyncDatabase = context.bot_data.get("db")
     if not db:
         await update.effective_message.reply_text("❌ 数据库未初始化")
         return
     
     chats = await db.fetchall("SELECT chat_id FROM chats")
-    success = 0
-    failed = 0
-    
-    for chat in chats:
-        try:
-            await context.bot.send_message(chat_id=chat["chat_id"], text=message)
-            success += 1
-            await asyncio.sleep(0.5)  # 避免触发频率限制
-        except Exception:
-            failed += 1
+    if not chats:
+        await update.effective_message.reply_text("🤖 尚未加入任何群组")
+        return
     
+    # 创建持久化的广播任务后立即返回，由后台按频率限制并发发送
+    broadcasts = context.bot_data["broadcasts"]
+    job = await broadcasts.create_job(
+        message, [chat["chat_id"] for chat in chats], created_by=update.effective_user.id
+    )
     await update.effective_message.reply_text(
-        f"📢 广播完成：\n成功发送到 {success} 个群组\n失败 {failed} 个群组"
+        f"📢 已创建广播任务 #{job.job_id}，共 {job.total} 个群组\n"
+        f"使用 /broadcast_status {job.job_id} 查看进度"
     )
 
+@owner_required
+async def broadcast_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """查看广播任务进度"""
+    if not update.effective_message:
+        return
+    
+    try:
+        job_id = int(context.args[0]) if context.args else None
+    except ValueError:
+        await update.effective_message.reply_text("用法：/broadcast_status [任务ID]")
+        return
+    
+    job = context.bot_data["broadcasts"].get_job(job_id)
+    if not job:
+        await update.effective_message.reply_text("❌ 未找到广播任务")
+        return
+    await update.effective_message.reply_text(job.progress_text())
+
+COUNTER_LABELS = {
+    "chats": "加入群组数",
+    "users": "用户总数",
+    "check_ins": "累计签到次数",
+    "points_issued": "累计发放积分",
+    "messages": "累计消息数",
+}
+
 @owner_required
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """查看机器人统计信息"""
+    """查看机器人统计信息（读取计数器表）；/stats reconcile 从源表重新核对计数器"""
     if not update.effective_message:
         return
     
-    db: Database = context.bot_data.get("db")
+    db: AsyncDatabase = context.bot_data.get("db")
     if not db:
         await update.effective_message.reply_text("❌ 数据库未初始化")
         return
     
-    chat_count = await db.fetchone("SELECT COUNT(*) as cnt FROM chats") or {"cnt": 0}
-    user_count = await db.fetchone("SELECT COUNT(*) as cnt FROM users") or {"cnt": 0}
-    check_in_count = await db.fetchone("SELECT COUNT(*) as cnt FROM check_ins") or {"cnt": 0}
+    if context.args and context.args[0] == "reconcile":
+        await update.effective_message.reply_text("⏳ 正在从源表重新统计计数器...")
+        result = await db.call("reconcile_counters")
+        text = "✅ 计数器已核对\n\n"
+        for name, label in COUNTER_LABELS.items():
+            before, after = result[name]["before"], result[name]["after"]
+            text += f"{label}：{after}" + (f"（原为 {before}）" if before != after else "") + "\n"
+        await update.effective_message.reply_text(text)
+        return
+    
+    counters = await db.get_counters()
     
     # 计算运行时间
     start_time = context.bot_data.get("start_time", time.time())
@@ -98,9 +143,42 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     minutes = remainder // 60
     
     stats_text = "📊 机器人统计信息\n\n"
-    stats_text += f"加入群组数：{chat_count['cnt']}\n"
-    stats_text += f"用户总数：{user_count['cnt']}\n"
-    stats_text += f"累计签到次数：{check_in_count['cnt']}\n"
+    for name, label in COUNTER_LABELS.items():
+        stats_text += f"{label}：{counters[name]}\n"
+    stats_text += f"合并节省的编辑：{edit_coalescer.stats()['saved']} 次\n"
+    cache = response_cache.stats()
+    stats_text += f"回复缓存命中率：{cache['hit_rate']:.0%}（命中 {cache['hits']} / 未命中 {cache['misses']}）\n"
     stats_text += f"运行时间：{days}天{hours}时{minutes}分"
     
     await update.effective_message.reply_text(stats_text)
+
+@owner_required
+async def global_top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """跨群组排行榜：/global_top [points|check_ins] [人数]；reconcile 立即对账"""
+    if not update.effective_message:
+        return
+    
+    board = context.bot_data["global_leaderboard"]
+    args = context.args or []
+    if args and args[0] == "reconcile":
+        fixed = await board.reconcile()
+        await update.effective_message.reply_text(f"✅ 全局排行榜已对账，修正 {fixed} 名用户")
+        return
+    
+    metric = args[0] if args and args[0] in GLOBAL_METRICS else "points"
+    numbers = [int(arg) for arg in args if arg.isdigit()]
+    limit = min(max(numbers[0], 1), GLOBAL_TOP_K) if numbers else 10
+    
+    top = await board.top(metric, limit)
+    if not top:
+        await update.effective_message.reply_text("暂无积分记录")
+        return
+    
+    profiles = await context.bot_data["users"].resolve(context.bot, [user_id for user_id, _ in top])
+    title, unit = ("积分", "积分") if metric == "points" else ("签到次数", "次")
+    text = f"🌐 全局{title}排行榜（前{len(top)}名）\n\n"
+    for i, (user_id, value) in enumerate(top, 1):
+        profile = profiles.get(user_id)
+        name = profile.mention_html() if profile else f"[未知用户 {user_id}]"
+        text += f"{i}. {name} - {value} {unit}\n"
+    await update.effective_message.reply_text(text, parse_mode="HTML")
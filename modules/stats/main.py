@@ -1,16 +1,115 @@
-from telegram.ext import CommandHandler, ContextTypes
+import time
+from telegram.ext import CommandHandler, ContextTypes, MessageHandler, filters
 from telegram import Update
-from core.permissions import is_bot_owner
-from core.database import Database
+from core.permissions import is_bot_owner, is_chat_admin
+from core import activity_report
 
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not await is_bot_owner(update, context):
-        await update.message.reply_text("❌ 你不是机器人所有者")
+async def record_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """消息统计：只在内存中计数，由统计收集器定期写入小时桶表"""
+    collector = context.bot_data.get("stats")
+    message = update.message
+    if not collector or not message or not update.effective_chat:
         return
-    db = context.bot_data["db"]
-    total_chats = db.fetchone("SELECT COUNT(*) FROM chats WHERE bot_token = ?", (context.bot.token,))[0]
-    # 后续可扩展统计用户数、消息数等，这里先简单示例
-    await update.message.reply_text(f"📊 统计信息：\n- 群组总数：{total_chats}")
+    ts = message.date.timestamp() if message.date else None
+    collector.record(update.effective_chat.id, update.effective_user.id if update.effective_user else None, ts)
+
+async def activity_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """本群最近 N 天的发言统计（只读小时聚合）"""
+    chat = update.effective_chat
+    if not update.effective_message or not chat or chat.type not in ("group", "supergroup"):
+        return
+    days = int(context.args[0]) if context.args and context.args[0].isdigit() else 30
+    days = min(max(days, 1), 365)
+    
+    collector = context.bot_data["stats"]
+    series = await collector.hourly_messages(chat.id, days)
+    if not series:
+        await update.effective_message.reply_text(f"最近 {days} 天暂无消息统计")
+        return
+    
+    total = sum(count for _, count in series)
+    by_hour = [0] * 24
+    for hour, count in series:
+        by_hour[time.localtime(hour).tm_hour] += count
+    peak_hour = max(range(24), key=by_hour.__getitem__)
+    
+    top = await collector.top_users(chat.id, days, limit=5)
+    profiles = await context.bot_data["users"].resolve(context.bot, [user_id for user_id, _ in top])
+    
+    text = f"📈 最近 {days} 天发言统计\n\n"
+    text += f"消息总数：{total}\n"
+    text += f"日均消息：{total / days:.1f}\n"
+    text += f"最活跃时段：{peak_hour}:00-{peak_hour + 1}:00\n"
+    if top:
+        text += "\n🏅 发言最多：\n"
+        for i, (user_id, count) in enumerate(top, 1):
+            name = profiles[user_id].mention_html() if user_id in profiles else str(user_id)
+            text += f"{i}. {name} - {count} 条\n"
+    await update.effective_message.reply_text(text, parse_mode="HTML")
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """活跃度报表：群内管理员 /report [天数] [png]；所有者私聊 /report <群组ID> [天数] [png]"""
+    message = update.effective_message
+    chat = update.effective_chat
+    if not message or not chat:
+        return
+    args = [arg.lower() for arg in context.args or []]
+    as_png = "png" in args
+    numbers = [int(arg) for arg in args if arg.lstrip("-").isdigit()]
+    
+    if chat.type in ("group", "supergroup"):
+        if not await is_chat_admin(update, context):
+            await message.reply_text("❌ 只有管理员可以查看活跃度报表")
+            return
+        chat_id = chat.id
+    else:
+        if not await is_bot_owner(update.effective_user.id):
+            await message.reply_text("❌ 你不是机器人所有者")
+            return
+        if not numbers:
+            await message.reply_text("用法：/report <群组ID> [天数] [png]")
+            return
+        chat_id = numbers.pop(0)
+    days = min(max(numbers[0], 1), 365) if numbers else 30
+    
+    if not activity_report.available():
+        await message.reply_text("❌ 活跃度报表需要安装 numpy")
+        return
+    report = await context.bot_data["reports"].get(chat_id, days)
+    if not report.total:
+        await message.reply_text(f"最近 {days} 天暂无消息统计")
+        return
+    
+    text = activity_report.render_text(report)
+    if report.top_posters:
+        profiles = await context.bot_data["users"].resolve(context.bot, [user_id for user_id, _ in report.top_posters])
+        text += "\n\n🏅 发言最多：\n"
+        for i, (user_id, count) in enumerate(report.top_posters, 1):
+            name = profiles[user_id].mention_html() if user_id in profiles else str(user_id)
+            text += f"{i}. {name} - {count} 条\n"
+    await message.reply_text(text, parse_mode="HTML")
+    
+    if as_png:
+        if not activity_report.png_available():
+            await message.reply_text("❌ 生成图片需要安装 matplotlib")
+            return
+        await message.reply_photo(await context.bot_data["reports"].png(report))
 
 def register(application):
-    application.add_handler(CommandHandler("stats", stats_command))
\ No newline at end of file
+    # /stats 由 owner 模块提供（计数器统计与对账），这里不再注册，避免同组内先加载的处理器遮蔽它
+    application.add_handler(CommandHandler(
+        "activity",
+        activity_command,
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
+    application.add_handler(CommandHandler(
+        "report",
+        report_command,
+        filters=~filters.UpdateType.EDITED_MESSAGE
+    ))
+    # 单独的 handler group：统计所有新消息（文字、图片、贴纸、媒体等，不含编辑和服务消息），
+    # 不受消息管道中过滤、自动回复等阶段的影响
+    application.add_handler(MessageHandler(
+        filters.UpdateType.MESSAGE & ~filters.StatusUpdate.ALL,
+        record_message
+    ), group=1)
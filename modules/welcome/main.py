@@ -1,15 +1,22 @@
 from telegram.ext import ChatMemberHandler, ContextTypes
 from telegram import Update, ChatMember
 from core.permissions import is_chat_admin
-import yaml
+from core.config import get_config
+
+def _is_member(member: ChatMember) -> bool:
+    if member.status == ChatMember.RESTRICTED:
+        return bool(member.is_member)
+    return member.status in (ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER)
 
 async def welcome_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """chat_member 更新：成员状态从非成员变为成员时发送欢迎消息（chat_member 更新没有 effective_message）"""
+    change = update.chat_member
+    if not change or _is_member(change.old_chat_member) or not _is_member(change.new_chat_member):
+        return
     if not await is_chat_admin(update, context):
         return
-    new_member = update.effective_message.new_chat_members[0]
-    with open("../config/config.yaml", "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    welcome_msg = config.get("module_settings", {}).get("welcome", {}).get("message", "欢迎 {user} 加入群组！")
+    new_member = change.new_chat_member.user
+    welcome_msg = get_config().general.welcome_message
     await update.effective_chat.send_message(welcome_msg.format(user=new_member.mention_html()), parse_mode="HTML")
 
 def register(application):
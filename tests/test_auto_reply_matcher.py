@@ -0,0 +1,48 @@
+from modules.auto_reply.matcher import REGEX_MAX_PATTERN, REGEX_MAX_TEXT, RuleMatcher, parse_rules
+
+
+def _matcher(raw):
+    return RuleMatcher(parse_rules(raw))
+
+
+def test_regex_with_inline_global_flag():
+    """(?i) 之类的行内全局标志无法合并进大正则，应退回逐条匹配"""
+    matcher = _matcher({
+        "(?i)hello": {"reply": "hi", "mode": "regex"},
+        r"bye\d+": {"reply": "see you", "mode": "regex"},
+    })
+    assert matcher.match("HELLO there", now=0).reply == "hi"
+    assert matcher.match("bye42", now=0).reply == "see you"
+    assert matcher.match("nothing", now=0) is None
+
+
+def test_regex_with_duplicate_group_names():
+    matcher = _matcher({
+        r"(?P<n>\d+) apples": {"reply": "apples", "mode": "regex"},
+        r"(?P<n>\d+) pears": {"reply": "pears", "mode": "regex"},
+    })
+    assert matcher.match("3 pears please", now=0).reply == "pears"
+    assert matcher.match("5 apples", now=0).reply == "apples"
+
+
+def test_keyword_with_surrounding_whitespace():
+    matcher = _matcher({" hi": "hello", "  ": "empty", " Exact ": {"reply": "exact", "mode": "exact"}})
+    assert matcher.match("hi everyone", now=0).reply == "hello"
+    assert matcher.match("exact", now=0).reply == "exact"
+
+
+def test_unsafe_regex_rules_are_skipped():
+    """嵌套量词和超长正则不会进入匹配器"""
+    matcher = _matcher({
+        "(a+)+$": {"reply": "slow", "mode": "regex"},
+        "x" * (REGEX_MAX_PATTERN + 1): {"reply": "long", "mode": "regex"},
+        r"(foo|bar)+": {"reply": "ok", "mode": "regex"},
+    })
+    assert [rule.reply for rule in matcher.rules] == ["ok"]
+    assert matcher.match("a" * 5000 + "!", now=0) is None
+
+
+def test_regex_only_scans_message_head():
+    matcher = _matcher({"needle": {"reply": "found", "mode": "regex"}})
+    assert matcher.match("needle", now=0).reply == "found"
+    assert matcher.match("x" * REGEX_MAX_TEXT + "needle", now=10) is None
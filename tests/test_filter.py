@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("telegram")
+
+from modules.filter.main import _group_words, _matcher_for  # noqa: E402
+
+
+def test_schema_default_word_lists_are_ignored():
+    """从未保存过词表的群组（表结构默认值）不做任何过滤"""
+    settings = {
+        "filter_enabled": True, "filter_words": "广告,违规,测试",
+        "ban_words_enabled": True, "ban_words_list": ["广告", "违规"],
+    }
+    assert _group_words(settings) == []
+    assert _matcher_for(-1, settings).search("这是一条测试广告") is None
+
+
+def test_saved_word_lists_are_case_sensitive():
+    settings = {"filter_enabled": True, "filter_words": "Spam,广告", "ban_words_enabled": False}
+    matcher = _matcher_for(-2, settings)
+    assert matcher.search("buy Spam now") == "Spam"
+    assert matcher.search("buy spam now") is None
+    assert matcher.search("看广告") == "广告"
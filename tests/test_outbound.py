@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from core import outbound  # noqa: E402
+from core.outbound import OutboundScheduler  # noqa: E402
+from core.rate_limit import chat_rate  # noqa: E402
+from modules.filter.main import filter_message  # noqa: E402
+
+CHAT_ID = -1001
+
+
+class FakeMessage:
+    """delete / reply_text 和真实的 Message 一样经过调度器"""
+
+    def __init__(self, scheduler, sent):
+        self.scheduler = scheduler
+        self.sent = sent
+
+    async def _call(self, endpoint):
+        async def callback():
+            self.sent.append((endpoint, time.monotonic()))
+            return True
+        return await self.scheduler.process_request(callback, (), {}, endpoint, {"chat_id": CHAT_ID}, None)
+
+    async def delete(self):
+        return await self._call("deleteMessage")
+
+    async def reply_text(self, text):
+        return await self._call("sendMessage")
+
+
+def _spam_context(message, settings):
+    async def is_admin():
+        return False
+
+    async def get_settings():
+        return settings
+
+    return SimpleNamespace(is_group=True, text="buy spam now", chat_id=CHAT_ID, message=message,
+                           is_admin=is_admin, settings=get_settings)
+
+
+def test_spam_deletes_do_not_wait_for_throttled_replies():
+    """单聊天令牌桶耗尽时，逐条处理刷屏消息：每条删除都立即发出，提示回复在后台排队"""
+    spam = 10
+
+    async def run():
+        scheduler = OutboundScheduler(chat_burst=5)
+        await scheduler.initialize()
+        bucket = scheduler.chat_buckets.get(CHAT_ID, chat_rate(CHAT_ID), scheduler.chat_burst)
+        bucket.tokens = 0.0
+        sent = []
+        settings = {"filter_enabled": True, "filter_words": "spam"}
+        started = time.monotonic()
+        # 与 PTB 逐个处理更新一样，前一条处理完才处理下一条
+        for _ in range(spam):
+            await filter_message(_spam_context(FakeMessage(scheduler, sent), settings))
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(0)  # 让最后一条提示进入队列
+        deletes = [at for endpoint, at in sent if endpoint == "deleteMessage"]
+        replies = [at for endpoint, at in sent if endpoint == "sendMessage"]
+        queued = scheduler.stats()["queued"]["reply"]
+        await scheduler.shutdown()
+        await asyncio.gather(*outbound._detached, return_exceptions=True)
+        return elapsed, deletes, replies, queued
+
+    elapsed, deletes, replies, queued = asyncio.run(run())
+    assert len(deletes) == spam
+    assert elapsed < 1.0
+    assert len(replies) + queued == spam
+    assert queued > 0
+
+
+def test_retried_edit_still_coalesces_with_later_edits():
+    """RetryAfter 后重新排队的编辑仍可与同一条消息的后续编辑合并"""
+    from telegram.error import RetryAfter
+
+    async def run():
+        scheduler = OutboundScheduler()
+        await scheduler.initialize()
+        calls = []
+
+        def edit(text, fail=False):
+            async def callback():
+                calls.append(text)
+                if fail and calls.count(text) == 1:
+                    raise RetryAfter(1)
+                return text
+            return scheduler.process_request(
+                callback, (), {}, "editMessageText", {"chat_id": CHAT_ID, "message_id": 7}, None
+            )
+
+        first = asyncio.ensure_future(edit("v1", fail=True))
+        while not calls:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(edit("v2"))
+        results = await asyncio.wait_for(asyncio.gather(first, second), 5)
+        await scheduler.shutdown()
+        return calls, results
+
+    calls, results = asyncio.run(run())
+    assert calls == ["v1", "v2"]
+    assert results == ["v2", "v2"]